@@ -0,0 +1,39 @@
+"""news full-text search index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 21:32:10.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Должно совпадать с models.NEWS_SEARCH_VECTOR_SQL
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(content, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GIN-индекс есть только в PostgreSQL, для остальных БД используется индекс в памяти
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(f"CREATE INDEX IF NOT EXISTS ix_news_search_vector ON news USING gin (({SEARCH_VECTOR_SQL}))")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_news_search_vector")
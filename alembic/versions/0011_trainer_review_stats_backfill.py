@@ -0,0 +1,42 @@
+"""trainer review stats backfill
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 23:05:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Сводные строки больше не создаются при чтении статистики: пересчитываем
+    # их по одобренным отзывам, дальше их ведет только apply_review_change
+    op.execute("DELETE FROM trainer_review_stats")
+    op.execute(
+        "INSERT INTO trainer_review_stats "
+        "(trainer_id, rating_1, rating_2, rating_3, rating_4, rating_5) "
+        "SELECT trainer_id, "
+        + ", ".join(
+            f"sum(CASE WHEN rating = {rating} THEN 1 ELSE 0 END)" for rating in range(1, 6)
+        )
+        + " FROM trainer_reviews "
+        "WHERE is_approved = true AND trainer_id IS NOT NULL "
+        "GROUP BY trainer_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Данные остаются, их формат не менялся
+    pass
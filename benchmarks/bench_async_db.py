@@ -0,0 +1,97 @@
+"""
+Сравнение синхронной и асинхронной сессии внутри async-обработчиков.
+
+N одновременных корутин читают расписание на неделю: через Session
+(запрос блокирует event loop) и через AsyncSession. Параллельно работает
+"пульс", который каждые 5 мс замеряет задержку event loop: при синхронной
+сессии запросы выполняются строго по очереди и пульс замирает.
+
+Запуск (локальная SQLite):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_async_db.py [запросов]
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import date, time as dtime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from database import Base, engine, SessionLocal, AsyncSessionLocal
+from models import TrainerSchedule
+
+SCHEDULES = 20000
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(TrainerSchedule).count() >= SCHEDULES:
+            return
+        db.bulk_insert_mappings(TrainerSchedule, [
+            {
+                "trainer_id": i % 50 + 1,
+                "date": date.today() + timedelta(days=i % 60),
+                "start_time": dtime(hour=8 + i % 12),
+                "end_time": dtime(hour=9 + i % 12),
+                "training_type": "group",
+                "max_participants": 10,
+            }
+            for i in range(SCHEDULES)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def week_query():
+    return select(TrainerSchedule).filter(
+        TrainerSchedule.date >= date.today(),
+        TrainerSchedule.date <= date.today() + timedelta(days=7)
+    )
+
+
+async def sync_handler():
+    db = SessionLocal()
+    try:
+        return len(db.execute(week_query()).scalars().all())
+    finally:
+        db.close()
+
+
+async def async_handler():
+    async with AsyncSessionLocal() as db:
+        return len((await db.execute(week_query())).scalars().all())
+
+
+async def measure(handler, requests: int):
+    max_lag = 0.0
+    running = True
+
+    async def heartbeat():
+        nonlocal max_lag
+        while running:
+            expected = time.perf_counter() + 0.005
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, time.perf_counter() - expected)
+
+    pulse = asyncio.create_task(heartbeat())
+    started_at = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(requests)))
+    elapsed = time.perf_counter() - started_at
+    running = False
+    await pulse
+    return elapsed, max_lag
+
+
+async def main(requests: int):
+    seed()
+    for name, handler in (("Session", sync_handler), ("AsyncSession", async_handler)):
+        elapsed, max_lag = await measure(handler, requests)
+        print(f"{name:>12}: {requests} запросов за {elapsed:.2f} с, макс. задержка event loop {max_lag * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
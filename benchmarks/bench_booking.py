@@ -0,0 +1,186 @@
+"""
+Стресс-тест записи на популярную групповую тренировку.
+
+N клиентов с абонементами одновременно (из пула потоков, у каждого своя
+сессия) записываются на тренировку с лимитом мест. После прогона проверяется:
+участников ровно max_participants, остальные в листе ожидания, посещения
+списаны только у записанных. Затем часть участников отменяет запись и
+проверяется перевод из листа ожидания.
+
+Режим --naive повторяет прежнюю логику (подсчет, затем вставка без
+блокировки) и показывает переполнение группы.
+
+Запуск (локальная SQLite или PostgreSQL):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_booking.py [клиентов] [мест] [--naive]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as dtime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from database import Base, engine, SessionLocal
+from models import User, TrainerSchedule, TrainingParticipant, GymMembership, TrainingType
+from services import booking
+
+VISITS = 10
+
+
+def seed(clients: int, places: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        trainer = User(username=f"trainer_{time.time_ns()}", email=f"trainer_{time.time_ns()}@bench.local",
+                       hashed_password="x", role="trainer")
+        db.add(trainer)
+        db.flush()
+        schedule = TrainerSchedule(
+            trainer_id=trainer.id,
+            date=date.today() + timedelta(days=3),
+            start_time=dtime(hour=19),
+            end_time=dtime(hour=20),
+            training_type=TrainingType.GROUP.value,
+            max_participants=places,
+            is_available=True,
+        )
+        db.add(schedule)
+        db.flush()
+        stamp = time.time_ns()
+        users = [
+            User(username=f"client_{stamp}_{i}", email=f"client_{stamp}_{i}@bench.local", hashed_password="x", role="client")
+            for i in range(clients)
+        ]
+        db.add_all(users)
+        db.flush()
+        db.add_all([
+            GymMembership(user_id=user.id, membership_type="bench", start_date=date.today() - timedelta(days=1),
+                          end_date=date.today() + timedelta(days=30), visits_left=VISITS, status="active")
+            for user in users
+        ])
+        db.commit()
+        return schedule.id
+    finally:
+        db.close()
+
+
+def naive_join(db, schedule_id: int, user_id: int):
+    """Прежняя логика join_training: подсчет мест и вставка без блокировки"""
+    schedule = db.query(TrainerSchedule).filter(TrainerSchedule.id == schedule_id).first()
+    membership = db.query(GymMembership).filter(GymMembership.user_id == user_id, GymMembership.visits_left > 0).first()
+    count = db.query(TrainingParticipant).filter(
+        TrainingParticipant.schedule_id == schedule_id, TrainingParticipant.status == "confirmed"
+    ).count()
+    if count >= schedule.max_participants:
+        raise HTTPException(status_code=400, detail="Группа уже заполнена")
+    membership.visits_left -= 1
+    db.add(TrainingParticipant(schedule_id=schedule_id, user_id=user_id, status="confirmed"))
+    db.commit()
+
+
+def join(schedule_id: int, user_id: int, naive: bool) -> str:
+    db = SessionLocal()
+    try:
+        if naive:
+            naive_join(db, schedule_id, user_id)
+            return "confirmed"
+        return booking.book_training(db, schedule_id, user_id, waitlist=True).status
+    except HTTPException:
+        return "rejected"
+    except Exception as e:
+        return f"error: {type(e).__name__}"
+    finally:
+        db.close()
+
+
+def summary(schedule_id: int):
+    db = SessionLocal()
+    try:
+        statuses = dict(db.query(TrainingParticipant.status, func.count()).filter(
+            TrainingParticipant.schedule_id == schedule_id
+        ).group_by(TrainingParticipant.status).all())
+        user_ids = db.query(TrainingParticipant.user_id).filter(TrainingParticipant.schedule_id == schedule_id)
+        spent = db.query(func.coalesce(func.sum(VISITS - GymMembership.visits_left), 0)).filter(
+            GymMembership.user_id.in_(user_ids)
+        ).scalar()
+        return statuses, spent
+    finally:
+        db.close()
+
+
+def main(clients: int, places: int, naive: bool):
+    schedule_id = seed(clients, places)
+    db = SessionLocal()
+    try:
+        user_ids = [user_id for (user_id,) in db.query(GymMembership.user_id).filter(
+            GymMembership.membership_type == "bench"
+        ).order_by(GymMembership.id.desc()).limit(clients).all()]
+    finally:
+        db.close()
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(clients, 64)) as pool:
+        results = list(pool.map(lambda user_id: join(schedule_id, user_id, naive), user_ids))
+    elapsed = time.perf_counter() - started_at
+
+    outcomes = {}
+    for result in results:
+        outcomes[result] = outcomes.get(result, 0) + 1
+    statuses, spent = summary(schedule_id)
+    confirmed = statuses.get("confirmed", 0)
+    print(f"Режим: {'naive' if naive else 'booking'}, клиентов {clients}, мест {places}, {clients / elapsed:.0f} запросов/с")
+    print(f"Ответы: {outcomes}")
+    print(f"В БД: {statuses}, списано посещений: {spent}")
+    print("Переполнение!" if confirmed > places else "Переполнения нет")
+    if naive:
+        return
+
+    assert confirmed == min(places, clients), confirmed
+    assert spent == confirmed, (spent, confirmed)
+
+    # Отмены: каждое освободившееся место занимает первый из листа ожидания
+    db = SessionLocal()
+    try:
+        first_waiting = db.query(TrainingParticipant.user_id).filter(
+            TrainingParticipant.schedule_id == schedule_id, TrainingParticipant.status == "waiting"
+        ).order_by(TrainingParticipant.waitlisted_at, TrainingParticipant.id).first()
+        cancelling = [user_id for (user_id,) in db.query(TrainingParticipant.user_id).filter(
+            TrainingParticipant.schedule_id == schedule_id, TrainingParticipant.status == "confirmed"
+        ).limit(min(5, places)).all()]
+    finally:
+        db.close()
+
+    def cancel(user_id):
+        db = SessionLocal()
+        try:
+            return booking.cancel_booking(db, schedule_id, user_id)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=len(cancelling) or 1) as pool:
+        list(pool.map(cancel, cancelling))
+    statuses, spent = summary(schedule_id)
+    print(f"После {len(cancelling)} отмен: {statuses}, списано посещений: {spent}")
+    assert statuses.get("confirmed", 0) == min(places, clients - len(cancelling))
+    if first_waiting:
+        db = SessionLocal()
+        try:
+            status = db.query(TrainingParticipant.status).filter(
+                TrainingParticipant.schedule_id == schedule_id, TrainingParticipant.user_id == first_waiting[0]
+            ).scalar()
+        finally:
+            db.close()
+        assert status == "confirmed", status
+    print("Проверки пройдены")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    main(
+        int(args[0]) if len(args) > 0 else 200,
+        int(args[1]) if len(args) > 1 else 20,
+        "--naive" in sys.argv,
+    )
@@ -0,0 +1,104 @@
+"""
+Outbox исходящих писем против локального SMTP-сервера (aiosmtpd).
+
+Поднимает SMTP-сервер в процессе, который временно отклоняет (451) первую
+попытку части писем и навсегда (550) - адреса в домене reject.local.
+Записывает письма в outbox, запускает пул воркеров и ждет, пока очередь
+опустеет. Печатает скорость отправки и сколько писем доставлено, повторено
+и переведено в dead. Задержка повтора на время прогона уменьшена.
+
+Запуск (нужен pip install aiosmtpd; локальная SQLite или PostgreSQL после миграций):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_email_outbox.py [писем] [воркеров]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMAIL_RETRY_BASE_SECONDS", "0.2")
+os.environ.setdefault("EMAIL_POLL_SECONDS", "0.1")
+
+from aiosmtpd.controller import Controller
+from sqlalchemy import func
+from database import Base, engine, SessionLocal
+from models import EmailOutbox
+from services.outbox import EmailOutboxWorkers, SmtpTransport, enqueue_email, STATUS_DEAD, STATUS_PENDING, STATUS_SENT
+
+SMTP_PORT = 8025
+# Каждое TEMPFAIL_EVERY-е письмо с первой попытки получает 451
+TEMPFAIL_EVERY = 10
+REJECT_EVERY = 100
+
+
+class FlakyHandler:
+    def __init__(self):
+        self.delivered = 0
+        self.tempfailed = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.endswith("@reject.local"):
+            return "550 Mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        recipient = envelope.rcpt_tos[0]
+        number = int(recipient.split("_")[1].split("@")[0])
+        if number % TEMPFAIL_EVERY == 0 and recipient not in self.tempfailed:
+            self.tempfailed.add(recipient)
+            return "451 Try again later"
+        self.delivered += 1
+        return "250 Message accepted"
+
+
+def enqueue(count: int, stamp: int):
+    db = SessionLocal()
+    try:
+        for i in range(count):
+            domain = "reject.local" if i % REJECT_EVERY == 1 else "bench.local"
+            enqueue_email(db, f"outbox_{i}_{stamp}@{domain}", "Тренировка отменена", f"Письмо {i}")
+        db.commit()
+    finally:
+        db.close()
+
+
+def queue_counts(stamp: int) -> dict:
+    db = SessionLocal()
+    try:
+        return dict(db.query(EmailOutbox.status, func.count()).filter(
+            EmailOutbox.recipient.like(f"%_{stamp}@%")
+        ).group_by(EmailOutbox.status).all())
+    finally:
+        db.close()
+
+
+async def main(count: int, workers: int):
+    Base.metadata.create_all(bind=engine)
+    handler = FlakyHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=SMTP_PORT)
+    controller.start()
+    stamp = time.time_ns()
+    try:
+        enqueue(count, stamp)
+        pool = EmailOutboxWorkers(SmtpTransport("127.0.0.1", SMTP_PORT), workers=workers)
+        started_at = time.perf_counter()
+        task = asyncio.create_task(pool.run())
+        while queue_counts(stamp).get(STATUS_PENDING):
+            await asyncio.sleep(0.2)
+        elapsed = time.perf_counter() - started_at
+        task.cancel()
+    finally:
+        controller.stop()
+
+    counts = queue_counts(stamp)
+    print(f"Писем: {count}, воркеров: {workers}, {elapsed:.2f} с ({count / elapsed:.0f} писем/с)")
+    print(f"Доставлено: {counts.get(STATUS_SENT, 0)} (SMTP-сервер принял {handler.delivered}), "
+          f"в dead: {counts.get(STATUS_DEAD, 0)}, обработка воркерами: {pool.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+    ))
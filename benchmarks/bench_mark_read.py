@@ -0,0 +1,94 @@
+"""
+Отметка уведомлений прочитанными и число непрочитанных.
+
+Для пользователей с непрочитанными уведомлениями сравнивает прежний способ
+(SELECT, изменение через ORM и commit на каждое уведомление) с mark_read
+(один UPDATE), а также подсчет непрочитанных COUNT по таблице уведомлений
+с чтением счетчика User.unread_notifications.
+
+Запуск (локальная SQLite или PostgreSQL после миграций):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_mark_read.py [пользователей] [уведомлений]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+from database import Base, engine, SessionLocal
+from models import Notification, User
+from services.notifications import fan_out, mark_read, unread_count
+
+BENCH_ROLE = "bench_reader"
+
+
+def seed(users: int, per_user: int):
+    """Пользователи и per_user непрочитанных уведомлений у каждого (через fan_out, со счетчиками)"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        stamp = time.time_ns()
+        db.bulk_insert_mappings(User, [
+            {"username": f"reader_{stamp}_{i}", "email": f"reader_{stamp}_{i}@bench.local",
+             "hashed_password": "x", "role": f"{BENCH_ROLE}_{stamp}"}
+            for i in range(users)
+        ])
+        db.commit()
+        for i in range(per_user):
+            fan_out(
+                db, "bench_read", select(User.id).where(User.role == f"{BENCH_ROLE}_{stamp}"), User.id,
+                lambda row: (row.id, "Объявление", f"Текст {i}")
+            )
+        return [user_id for (user_id,) in db.query(User.id).filter(User.role == f"{BENCH_ROLE}_{stamp}").order_by(User.id)]
+    finally:
+        db.close()
+
+
+def per_notification(db, user_id: int):
+    """Прежний mark_as_read: запрос на каждое уведомление"""
+    for (notification_id,) in db.query(Notification.id).filter(
+        Notification.user_id == user_id, Notification.read == False
+    ).all():
+        notification = db.query(Notification).filter(
+            Notification.id == notification_id,
+            Notification.user_id == user_id
+        ).first()
+        notification.read = True
+        db.commit()
+
+
+def timed(func_, user_ids) -> float:
+    started_at = time.perf_counter()
+    for user_id in user_ids:
+        func_(user_id)
+    return (time.perf_counter() - started_at) / len(user_ids) * 1000
+
+
+def main(users: int, per_user: int):
+    user_ids = seed(users * 2, per_user)
+    old_users, new_users = user_ids[:users], user_ids[users:]
+    db = SessionLocal()
+    try:
+        count_ms = timed(lambda user_id: db.query(func.count(Notification.id)).filter(
+            Notification.user_id == user_id, Notification.read == False
+        ).scalar(), new_users)
+        counter_ms = timed(lambda user_id: unread_count(db, user_id), new_users)
+        print(f"Непрочитанных: COUNT {count_ms:.2f} мс, счетчик {counter_ms:.2f} мс")
+
+        old_ms = timed(lambda user_id: per_notification(db, user_id), old_users)
+        bulk_ms = timed(lambda user_id: mark_read(db, user_id), new_users)
+        print(f"Прочитать {per_user} уведомлений: по одному {old_ms:.1f} мс, одним UPDATE {bulk_ms:.1f} мс")
+        left = db.query(func.count(Notification.id)).filter(
+            Notification.user_id.in_(new_users), Notification.read == False
+        ).scalar()
+        print(f"Осталось непрочитанных: {left}, счетчики: {sum(unread_count(db, user_id) for user_id in new_users)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+    )
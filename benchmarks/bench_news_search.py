@@ -0,0 +1,91 @@
+"""
+Поиск по новостям: ILIKE '%термин%' против полнотекстового индекса.
+
+Заполняет таблицу синтетическими статьями на русском и английском
+и замеряет p50/p95 задержки search_news и прежнего ILIKE-запроса
+(полный просмотр таблицы на каждый запрос).
+
+Запуск (локальная SQLite или PostgreSQL после миграций):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_news_search.py [статей] [запросов]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, engine, SessionLocal
+from models import News
+from services.news_search import search_news
+
+WORDS = (
+    "тренировка фитнес зал абонемент тренер растяжка йога бокс бассейн кардио сила "
+    "выносливость питание расписание скидка акция открытие турнир соревнование "
+    "workout fitness gym membership coach stretching yoga boxing pool cardio strength "
+    "nutrition schedule discount event opening tournament"
+).split()
+QUERIES = ["йога", "трен", "бассейн скидка", "fitness coach", "турнир", "растяж", "gym", "кардио питание"]
+
+
+def seed(articles: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        existing = db.query(News).count()
+        rng = random.Random(42)
+        batch = []
+        for i in range(existing, articles):
+            batch.append({
+                "title": " ".join(rng.choices(WORDS, k=6)).capitalize(),
+                "content": " ".join(rng.choices(WORDS, k=120)),
+                "author_id": 1,
+                "is_published": True,
+            })
+            if len(batch) == 5000:
+                db.bulk_insert_mappings(News, batch)
+                db.commit()
+                batch = []
+        if batch:
+            db.bulk_insert_mappings(News, batch)
+            db.commit()
+    finally:
+        db.close()
+
+
+def ilike_search(db, search: str):
+    query = db.query(News).filter(News.title.ilike(f"%{search}%") | News.content.ilike(f"%{search}%"))
+    return query.count(), query.order_by(News.created_at.desc()).limit(10).all()
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def measure(name: str, func, repeats: int):
+    db = SessionLocal()
+    try:
+        func(db, QUERIES[0])  # прогрев (для индекса в памяти - его построение)
+        timings = []
+        for i in range(repeats):
+            started_at = time.perf_counter()
+            func(db, QUERIES[i % len(QUERIES)])
+            timings.append(time.perf_counter() - started_at)
+    finally:
+        db.close()
+    print(f"{name:>10}: p50 {percentile(timings, 0.5) * 1000:.1f} мс, p95 {percentile(timings, 0.95) * 1000:.1f} мс")
+
+
+def main(articles: int, repeats: int):
+    seed(articles)
+    print(f"Статей: {articles}, запросов: {repeats}")
+    measure("ILIKE", ilike_search, repeats)
+    measure("search", lambda db, search: search_news(db, search, 0, 10), repeats)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+    )
@@ -0,0 +1,82 @@
+"""
+Массовые уведомления: по одному commit на получателя против fan_out.
+
+Заполняет таблицу пользователей, затем замеряет прежний способ (add, commit,
+refresh на каждое уведомление) на выборке получателей и рассылку fan_out
+всем клиентам пакетными вставками.
+
+Запуск (локальная SQLite или PostgreSQL после миграций):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_notifications.py [получателей] [выборка]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, engine, SessionLocal
+from models import Notification, User
+from sqlalchemy import select
+from services.notifications import fan_out
+
+BENCH_ROLE = "bench_client"
+
+
+def seed(recipients: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        existing = db.query(User).filter(User.role == BENCH_ROLE).count()
+        stamp = time.time_ns()
+        for start in range(existing, recipients, 10000):
+            db.bulk_insert_mappings(User, [
+                {"username": f"fanout_{stamp}_{i}", "email": f"fanout_{stamp}_{i}@bench.local",
+                 "hashed_password": "x", "role": BENCH_ROLE}
+                for i in range(start, min(start + 10000, recipients))
+            ])
+            db.commit()
+    finally:
+        db.close()
+
+
+def per_row(sample: int) -> float:
+    """Прежний create_notification: отдельная транзакция на каждого получателя"""
+    db = SessionLocal()
+    try:
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(User.role == BENCH_ROLE).limit(sample)]
+        started_at = time.perf_counter()
+        for user_id in user_ids:
+            notification = Notification(user_id=user_id, type="bench_per_row", title="Объявление", message="Текст")
+            db.add(notification)
+            db.commit()
+            db.refresh(notification)
+        return len(user_ids) / (time.perf_counter() - started_at)
+    finally:
+        db.close()
+
+
+def main(recipients: int, sample: int):
+    seed(recipients)
+    per_row_rate = per_row(sample)
+    print(f"По одному commit: {per_row_rate:.0f} уведомлений/с, на {recipients} получателей ~{recipients / per_row_rate:.1f} с")
+
+    db = SessionLocal()
+    try:
+        result = fan_out(
+            db, "bench_fan_out", select(User.id).where(User.role == BENCH_ROLE), User.id,
+            lambda row: (row.id, "Объявление", "Текст")
+        )
+        created = db.query(Notification).filter(Notification.type == "bench_fan_out").count()
+    finally:
+        db.close()
+    print(
+        f"fan_out: {result.recipients} получателей, {result.chunks} пакетов, "
+        f"{result.seconds:.2f} с ({result.per_second:.0f} уведомлений/с), в БД {created}"
+    )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2000,
+    )
@@ -0,0 +1,49 @@
+"""
+Нагрузочный тест пула хэширования паролей.
+
+Эмулирует утренний пик логинов: N одновременных проверок пароля через
+PasswordHashPool с разным числом воркеров. Пропускная способность
+должна расти с числом ядер, пока воркеров не больше, чем CPU.
+
+Запуск: python benchmarks/bench_password_pool.py [количество логинов]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import PasswordHashPool, pwd_context
+
+
+async def run_logins(pool: PasswordHashPool, hashed: str, logins: int) -> float:
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*(
+        pool.run(pwd_context.verify, "password123", hashed) for _ in range(logins)
+    ))
+    assert all(results)
+    return time.perf_counter() - started_at
+
+
+async def main(logins: int):
+    hashed = pwd_context.hash("password123")
+    cpu_count = os.cpu_count() or 1
+    workers_options = sorted({1, 2, 4, cpu_count})
+
+    print(f"CPU: {cpu_count}, логинов: {logins}")
+    baseline = None
+    for workers in workers_options:
+        pool = PasswordHashPool(workers, max_pending=logins)
+        elapsed = await run_logins(pool, hashed, logins)
+        throughput = logins / elapsed
+        baseline = baseline or throughput
+        stats = pool.stats()
+        print(
+            f"workers={workers:>3}  {throughput:8.1f} логинов/с  x{throughput / baseline:4.2f}  "
+            f"avg_wait={stats['avg_wait_ms']} мс  avg_run={stats['avg_run_ms']} мс"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 64))
@@ -0,0 +1,216 @@
+"""
+Планы горячих запросов: используют ли они составные индексы (миграция 0006).
+
+Заполняет БД синтетическими данными (тренеры, расписание, записи, посещения,
+абонементы, уведомления), выполняет каждый горячий запрос так же, как его
+строит приложение, и для каждого печатает EXPLAIN (SQLite - EXPLAIN QUERY PLAN),
+признак полного просмотра таблицы и среднее время выполнения.
+
+С флагом --without-indexes составные индексы на время прогона удаляются
+(для сравнения "до / после"), после прогона создаются заново.
+Код возврата 1, если хотя бы один запрос просматривает таблицу целиком.
+
+Запуск (локальная SQLite или PostgreSQL после миграций):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_query_plans.py [повторов] [--without-indexes]
+"""
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, time as dtime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, select
+from database import Base, engine, SessionLocal
+from models import TrainerSchedule, TrainingParticipant, GymVisit, GymMembership, Notification, User
+from pagination import PAGE_SIZE_DEFAULT, apply_keyset
+from services import booking, notifications
+
+TRAINERS = 50
+CLIENTS = 5000
+SCHEDULES = 20000
+PARTICIPANTS_PER_SCHEDULE = 5
+VISITS_PER_CLIENT = 20
+NOTIFICATIONS_PER_CLIENT = 20
+
+# Составные индексы горячих запросов
+INDEXED_TABLES = (TrainerSchedule, TrainingParticipant, GymVisit, GymMembership, Notification)
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(TrainerSchedule).count() >= SCHEDULES:
+            return
+        rng = random.Random(42)
+        today = date.today()
+        stamp = time.time_ns()
+        db.bulk_insert_mappings(User, [
+            {"username": f"bench_{stamp}_{i}", "email": f"bench_{stamp}_{i}@bench.local", "hashed_password": "x",
+             "role": "trainer" if i < TRAINERS else "client"}
+            for i in range(TRAINERS + CLIENTS)
+        ])
+        db.commit()
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(User.username.like(f"bench_{stamp}_%")).order_by(User.id)]
+        trainer_ids, client_ids = user_ids[:TRAINERS], user_ids[TRAINERS:]
+
+        db.bulk_insert_mappings(TrainerSchedule, [
+            {
+                "trainer_id": trainer_ids[i % TRAINERS],
+                "date": today + timedelta(days=i % 365 - 180),
+                "start_time": dtime(hour=8 + i % 12),
+                "end_time": dtime(hour=9 + i % 12),
+                "training_type": "group",
+                "max_participants": 10,
+                "is_available": True,
+            }
+            for i in range(SCHEDULES)
+        ])
+        db.commit()
+        schedule_ids = [schedule_id for (schedule_id,) in db.query(TrainerSchedule.id)]
+
+        db.bulk_insert_mappings(TrainingParticipant, [
+            {"schedule_id": schedule_id, "user_id": user_id,
+             "status": rng.choice(["confirmed", "confirmed", "confirmed", "cancelled", "waiting"])}
+            for schedule_id in schedule_ids
+            for user_id in rng.sample(client_ids, PARTICIPANTS_PER_SCHEDULE)
+        ])
+        db.bulk_insert_mappings(GymMembership, [
+            {"user_id": user_id, "membership_type": "bench", "start_date": today - timedelta(days=30 * k + 30),
+             "end_date": today - timedelta(days=30 * k) + timedelta(days=10), "visits_left": 5,
+             "status": "active" if k == 0 else "expired"}
+            for user_id in client_ids
+            for k in range(3)
+        ])
+        now = datetime.now()
+        db.bulk_insert_mappings(GymVisit, [
+            {"user_id": user_id, "check_in": now - timedelta(days=k, hours=2),
+             "check_out": None if k == 0 and user_id % 10 == 0 else now - timedelta(days=k, hours=1)}
+            for user_id in client_ids
+            for k in range(VISITS_PER_CLIENT)
+        ])
+        db.bulk_insert_mappings(Notification, [
+            {"user_id": user_id, "type": "bench", "title": "Уведомление", "message": "Текст",
+             "created_at": now - timedelta(hours=k), "read": k > 2}
+            for user_id in client_ids
+            for k in range(NOTIFICATIONS_PER_CLIENT)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    # Статистика для планировщика
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+
+
+def hot_queries(db, trainer_id: int, client_id: int, schedule_id: int):
+    """Запросы в том виде, в котором их строит приложение"""
+    today = date.today()
+    order = [TrainerSchedule.date, TrainerSchedule.start_time, TrainerSchedule.id]
+    week = select(TrainerSchedule).filter(TrainerSchedule.date >= today, TrainerSchedule.date <= today + timedelta(days=6))
+    return {
+        # routers/schedule.py get_schedules
+        "расписание на неделю": lambda: db.execute(apply_keyset(week, order).limit(PAGE_SIZE_DEFAULT)).scalars().all(),
+        "расписание тренера на неделю": lambda: db.execute(
+            apply_keyset(week.filter(TrainerSchedule.trainer_id == trainer_id), order).limit(PAGE_SIZE_DEFAULT)
+        ).scalars().all(),
+        # services/booking.py
+        "запись клиента на тренировку": lambda: db.query(TrainingParticipant).filter(
+            TrainingParticipant.schedule_id == schedule_id,
+            TrainingParticipant.user_id == client_id
+        ).first(),
+        "подсчет участников": lambda: booking._confirmed_count(db, schedule_id),
+        "лист ожидания": lambda: db.query(TrainingParticipant).filter(
+            TrainingParticipant.schedule_id == schedule_id,
+            TrainingParticipant.status == booking.STATUS_WAITLISTED
+        ).order_by(TrainingParticipant.waitlisted_at, TrainingParticipant.id).all(),
+        "действующий абонемент": lambda: booking._active_membership_id(db, client_id, with_visits=True),
+        # routers/visits.py check_in
+        "незавершенное посещение": lambda: db.query(GymVisit).filter(
+            GymVisit.user_id == client_id,
+            GymVisit.check_out == None
+        ).first(),
+        # routers/notifications.py
+        "уведомления пользователя": lambda: apply_keyset(db.query(Notification).filter(
+            Notification.user_id == client_id
+        ), [Notification.id], descending=True).limit(PAGE_SIZE_DEFAULT).all(),
+        "непрочитанные уведомления": lambda: notifications.unread_count(db, client_id),
+    }
+
+
+@contextmanager
+def capture_plans(plans: list):
+    """EXPLAIN каждого выполняемого запроса с теми же параметрами, что и сам запрос"""
+    dialect = engine.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+
+    def explain(connection, cursor, statement, parameters, context, executemany):
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+        plans.append([row[-1] if dialect == "sqlite" else row[0] for row in rows])
+
+    event.listen(engine, "before_cursor_execute", explain)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", explain)
+
+
+def is_full_scan(plan) -> bool:
+    """Полный просмотр таблицы: SCAN без индекса (SQLite) или Seq Scan (PostgreSQL)"""
+    for line in plan:
+        if "Seq Scan" in line:
+            return True
+        if line.startswith("SCAN ") and "INDEX" not in line and "PRIMARY KEY" not in line:
+            return True
+    return False
+
+
+def composite_indexes():
+    return [index for model in INDEXED_TABLES for index in model.__table__.indexes if len(index.columns) > 1]
+
+
+def main(repeats: int, without_indexes: bool):
+    seed()
+    if without_indexes:
+        for index in composite_indexes():
+            index.drop(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    full_scans = 0
+    try:
+        trainer_id = db.query(TrainerSchedule.trainer_id).limit(1).scalar()
+        schedule_id, client_id = db.query(TrainingParticipant.schedule_id, TrainingParticipant.user_id).filter(
+            TrainingParticipant.status == booking.STATUS_WAITLISTED
+        ).order_by(TrainingParticipant.id.desc()).first()
+        print(f"БД: {engine.dialect.name}, индексы: {'удалены' if without_indexes else 'есть'}\n")
+        for name, run in hot_queries(db, trainer_id, client_id, schedule_id).items():
+            plans = []
+            with capture_plans(plans):
+                run()
+            started_at = time.perf_counter()
+            for _ in range(repeats):
+                run()
+            elapsed_ms = (time.perf_counter() - started_at) / repeats * 1000
+            plan = [line for statement_plan in plans for line in statement_plan]
+            scan = is_full_scan(plan)
+            full_scans += scan
+            print(f"{name}: {elapsed_ms:.2f} мс{' - ПОЛНЫЙ ПРОСМОТР' if scan else ''}")
+            for line in plan:
+                print(f"    {line}")
+    finally:
+        db.close()
+        if without_indexes:
+            for index in composite_indexes():
+                index.create(bind=engine, checkfirst=True)
+
+    print(f"\nЗапросов с полным просмотром таблицы: {full_scans}")
+    return 1 if full_scans else 0
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    sys.exit(main(int(args[0]) if args else 50, "--without-indexes" in sys.argv))
@@ -0,0 +1,129 @@
+"""
+Число запросов к БД при построении карточек тренеров (GET /api/trainers/all
+и GET /api/trainers/info/{id}).
+
+Создает одного тренера с информацией, расписанием, участниками и отзывами,
+считает выполненные запросы (событие before_cursor_execute) и время ответа,
+затем добавляет еще тренеров и считает снова. Число запросов не должно
+зависеть от числа тренеров; кэш ответов перед каждым запросом сбрасывается.
+Код возврата 1, если число запросов выросло.
+
+Запуск (локальная SQLite или PostgreSQL после миграций):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_trainer_directory.py [тренеров]
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, time as dtime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from database import Base, engine, SessionLocal
+from models import TrainerInfo, TrainerReview, TrainerSchedule, TrainingParticipant, User
+from response_cache import response_cache
+from services.reviews import apply_review_change
+from main import app
+
+SCHEDULES_PER_TRAINER = 10
+PARTICIPANTS_PER_SCHEDULE = 3
+REVIEWS_PER_TRAINER = 5
+
+
+def seed(trainers: int) -> list:
+    """Тренеры с информацией, ближайшим расписанием, участниками и одобренными отзывами"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        stamp = time.time_ns()
+        db.bulk_insert_mappings(User, [
+            {"username": f"dir_{stamp}_{i}", "email": f"dir_{stamp}_{i}@example.com", "hashed_password": "x",
+             "role": "trainer" if i < trainers else "client"}
+            for i in range(trainers + PARTICIPANTS_PER_SCHEDULE)
+        ])
+        db.commit()
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(User.username.like(f"dir_{stamp}_%")).order_by(User.id)]
+        trainer_ids, client_ids = user_ids[:trainers], user_ids[trainers:]
+
+        today = date.today()
+        db.bulk_insert_mappings(TrainerInfo, [
+            {"trainer_id": trainer_id, "specialization": "Силовые", "experience_years": 5,
+             "education": "Институт физкультуры", "achievements": "Мастер спорта", "description": "Тренер по силовой подготовке, проводит групповые и персональные тренировки"}
+            for trainer_id in trainer_ids
+        ])
+        db.bulk_insert_mappings(TrainerSchedule, [
+            {"trainer_id": trainer_id, "date": today + timedelta(days=1 + i), "start_time": dtime(hour=10),
+             "end_time": dtime(hour=11), "training_type": "group", "max_participants": 10, "is_available": True}
+            for trainer_id in trainer_ids
+            for i in range(SCHEDULES_PER_TRAINER)
+        ])
+        db.commit()
+        schedule_ids = [schedule_id for (schedule_id,) in db.query(TrainerSchedule.id).filter(
+            TrainerSchedule.trainer_id.in_(trainer_ids)
+        )]
+        db.bulk_insert_mappings(TrainingParticipant, [
+            {"schedule_id": schedule_id, "user_id": client_id, "status": "confirmed"}
+            for schedule_id in schedule_ids
+            for client_id in client_ids
+        ])
+        db.bulk_insert_mappings(TrainerReview, [
+            {"trainer_id": trainer_id, "user_id": client_ids[0], "rating": 1 + i % 5,
+             "comment": "Отзыв для замера", "is_approved": True}
+            for trainer_id in trainer_ids
+            for i in range(REVIEWS_PER_TRAINER)
+        ])
+        for trainer_id in trainer_ids:
+            for i in range(REVIEWS_PER_TRAINER):
+                apply_review_change(db, trainer_id, 1 + i % 5, +1)
+        db.commit()
+        return trainer_ids
+    finally:
+        db.close()
+
+
+@contextmanager
+def count_queries(statements: list):
+    def count(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+def measure(client: TestClient, url: str):
+    """Число запросов к БД и время одного ответа без кэша"""
+    response_cache.invalidate("trainers")
+    statements = []
+    started_at = time.perf_counter()
+    with count_queries(statements):
+        response = client.get(url)
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    response.raise_for_status()
+    body = response.json()
+    return len(statements), elapsed_ms, len(body) if isinstance(body, list) else 1
+
+
+def main(trainers: int) -> int:
+    client = TestClient(app)
+    first_id = seed(1)[0]
+    one = {url: measure(client, url) for url in ("/api/trainers/all", f"/api/trainers/info/{first_id}")}
+    seed(trainers)
+    many = {url: measure(client, url) for url in ("/api/trainers/all", f"/api/trainers/info/{first_id}")}
+
+    failed = 0
+    for url in one:
+        (before, before_ms, before_items), (after, after_ms, after_items) = one[url], many[url]
+        grew = after != before
+        failed += grew
+        print(f"{url}: карточек {before_items} -> {after_items}, запросов {before} -> {after}, "
+              f"{before_ms:.1f} -> {after_ms:.1f} мс{' - ЧИСЛО ЗАПРОСОВ ВЫРОСЛО' if grew else ''}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100))
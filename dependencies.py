@@ -1,22 +1,148 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from database import AsyncSessionLocal
 from models import User
 from schemas import TokenData
 
+logger = logging.getLogger(__name__)
+
 # Конфигурация JWT
 SECRET_KEY = "your-secret-key"  # В реальном проекте должен храниться в защищенном месте
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Кэш проверенных токенов
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+REDIS_URL = os.getenv("REDIS_URL")
+PRINCIPAL_GENERATION_KEY = "gym:principal-cache:generation"
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+@dataclass(frozen=True)
+class Principal:
+    """Данные авторизованного пользователя, достаточные для проверки прав"""
+    id: int
+    email: str
+    role: str
+    is_active: bool = True
+
+class PrincipalCache:
+    """
+    LRU-кэш пользователей по токену с ограничением по времени жизни.
+
+    Запись живет не дольше PRINCIPAL_CACHE_TTL_SECONDS и не дольше срока
+    действия самого токена. Изменение роли сбрасывает записи пользователя.
+
+    Если задан REDIS_URL, кэш каждого воркера помнит поколение, при котором
+    сделана запись, а поколение хранится в Redis (INCR при изменении роли, как
+    в response_cache). Запись старого поколения считается промахом, поэтому
+    изменение роли видно всем воркерам. При недоступности Redis кэш не
+    используется.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int, redis_url: str = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+
+    def generation(self):
+        """Текущее поколение кэша; None, если Redis недоступен"""
+        if self._redis is None:
+            return 0
+        try:
+            value = self._redis.get(PRINCIPAL_GENERATION_KEY)
+        except Exception as e:
+            logger.warning(f"[AUTH] Redis недоступен, кэш пользователей не используется: {e}")
+            return None
+        return int(value) if value is not None else 0
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+        # Поколение читается вне блокировки: в Redis это сетевой запрос
+        if entry is not None and entry[1] > time.monotonic() and entry[2] == self.generation():
+            with self._lock:
+                if token in self._entries:
+                    self._entries.move_to_end(token)
+                self.hits += 1
+            return entry[0]
+        with self._lock:
+            if entry is not None and self._entries.get(token) is entry:
+                del self._entries[token]
+            self.misses += 1
+        return None
+
+    def put(self, token: str, principal: Principal, token_expires_at: float = None, generation: int = 0):
+        """generation - поколение, прочитанное до загрузки пользователя из БД"""
+        if generation is None:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, time.monotonic() + token_expires_at - time.time())
+        with self._lock:
+            self._entries[token] = (principal, expires_at, generation)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        if self._redis is not None:
+            try:
+                self._redis.incr(PRINCIPAL_GENERATION_KEY)
+            except Exception as e:
+                logger.warning(f"[AUTH] Redis недоступен, записи пользователя {user_id} сброшены только в этом воркере: {e}")
+        with self._lock:
+            stale = [token for token, (principal, _, _) in self._entries.items() if principal.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS, REDIS_URL)
+
+async def _load_principal(email: str):
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User).filter(User.email == email))).scalars().first()
+        if user is None:
+            return None
+        return Principal(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            is_active=getattr(user, "is_active", True)
+        )
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось подтвердить учетные данные",
@@ -30,20 +156,29 @@ async def get_current_user(
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-        
-    user = db.query(User).filter(User.email == token_data.username).first()
-    if user is None:
+    
+    # Подпись и срок действия проверены выше, БД нужна только при промахе кэша
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    
+    # Поколение читается до загрузки: если роль изменят во время загрузки,
+    # запись окажется старого поколения и не будет использована
+    generation = principal_cache.generation()
+    principal = await _load_principal(token_data.username)
+    if principal is None:
         raise credentials_exception
-    return user
+    principal_cache.put(token, principal, payload.get("exp"), generation)
+    return principal
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Неактивный пользователь")
     return current_user
 
-async def all_roles(current_user: User = Depends(get_current_user)):
+async def all_roles(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Проверка на любую авторизованную роль"""
     if not current_user:
         raise HTTPException(
@@ -52,7 +187,7 @@ async def all_roles(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
-async def admin_only(current_user: User = Depends(get_current_user)):
+async def admin_only(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Проверка на роль администратора"""
     if current_user.role != "admin":
         raise HTTPException(
@@ -61,7 +196,7 @@ async def admin_only(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
-async def manager_or_admin(current_user: User = Depends(get_current_user)):
+async def manager_or_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Проверка на роль менеджера или администратора"""
     if current_user.role not in ["admin", "manager"]:
         raise HTTPException(
@@ -70,7 +205,7 @@ async def manager_or_admin(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
-async def trainer_or_admin(current_user: User = Depends(get_current_user)):
+async def trainer_or_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Проверка на роль тренера или администратора"""
     if current_user.role not in ["admin", "trainer"]:
         raise HTTPException(
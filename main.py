@@ -1,16 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
 from typing import List
 from fastapi import FastAPI, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models
 import schemas
 from database import engine, get_db
-from routers import membership, auth, users, schedule, trainer, occupancy, reviews, news, payments
-from fastapi.staticfiles import StaticFiles
+from routers import membership, auth, users, schedule, trainer, occupancy, reviews, news, payments, visits, metrics, notifications
+from services import live_occupancy
+from services.scheduler import scheduler, SCHEDULER_ENABLED
+from services.outbox import email_outbox, EMAIL_OUTBOX_ENABLED
+from services.notification_bus import notification_bus
+from services.uploads import UploadsStaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Восстанавливаем счетчик загрузки зала из БД и запускаем фоновую сверку
+    await asyncio.to_thread(live_occupancy.rebuild_from_db)
+    reconcile_task = asyncio.create_task(live_occupancy.reconcile_periodically())
+    # Периодические задачи (напоминания, абонементы, сверка счетчиков) выполняет только воркер-лидер
+    scheduler_task = asyncio.create_task(scheduler.run()) if SCHEDULER_ENABLED else None
+    # Отправка писем из outbox; воркеры разных процессов не мешают друг другу (аренда писем)
+    outbox_task = asyncio.create_task(email_outbox.run()) if EMAIL_OUTBOX_ENABLED else None
+    # Уведомления, опубликованные другими воркерами (Redis pub/sub)
+    bus_task = asyncio.create_task(notification_bus.run())
+    yield
+    reconcile_task.cancel()
+    for task in (scheduler_task, outbox_task, bus_task):
+        if task is not None:
+            task.cancel()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",  # Replace with the URL of your frontend
@@ -26,7 +47,7 @@ app.add_middleware(
 )
 
 # Монтируем статические файлы для доступа к фотографиям
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadsStaticFiles(directory="uploads"), name="uploads")
 
 app.include_router(auth.router)
 app.include_router(membership.router)
@@ -37,6 +58,9 @@ app.include_router(occupancy.router)
 app.include_router(reviews.router)
 app.include_router(news.router)
 app.include_router(payments.router)
+app.include_router(visits.router)
+app.include_router(notifications.router)
+app.include_router(metrics.router)
 
 
 
@@ -0,0 +1,103 @@
+"""
+Управление схемой БД. Импорт приложения DDL не выполняет, схема
+создается и обновляется только этой командой.
+
+    python manage.py migrate     # применить недостающие миграции (alembic upgrade head)
+    python manage.py bootstrap   # пустая БД: create_all + отметка последней ревизии; БД без alembic_version: отметка 0001 + migrate; иначе migrate
+    python manage.py current     # текущая ревизия схемы
+    python manage.py gc-uploads [--dry-run]  # удалить загруженные файлы, на которые нет ссылок
+    python manage.py repair-counters         # пересчитать счетчики участников тренировок и непрочитанных уведомлений
+    python manage.py run-job <задача>        # выполнить периодическую задачу вне расписания
+    python manage.py requeue-dead-emails     # вернуть в очередь недоставленные письма (status=dead)
+"""
+import os
+import sys
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from database import engine, SessionLocal
+from models import Base, OccupancyHourly
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic", "alembic.ini")
+# Ревизия, схема которой совпадает со схемой, создававшейся create_all при импорте
+BASELINE_REVISION = "0001"
+
+
+def alembic_config() -> Config:
+    return Config(ALEMBIC_INI)
+
+
+def migrate():
+    command.upgrade(alembic_config(), "head")
+
+
+def bootstrap():
+    """Быстрое создание схемы на пустой БД без прогона всей истории миграций"""
+    existing_tables = set(inspect(engine).get_table_names())
+    if existing_tables and "alembic_version" not in existing_tables:
+        # БД создана приложением до перехода на миграции: ее таблицы - ревизия 0001,
+        # кроме витрины загрузки, которая могла еще не появиться
+        OccupancyHourly.__table__.create(bind=engine, checkfirst=True)
+        command.stamp(alembic_config(), BASELINE_REVISION)
+        migrate()
+        return
+    if existing_tables - {"alembic_version"}:
+        migrate()
+        return
+    Base.metadata.create_all(bind=engine)
+    command.stamp(alembic_config(), "head")
+
+
+def current():
+    command.current(alembic_config())
+
+
+def gc_uploads(*args):
+    from services.uploads import collect_garbage
+    db = SessionLocal()
+    try:
+        stats = collect_garbage(db, dry_run="--dry-run" in args)
+    finally:
+        db.close()
+    print(f"Используется: {stats['referenced']}, удалено: {stats['removed']} "
+          f"({stats['freed_bytes']} байт), недавних пропущено: {stats['kept_recent']}")
+
+
+def repair_counters(*args):
+    from services import booking, notifications
+    print(f"Исправлено тренировок: {booking.repair_from_db()}")
+    print(f"Исправлено счетчиков непрочитанных уведомлений: {notifications.repair_from_db()}")
+
+
+def requeue_dead_emails(*args):
+    from services.outbox import requeue_dead
+    db = SessionLocal()
+    try:
+        print(f"Возвращено в очередь писем: {requeue_dead(db)}")
+    finally:
+        db.close()
+
+
+def run_job(*args):
+    from services.scheduler import scheduler
+    if not args or args[0] not in scheduler.jobs:
+        print(f"Задачи: {', '.join(scheduler.jobs)}")
+        sys.exit(1)
+    scheduler.run_now(args[0])
+
+
+COMMANDS = {
+    "migrate": migrate,
+    "bootstrap": bootstrap,
+    "current": current,
+    "gc-uploads": gc_uploads,
+    "repair-counters": repair_counters,
+    "run-job": run_job,
+    "requeue-dead-emails": requeue_dead_emails,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(__doc__)
+        sys.exit(1)
+    COMMANDS[sys.argv[1]](*sys.argv[2:])
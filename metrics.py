@@ -0,0 +1,48 @@
+import threading
+from typing import Dict, List, Tuple
+
+# Границы корзин по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Минимальная гистограмма в формате Prometheus (кумулятивные корзины, сумма, количество)"""
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[Tuple[str, str], ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                labels = [f'{name}="{value}"' for name, value in key]
+                for bound, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                    lines.append(f"{self.name}_bucket{{{bucket_labels}}} {bucket_count}")
+                bucket_labels = ",".join(labels + ['le="+Inf"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+                suffix = "{" + ",".join(labels) + "}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {total}")
+                lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+def render_gauges(name: str, description: str, values: Dict[Tuple[Tuple[str, str], ...], float], kind: str = "gauge") -> List[str]:
+    """Строки Prometheus для набора значений с метками"""
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    for key, value in values.items():
+        labels = ",".join(f'{label}="{label_value}"' for label, label_value in key)
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return lines
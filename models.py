@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Time, Boolean, func, DateTime
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Time, Boolean, func, DateTime, Float, Index, text
 from sqlalchemy.orm import relationship
-from database import Base, engine
+from database import Base
 from enum import Enum as PyEnum
 from datetime import datetime, timezone
 
@@ -18,6 +18,8 @@ class User(Base):
     hashed_password = Column(String)
     role = Column(String, default=UserRole.CLIENT)
     phone = Column(String, nullable=True)
+    # Непрочитанные уведомления; меняется в той же транзакции, что и уведомления (services/notifications.py)
+    unread_notifications = Column(Integer, nullable=False, default=0, server_default="0")
     
     membership = relationship("GymMembership", back_populates="user")
     schedules = relationship("TrainerSchedule", back_populates="trainer")
@@ -41,6 +43,11 @@ class GymMembership(Base):
     user = relationship("User", back_populates="membership")
     visits = relationship("GymVisit", back_populates="membership")
 
+    __table_args__ = (
+        # Поиск действующего абонемента клиента
+        Index("ix_gym_memberships_user_status_end_date", "user_id", "status", "end_date"),
+    )
+
 class TrainingType(str, PyEnum):
     PERSONAL = "personal"
     GROUP = "group"
@@ -59,10 +66,31 @@ class TrainerSchedule(Base):
     name = Column(String, nullable=True)  # Название для групповой тренировки
     description = Column(String, nullable=True)
     timezone = Column(String, default="UTC")
+    # Число подтвержденных участников, ведется при записи и отмене (services/booking.py)
+    confirmed_count = Column(Integer, nullable=False, default=0, server_default="0")
     
     trainer = relationship("User", back_populates="schedules")
     participants = relationship("TrainingParticipant", back_populates="schedule")
 
+    __table_args__ = (
+        # Расписание за период (в порядке показа) по всем тренерам и по одному тренеру
+        Index("ix_trainer_schedules_date_start_time", "date", "start_time"),
+        Index("ix_trainer_schedules_trainer_date_start_time", "trainer_id", "date", "start_time"),
+    )
+
+    @property
+    def capacity(self):
+        """Мест на тренировке: 1 для персональной, max_participants для групповой (None - без ограничения)"""
+        return 1 if self.training_type == TrainingType.PERSONAL else self.max_participants
+
+    @property
+    def current_participants(self) -> int:
+        return self.confirmed_count or 0
+
+    @property
+    def available_places(self):
+        return None if self.capacity is None else max(0, self.capacity - self.current_participants)
+
     def get_local_datetime(self):
         return datetime.combine(self.date, self.start_time).replace(tzinfo=timezone.utc)
 
@@ -92,6 +120,20 @@ class GymVisit(Base):
     user = relationship("User", back_populates="visits")
     membership = relationship("GymMembership", back_populates="visits")
 
+    __table_args__ = (
+        # Незавершенное посещение клиента (check_out IS NULL) и история посещений
+        Index("ix_gym_visits_user_check_out", "user_id", "check_out"),
+    )
+
+class OccupancyHourly(Base):
+    __tablename__ = "occupancy_hourly"
+    
+    hour_start = Column(DateTime, primary_key=True)  # Начало часа
+    visits = Column(Integer, default=0)              # Посещения, пересекающиеся с часом
+    distinct_visitors = Column(Integer, default=0)   # Уникальные посетители за час
+    visitor_hours = Column(Float, default=0.0)       # Суммарное время в зале, человеко-часы
+    check_ins = Column(Integer, default=0)           # Входы за час
+
 class TrainerReview(Base):
     __tablename__ = "trainer_reviews"
     
@@ -106,6 +148,23 @@ class TrainerReview(Base):
     trainer = relationship("User", foreign_keys=[trainer_id], backref="received_reviews")
     user = relationship("User", foreign_keys=[user_id], backref="written_reviews")
 
+class TrainerReviewSummary(Base):
+    __tablename__ = "trainer_review_stats"
+    
+    # Количество одобренных отзывов по каждой оценке, обновляется вместе с отзывами
+    trainer_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    rating_1 = Column(Integer, default=0, nullable=False)
+    rating_2 = Column(Integer, default=0, nullable=False)
+    rating_3 = Column(Integer, default=0, nullable=False)
+    rating_4 = Column(Integer, default=0, nullable=False)
+    rating_5 = Column(Integer, default=0, nullable=False)
+
+# Выражение полнотекстового поиска по новостям (PostgreSQL), services/news_search.py
+NEWS_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(content, '')), 'B')"
+)
+
 class News(Base):
     __tablename__ = "news"
     
@@ -120,6 +179,11 @@ class News(Base):
     
     author = relationship("User", back_populates="news")
 
+    __table_args__ = (
+        # GIN-индекс полнотекстового поиска (миграция 0003); create_all строит его только в PostgreSQL
+        Index("ix_news_search_vector", text(f"({NEWS_SEARCH_VECTOR_SQL})"), postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
 class MembershipType(Base):
     __tablename__ = "membership_types"
     
@@ -163,11 +227,19 @@ class TrainingParticipant(Base):
     id = Column(Integer, primary_key=True, index=True)
     schedule_id = Column(Integer, ForeignKey("trainer_schedules.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
-    status = Column(String)  # confirmed, cancelled
+    status = Column(String)  # confirmed, waiting, cancelled
+    waitlisted_at = Column(DateTime, nullable=True)  # очередь листа ожидания
     
     schedule = relationship("TrainerSchedule", back_populates="participants")
     user = relationship("User")
 
+    __table_args__ = (
+        # Запись клиента на тренировку; префикс (schedule_id) - все участники тренировки
+        Index("ix_training_participants_schedule_user_status", "schedule_id", "user_id", "status"),
+        # Подсчет участников и очередь листа ожидания
+        Index("ix_training_participants_schedule_status_waitlisted", "schedule_id", "status", "waitlisted_at"),
+    )
+
 class Notification(Base):
     __tablename__ = "notifications"
     
@@ -181,6 +253,46 @@ class Notification(Base):
     
     user = relationship("User", back_populates="notifications")
 
-# Создание таблиц
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    __table_args__ = (
+        # Лента уведомлений пользователя, новые сначала
+        Index("ix_notifications_user_created_at", "user_id", "created_at"),
+        # Непрочитанные уведомления пользователя: отметка прочитанными, сверка счетчика
+        Index("ix_notifications_user_read", "user_id", "read"),
+    )
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    
+    # Письма записываются в той же транзакции, что и изменение данных,
+    # и отправляются воркерами services/outbox.py
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending", server_default="pending")  # pending, sent, dead
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, nullable=False, default=func.now(), server_default=func.now())
+    locked_until = Column(DateTime, nullable=True)  # Письмо взято воркером до этого времени
+    lease_token = Column(String, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Очередь воркеров: готовые к отправке письма
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+class ScheduledJobRun(Base):
+    __tablename__ = "scheduled_job_runs"
+    
+    # Последний запуск периодической задачи (services/scheduler.py)
+    job_name = Column(String, primary_key=True)
+    scheduled_at = Column(DateTime)               # Время по расписанию, для которого был запуск
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    status = Column(String)                       # ok, error
+    error = Column(String, nullable=True)
+    # Выполняющийся запуск: кто выполняет и до какого времени (продлевается, пока задача работает)
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
@@ -0,0 +1,90 @@
+import base64
+import json
+from datetime import datetime, date, time
+from typing import List, Sequence
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from database import SessionLocal, AsyncSessionLocal
+
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 1000
+STREAM_CHUNK_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _dump_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def _load_value(column, value):
+    python_type = column.type.python_type
+    if value is not None and python_type in (datetime, date, time):
+        return python_type.fromisoformat(value)
+    return value
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([_dump_value(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, order_columns: Sequence) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(order_columns):
+            raise ValueError
+        return [_load_value(column, value) for column, value in zip(order_columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def apply_keyset(query, order_columns: Sequence, cursor: str = None, descending: bool = False):
+    """
+    Keyset-пагинация: сортировка по order_columns (последняя - уникальный id)
+    и фильтр "строго после курсора" вместо OFFSET.
+    Подходит и для Query, и для select().
+    """
+    if cursor:
+        values = decode_cursor(cursor, order_columns)
+        key = tuple_(*order_columns)
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+    return query.order_by(*[column.desc() if descending else column.asc() for column in order_columns])
+
+
+def set_next_cursor(response: Response, items: Sequence, order_columns: Sequence, limit: int):
+    """Курсор следующей страницы отдается в заголовке, тело ответа остается списком"""
+    if len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, column.key) for column in order_columns])
+
+
+def ndjson_stream(statement, schema) -> StreamingResponse:
+    """
+    Потоковая выгрузка в NDJSON через серверный курсор (yield_per).
+    Сессия открывается внутри генератора: сессия из get_db закрывается до начала стриминга.
+    """
+    def generate():
+        db = SessionLocal()
+        try:
+            rows = db.execute(statement.execution_options(yield_per=STREAM_CHUNK_SIZE)).scalars()
+            for row in rows:
+                yield schema.model_validate(row).model_dump_json() + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def ndjson_stream_async(statement, schema) -> StreamingResponse:
+    """То же для AsyncSession"""
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            rows = await db.stream_scalars(statement.execution_options(yield_per=STREAM_CHUNK_SIZE))
+            async for row in rows:
+                yield schema.model_validate(row).model_dump_json() + "\n"
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,195 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Optional, Tuple
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+REDIS_KEY_PREFIX = "gym:response-cache"
+
+# Время жизни ответов по группам (namespace), секунды
+NEWS_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_NEWS_TTL", "60"))
+PRICES_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_PRICES_TTL", "300"))
+TRAINERS_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TRAINERS_TTL", "120"))
+
+# Кэшированный ответ: (тело, ETag)
+CachedEntry = Tuple[bytes, str]
+
+
+class MemoryCacheBackend:
+    """
+    LRU-кэш ответов в памяти процесса.
+
+    Инвалидация группы - увеличение ее поколения: ключи старого поколения
+    больше не запрашиваются и вытесняются по LRU или TTL.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, namespace: str) -> int:
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def get(self, key: str) -> Optional[CachedEntry]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: CachedEntry, ttl_seconds: int):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Кэш ответов в Redis, общий для всех воркеров.
+    Поколение группы хранится в Redis (INCR), поэтому инвалидация видна всем воркерам.
+    При недоступности Redis запросы обслуживаются без кэша.
+    """
+
+    def __init__(self, redis_url: str):
+        import redis
+        self._redis = redis.Redis.from_url(redis_url)
+
+    def _call(self, method: str, *args):
+        try:
+            return getattr(self._redis, method)(*args)
+        except Exception as e:
+            logger.warning(f"[RESPONSE CACHE] Redis недоступен: {e}")
+            return None
+
+    def generation(self, namespace: str) -> int:
+        value = self._call("get", f"{REDIS_KEY_PREFIX}:generation:{namespace}")
+        return int(value) if value is not None else 0
+
+    def get(self, key: str) -> Optional[CachedEntry]:
+        value = self._call("get", f"{REDIS_KEY_PREFIX}:{key}")
+        if value is None:
+            return None
+        etag, _, body = value.partition(b"\n")
+        return body, etag.decode()
+
+    def set(self, key: str, value: CachedEntry, ttl_seconds: int):
+        body, etag = value
+        self._call("setex", f"{REDIS_KEY_PREFIX}:{key}", ttl_seconds, etag.encode() + b"\n" + body)
+
+    def invalidate(self, namespace: str):
+        self._call("incr", f"{REDIS_KEY_PREFIX}:generation:{namespace}")
+
+    def size(self) -> int:
+        return 0
+
+
+class ResponseCache:
+    """Кэш готовых JSON-ответов публичных эндпоинтов с поддержкой ETag / If-None-Match"""
+
+    def __init__(self, backend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _key(self, namespace: str, request: Request) -> str:
+        query = "&".join(sorted(f"{name}={value}" for name, value in request.query_params.multi_items()))
+        return f"{namespace}:{self.backend.generation(namespace)}:{request.url.path}?{query}"
+
+    def respond(self, request: Request, namespace: str, ttl_seconds: int, build: Callable[[], Any], response_model) -> Response:
+        """
+        Ответ из кэша или результат build(), сериализованный по response_model.
+        Если ETag совпадает с If-None-Match, возвращается 304 без тела.
+        """
+        entry = None
+        key = None
+        if self.enabled:
+            key = self._key(namespace, request)
+            entry = self.backend.get(key)
+        if entry is not None:
+            self._count("hits")
+        else:
+            self._count("misses")
+            adapter = _adapter(response_model)
+            body = adapter.dump_json(adapter.validate_python(build(), from_attributes=True))
+            entry = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+            if key is not None:
+                self.backend.set(key, entry, ttl_seconds)
+
+        body, etag = entry
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={ttl_seconds}"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self._count("not_modified")
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self.backend.invalidate(namespace)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "size": self.backend.size(),
+            }
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_model) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # Слабое сравнение: W/"x" совпадает с "x"
+    return "*" in candidates or etag in [value[2:] if value.startswith("W/") else value for value in candidates]
+
+
+def _create_backend():
+    if REDIS_URL:
+        return RedisCacheBackend(REDIS_URL)
+    return MemoryCacheBackend(RESPONSE_CACHE_MAX_ENTRIES)
+
+
+response_cache = ResponseCache(_create_backend(), enabled=RESPONSE_CACHE_ENABLED)
@@ -3,20 +3,15 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from jose import jwt
-from passlib.context import CryptContext
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db
 from models import User
 from schemas import UserRegister, Token, User as UserSchema
-from dependencies import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from dependencies import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, admin_only, principal_cache
+from utils import get_password_hash, verify_password_async, password_pool
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -54,13 +49,14 @@ def register_user(user: UserRegister, db: Session = Depends(get_db)):
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(
+    user = (await db.execute(select(User).filter(
         (User.email == form_data.username) | (User.username == form_data.username)
-    ).first()
+    ))).scalars().first()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # bcrypt выполняется в отдельном пуле и не блокирует event loop
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверные учетные данные",
@@ -72,4 +68,14 @@ async def login_for_access_token(
         data={"sub": user.email},
         expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"} 
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/cache-stats", dependencies=[Depends(admin_only)])
+def get_principal_cache_stats():
+    """Статистика кэша авторизованных пользователей (попадания/промахи)"""
+    return principal_cache.stats()
+
+@router.get("/hash-pool-stats", dependencies=[Depends(admin_only)])
+def get_password_pool_stats():
+    """Загрузка пула хэширования паролей: очередь, отказы, время ожидания"""
+    return password_pool.stats()
@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from database import get_async_db
 from models import GymMembership, User
 from schemas import MembershipCreate, GymMembership as MembershipSchema
 from dependencies import get_current_user, manager_or_admin
 from services.membership import MembershipService
+from pagination import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, apply_keyset, set_next_cursor, ndjson_stream_async
 
 router = APIRouter(prefix="/api/membership", tags=["membership"])
 
 @router.post("/create", response_model=MembershipSchema)
 async def create_membership(
     membership: MembershipCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(manager_or_admin)
 ):
     membership_service = MembershipService(db)
@@ -26,7 +28,7 @@ async def create_membership(
 async def extend_membership(
     membership_id: int,
     payment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     membership_service = MembershipService(db)
@@ -37,7 +39,7 @@ async def freeze_membership(
     membership_id: int,
     days: int,
     reason: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     membership_service = MembershipService(db)
@@ -46,7 +48,7 @@ async def freeze_membership(
 @router.post("/{membership_id}/unfreeze", response_model=MembershipSchema)
 async def unfreeze_membership(
     membership_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     membership_service = MembershipService(db)
@@ -54,18 +56,29 @@ async def unfreeze_membership(
 
 @router.get("/my", response_model=MembershipSchema)
 async def get_my_membership(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     membership_service = MembershipService(db)
-    membership = membership_service.get_active_membership(current_user.id)
+    membership = await membership_service.get_active_membership(current_user.id)
     if not membership:
         raise HTTPException(status_code=404, detail="Активный абонемент не найден")
     return membership
 
 @router.get("/all", response_model=List[MembershipSchema])
 async def get_all_memberships(
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(manager_or_admin)
 ):
-    return db.query(GymMembership).all() 
\ No newline at end of file
+    order = [GymMembership.id]
+    statement = apply_keyset(select(GymMembership), order, cursor)
+    if stream:
+        return ndjson_stream_async(statement, MembershipSchema)
+    
+    memberships = (await db.execute(statement.limit(limit))).scalars().all()
+    set_next_cursor(response, memberships, order, limit)
+    return memberships 
\ No newline at end of file
@@ -0,0 +1,99 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from database import pool_status, pool_events, pool_events_lock, pool_wait_seconds, pool_checkout_seconds
+from dependencies import principal_cache
+from metrics import render_gauges
+from utils import password_pool
+from response_cache import response_cache
+from services.availability import availability_cache
+from services.scheduler import scheduler, job_duration_seconds, job_lag_seconds
+from services.outbox import email_outbox, email_batch_seconds
+from services.notification_bus import notification_bus
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    status = pool_status()
+    lines = []
+    for field, description in (
+        ("size", "Размер пула соединений"),
+        ("checked_out", "Соединения, выданные из пула"),
+        ("checked_in", "Свободные соединения в пуле"),
+        ("overflow", "Соединения сверх размера пула"),
+    ):
+        lines += render_gauges(
+            f"db_pool_{field}",
+            description,
+            {(("engine", name),): values[field] for name, values in status.items() if values[field] is not None}
+        )
+    
+    with pool_events_lock:
+        events = dict(pool_events)
+    lines += render_gauges(
+        "db_pool_events_total",
+        "События пула: connect, checkout, checkin, invalidate, timeout",
+        {(("engine", engine_name), ("event", event_name)): count for (engine_name, event_name), count in events.items()},
+        kind="counter"
+    )
+    lines += pool_wait_seconds.render()
+    lines += pool_checkout_seconds.render()
+    
+    cache = principal_cache.stats()
+    lines += render_gauges("auth_principal_cache_hits_total", "Попадания в кэш пользователей", {(): cache["hits"]}, kind="counter")
+    lines += render_gauges("auth_principal_cache_misses_total", "Промахи кэша пользователей", {(): cache["misses"]}, kind="counter")
+    lines += render_gauges("auth_principal_cache_size", "Записей в кэше пользователей", {(): cache["size"]})
+    
+    responses = response_cache.stats()
+    lines += render_gauges("response_cache_hits_total", "Ответы, отданные из кэша", {(): responses["hits"]}, kind="counter")
+    lines += render_gauges("response_cache_misses_total", "Ответы, собранные заново", {(): responses["misses"]}, kind="counter")
+    lines += render_gauges("response_cache_not_modified_total", "Ответы 304 Not Modified", {(): responses["not_modified"]}, kind="counter")
+    
+    slots = availability_cache.stats()
+    lines += render_gauges("availability_cache_hits_total", "Недели тренеров, взятые из кэша свободных слотов", {(): slots["hits"]}, kind="counter")
+    lines += render_gauges("availability_cache_misses_total", "Недели тренеров, прочитанные из БД", {(): slots["misses"]}, kind="counter")
+    lines += render_gauges("availability_cache_trainer_weeks", "Недель тренеров в кэше свободных слотов", {(): slots["trainer_weeks"]})
+    
+    jobs = scheduler.stats()
+    lines += render_gauges("scheduler_is_leader", "Воркер выполняет периодические задачи", {(): int(jobs["is_leader"])})
+    lines += render_gauges(
+        "scheduler_job_runs_total",
+        "Запуски периодических задач",
+        {(("job", job), ("status", status)): count for (job, status), count in jobs["runs"].items()},
+        kind="counter"
+    )
+    lines += render_gauges(
+        "scheduler_job_skipped_total",
+        "Запуски, пропущенные из-за незавершенного предыдущего",
+        {(("job", job),): count for job, count in jobs["skipped"].items()},
+        kind="counter"
+    )
+    lines += render_gauges(
+        "scheduler_job_last_success_timestamp_seconds",
+        "Время последнего успешного завершения задачи",
+        {(("job", job),): timestamp for job, timestamp in jobs["last_success"].items()}
+    )
+    lines += job_duration_seconds.render()
+    lines += job_lag_seconds.render()
+    
+    emails = email_outbox.stats()
+    lines += render_gauges(
+        "email_outbox_processed_total",
+        "Обработанные письма outbox: sent, retry, dead",
+        {(("result", result),): count for result, count in emails.items()},
+        kind="counter"
+    )
+    lines += email_batch_seconds.render()
+    
+    bus = notification_bus.stats()
+    lines += render_gauges("notification_stream_subscribers", "Подключенные потоки уведомлений (SSE)", {(): bus["subscribers"]})
+    lines += render_gauges("notification_published_total", "Опубликованные уведомления", {(): bus["published"]}, kind="counter")
+    lines += render_gauges("notification_delivered_total", "Уведомления, переданные подключенным клиентам", {(): bus["delivered"]}, kind="counter")
+    
+    hashing = password_pool.stats()
+    lines += render_gauges("password_hash_queued", "Задачи bcrypt в очереди", {(): hashing["queued"]})
+    lines += render_gauges("password_hash_running", "Задачи bcrypt в работе", {(): hashing["running"]})
+    lines += render_gauges("password_hash_rejected_total", "Отклоненные задачи bcrypt", {(): hashing["rejected"]}, kind="counter")
+    
+    return "\n".join(lines) + "\n"
@@ -1,19 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from database import get_db
 from models import News, User, UserRole
-from schemas import NewsCreate, News as NewsSchema, NewsList
+from schemas import NewsCreate, News as NewsSchema, NewsList, NewsListItem
 from dependencies import manager_or_admin
-import shutil
-import os
-from uuid import uuid4
+from services import news_search
+from response_cache import response_cache, NEWS_TTL_SECONDS
+from services.uploads import save_image
 from datetime import datetime
 
 router = APIRouter(prefix="/api/news", tags=["news"])
 
-UPLOAD_DIR = "uploads/news"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.post("/", response_model=NewsSchema, dependencies=[Depends(manager_or_admin)])
 def create_news(
@@ -25,44 +23,53 @@ def create_news(
     db.add(db_news)
     db.commit()
     db.refresh(db_news)
+    news_search.on_news_saved(db_news)
+    response_cache.invalidate("news")
     return db_news
 
 @router.post("/upload-image", dependencies=[Depends(manager_or_admin)])
 async def upload_news_image(
     file: UploadFile = File(...),
 ):
-    file_extension = os.path.splitext(file.filename)[1]
-    file_name = f"{uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return {"image_url": f"/uploads/news/{file_name}"}
+    saved = await save_image(file)
+    return {"image_url": saved["url"], "variants": saved["variants"]}
 
 @router.get("/", response_model=NewsList)
 def get_news_list(
+    request: Request,
     skip: int = 0,
     limit: int = 10,
     search: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(News)
-    
+    return response_cache.respond(
+        request, "news", NEWS_TTL_SECONDS, lambda: _build_news_list(db, skip, limit, search), NewsList
+    )
+
+def _build_news_list(db: Session, skip: int, limit: int, search: Optional[str]) -> NewsList:
     if search:
-        query = query.filter(News.title.ilike(f"%{search}%"))
-    
+        # Полнотекстовый поиск по заголовку и тексту с ранжированием по релевантности
+        total, found = news_search.search_news(db, search, skip, limit)
+        items = [
+            NewsListItem(**NewsSchema.model_validate(news).model_dump(), snippet=snippet, rank=rank)
+            for news, rank, snippet in found
+        ]
+        return NewsList(total=total, items=items)
+
+    query = db.query(News)
     total = query.count()
     news = query.order_by(News.created_at.desc()).offset(skip).limit(limit).all()
     
     return NewsList(total=total, items=news)
 
 @router.get("/{news_id}", response_model=NewsSchema)
-def get_news(news_id: int, db: Session = Depends(get_db)):
-    news = db.query(News).filter(News.id == news_id).first()
-    if not news:
-        raise HTTPException(status_code=404, detail="Новость не найдена")
-    return news
+def get_news(news_id: int, request: Request, db: Session = Depends(get_db)):
+    def build():
+        news = db.query(News).filter(News.id == news_id).first()
+        if not news:
+            raise HTTPException(status_code=404, detail="Новость не найдена")
+        return news
+    return response_cache.respond(request, "news", NEWS_TTL_SECONDS, build, NewsSchema)
 
 @router.put("/{news_id}", response_model=NewsSchema, dependencies=[Depends(manager_or_admin)])
 def update_news(
@@ -81,6 +88,8 @@ def update_news(
     db_news.updated_at = datetime.now()
     db.commit()
     db.refresh(db_news)
+    news_search.on_news_saved(db_news)
+    response_cache.invalidate("news")
     return db_news
 
 @router.delete("/{news_id}", dependencies=[Depends(manager_or_admin)])
@@ -94,4 +103,6 @@ def delete_news(
     
     db.delete(news)
     db.commit()
+    news_search.on_news_deleted(news_id)
+    response_cache.invalidate("news")
     return {"message": "Новость удалена"} 
\ No newline at end of file
@@ -1,21 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from typing import List, Optional
+import asyncio
+from database import get_db, SessionLocal
 from models import Notification, User
-from schemas import Notification as NotificationSchema
+from schemas import Notification as NotificationSchema, NotificationsMarkRead, UnreadCount
 from dependencies import get_current_user
+from pagination import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, apply_keyset, set_next_cursor
+from services.notifications import unread_count, mark_read
+from services.notification_bus import event_stream
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
+UNREAD_COUNT_HEADER = "X-Unread-Count"
+
 @router.get("/", response_model=List[NotificationSchema])
 def get_notifications(
+    response: Response,
+    since: Optional[int] = Query(None, description="Только уведомления с id больше since"),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Уведомления пользователя, новые сначала (курсор следующей страницы - в X-Next-Cursor).
+    С since клиент получает только появившиеся после уже известного ему id,
+    число непрочитанных - в заголовке X-Unread-Count.
+    """
+    query = db.query(Notification).filter(Notification.user_id == current_user.id)
+    if since is not None:
+        query = query.filter(Notification.id > since)
+    # id растет в порядке создания и служит курсором since
+    order = [Notification.id]
+    items = apply_keyset(query, order, cursor, descending=True).limit(limit).all()
+    set_next_cursor(response, items, order, limit)
+    response.headers[UNREAD_COUNT_HEADER] = str(unread_count(db, current_user.id))
+    return items
+
+@router.get("/unread-count", response_model=UnreadCount)
+def get_unread_count(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Число непрочитанных уведомлений (счетчик в строке пользователя, без подсчета уведомлений)"""
+    return {"unread": unread_count(db, current_user.id)}
+
+@router.post("/read", response_model=UnreadCount)
+def mark_many_as_read(
+    request: NotificationsMarkRead,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return db.query(Notification).filter(
-        Notification.user_id == current_user.id
-    ).order_by(Notification.created_at.desc()).all()
+    """Отметка прочитанными одним запросом: все, по списку id или до up_to_id включительно"""
+    if sum((request.all, request.ids is not None, request.up_to_id is not None)) != 1:
+        raise HTTPException(status_code=400, detail="Укажите одно из полей: all, ids или up_to_id")
+    mark_read(db, current_user.id, ids=request.ids, up_to_id=request.up_to_id)
+    return {"unread": unread_count(db, current_user.id)}
+
+def _unread_count(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return unread_count(db, user_id)
+    finally:
+        db.close()
+
+@router.get("/stream")
+async def stream_notifications(
+    since: Optional[int] = Query(None, description="Сначала отдать уведомления с id больше since"),
+    last_event_id: Optional[int] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Новые уведомления в реальном времени (Server-Sent Events) вместо опроса списка.
+    При переподключении браузер передает Last-Event-ID, и пропущенное дочитывается из БД.
+    """
+    unread = await asyncio.to_thread(_unread_count, current_user.id)
+    return StreamingResponse(
+        event_stream(current_user.id, last_event_id if last_event_id is not None else since, unread),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.post("/{notification_id}/read")
 def mark_as_read(
@@ -23,14 +89,13 @@ def mark_as_read(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == current_user.id
-    ).first()
-    
-    if not notification:
-        raise HTTPException(status_code=404, detail="Уведомление не найдено")
+    # Обычно хватает одного UPDATE; наличие уведомления проверяется, только если ничего не изменилось
+    if not mark_read(db, current_user.id, ids=[notification_id]):
+        exists = db.query(Notification.id).filter(
+            Notification.id == notification_id,
+            Notification.user_id == current_user.id
+        ).first()
+        if not exists:
+            raise HTTPException(status_code=404, detail="Уведомление не найдено")
     
-    notification.read = True
-    db.commit()
     return {"message": "Уведомление отмечено как прочитанное"} 
\ No newline at end of file
@@ -1,24 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List
+from typing import List, Optional
 from database import get_db
 from models import GymVisit, User
-from schemas import GymOccupancyStats
-from dependencies import trainer_or_admin
+from schemas import GymOccupancyStats, OccupancyHeatmap
+from dependencies import trainer_or_admin, admin_only
 from datetime import datetime, date, timedelta
+from services import occupancy as occupancy_service
+from services.live_occupancy import occupancy_counter
 
 router = APIRouter(prefix="/api/occupancy", tags=["occupancy"])
 
 @router.get("/current", response_model=GymOccupancyStats)
-def get_current_occupancy(db: Session = Depends(get_db)):
-    # Подсчитываем количество людей в зале (с check_in, но без check_out)
-    current_visitors = db.query(GymVisit).filter(
-        GymVisit.check_out == None
-    ).count()
-    
+def get_current_occupancy():
+    # Счетчик ведется check-in/check-out и сверяется с БД в фоне
     return GymOccupancyStats(
-        current_visitors=current_visitors,
+        current_visitors=occupancy_counter.get(),
         timestamp=datetime.now()
     )
 
@@ -27,23 +25,7 @@ def get_daily_stats(target_date: date = None, db: Session = Depends(get_db)):
     if not target_date:
         target_date = date.today()
     
-    stats = []
-    for hour in range(24):
-        start_time = datetime.combine(target_date, datetime.min.time().replace(hour=hour))
-        end_time = start_time + timedelta(hours=1)
-        
-        # Подсчитываем количество людей в зале за каждый час
-        visitors_count = db.query(GymVisit).filter(
-            GymVisit.check_in < end_time,
-            (GymVisit.check_out == None) | (GymVisit.check_out > start_time)
-        ).count()
-        
-        stats.append(GymOccupancyStats(
-            current_visitors=visitors_count,
-            timestamp=start_time
-        ))
-    
-    return stats
+    return occupancy_service.get_daily_stats(db, target_date)
 
 @router.get("/weekly", response_model=List[List[GymOccupancyStats]])
 def get_weekly_stats(start_date: date = None, db: Session = Depends(get_db)):
@@ -51,49 +33,59 @@ def get_weekly_stats(start_date: date = None, db: Session = Depends(get_db)):
         # Если дата не указана, берем начало текущей недели
         start_date = date.today() - timedelta(days=date.today().weekday())
     
-    end_date = start_date + timedelta(days=6)
-    
-    weekly_stats = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        daily_stats = []
-        for hour in range(24):
-            start_time = datetime.combine(current_date, datetime.min.time().replace(hour=hour))
-            end_time = start_time + timedelta(hours=1)
-            
-            visitors_count = db.query(GymVisit).filter(
-                GymVisit.check_in < end_time,
-                (GymVisit.check_out == None) | (GymVisit.check_out > start_time)
-            ).count()
-            
-            daily_stats.append(GymOccupancyStats(
-                current_visitors=visitors_count,
-                timestamp=start_time
-            ))
-        
-        weekly_stats.append(daily_stats)
-        current_date += timedelta(days=1)
+    return occupancy_service.get_weekly_stats(db, start_date)
+
+@router.get("/range", response_model=List[GymOccupancyStats])
+def get_range_stats(start: datetime, end: datetime, db: Session = Depends(get_db)):
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Конец периода должен быть позже начала")
+    if end - start > timedelta(days=366):
+        raise HTTPException(status_code=400, detail="Период не может превышать один год")
     
-    return weekly_stats
+    return occupancy_service.get_range_stats(db, start, end)
 
 @router.get("/peak-hours", response_model=List[GymOccupancyStats])
 def get_peak_hours(days: int = 30, db: Session = Depends(get_db)):
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail="Период должен быть от 1 до 366 дней")
+    
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
+    heatmap = occupancy_service.get_heatmap(db, start_date, end_date)
+    
+    # Среднее число людей в зале по каждому часу суток за период (взвешенное по времени)
+    peak_hours = [
+        GymOccupancyStats(
+            current_visitors=round(hour_stats.mean),
+            timestamp=end_date.replace(hour=hour_stats.hour, minute=0, second=0, microsecond=0)
+        )
+        for hour_stats in heatmap.by_hour
+    ]
     
-    # Агрегируем данные по часам
-    peak_hours = []
-    for hour in range(24):
-        avg_visitors = db.query(func.count(GymVisit.id)).filter(
-            GymVisit.check_in >= start_date,
-            GymVisit.check_in <= end_date,
-            func.extract('hour', GymVisit.check_in) == hour
-        ).scalar() or 0
-        
-        peak_hours.append(GymOccupancyStats(
-            current_visitors=avg_visitors,
-            timestamp=datetime.now().replace(hour=hour, minute=0, second=0, microsecond=0)
-        ))
+    return sorted(peak_hours, key=lambda x: x.current_visitors, reverse=True)
+
+@router.get("/heatmap", response_model=OccupancyHeatmap)
+def get_occupancy_heatmap(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    days: int = 30,
+    db: Session = Depends(get_db)
+):
+    if not end:
+        end = datetime.now()
+    if not start:
+        start = end - timedelta(days=days)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Конец периода должен быть позже начала")
+    if end - start > timedelta(days=366):
+        raise HTTPException(status_code=400, detail="Период не может превышать один год")
+    
+    return occupancy_service.get_heatmap(db, start, end)
+
+@router.post("/rollup/backfill", dependencies=[Depends(admin_only)])
+def backfill_rollup(start_date: date, end_date: date, db: Session = Depends(get_db)):
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="Конец периода должен быть не раньше начала")
     
-    return sorted(peak_hours, key=lambda x: x.current_visitors, reverse=True) 
\ No newline at end of file
+    hours = occupancy_service.backfill_rollup(db, start_date, end_date)
+    return {"message": "Витрина загрузки пересчитана", "hours": hours}
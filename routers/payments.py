@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from database import get_db
 from models import PriceList, Payment, User, GymMembership, MembershipType
 from schemas import PriceListCreate, PriceList as PriceListSchema, PaymentCreate, Payment as PaymentSchema, MembershipTypeCreate, MembershipTypeSchema, MembershipTypeWithPrice
 from dependencies import manager_or_admin, get_current_user
 from datetime import datetime, timedelta
+from pagination import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, apply_keyset, set_next_cursor, ndjson_stream
+from response_cache import response_cache, PRICES_TTL_SECONDS
 
 router = APIRouter(prefix="/api/payments", tags=["payments"])
 
@@ -16,17 +19,20 @@ def create_price(price: PriceListCreate, db: Session = Depends(get_db)):
     db.add(db_price)
     db.commit()
     db.refresh(db_price)
+    # Цены входят и в список типов абонементов
+    response_cache.invalidate("prices")
     return db_price
 
 @router.get("/prices", response_model=List[PriceListSchema])
 def get_prices(
+    request: Request,
     active_only: bool = True,
     db: Session = Depends(get_db)
 ):
     query = db.query(PriceList)
     if active_only:
         query = query.filter(PriceList.is_active == True)
-    return query.all()
+    return response_cache.respond(request, "prices", PRICES_TTL_SECONDS, query.all, List[PriceListSchema])
 
 @router.put("/prices/{price_id}", response_model=PriceListSchema, dependencies=[Depends(manager_or_admin)])
 def update_price(
@@ -43,6 +49,7 @@ def update_price(
     
     db.commit()
     db.refresh(db_price)
+    response_cache.invalidate("prices")
     return db_price
 
 # Оплата и создание абонемента
@@ -122,10 +129,24 @@ def complete_payment(
 
 @router.get("/history", response_model=List[PaymentSchema], dependencies=[Depends(get_current_user)])
 def get_payment_history(
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    stream: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return db.query(Payment).filter(Payment.user_id == current_user.id).all() 
+    # Новые платежи первыми
+    order = [Payment.id]
+    statement = apply_keyset(
+        select(Payment).filter(Payment.user_id == current_user.id), order, cursor, descending=True
+    )
+    if stream:
+        return ndjson_stream(statement, PaymentSchema)
+    
+    payments = db.execute(statement.limit(limit)).scalars().all()
+    set_next_cursor(response, payments, order, limit)
+    return payments
 
 # Добавим роуты для управления типами абонементов
 @router.post("/membership-types", response_model=MembershipTypeSchema, dependencies=[Depends(manager_or_admin)])
@@ -137,14 +158,25 @@ def create_membership_type(
     db.add(db_type)
     db.commit()
     db.refresh(db_type)
+    response_cache.invalidate("prices")
     return db_type
 
 @router.get("/membership-types", response_model=List[MembershipTypeWithPrice])
 def get_membership_types(
+    request: Request,
     active_only: bool = True,
     db: Session = Depends(get_db)
 ):
-    query = db.query(MembershipType)
+    # Тип абонемента вместе с его действующей ценой
+    query = db.query(MembershipType, PriceList.price).join(
+        PriceList, (PriceList.membership_type_id == MembershipType.id) & (PriceList.is_active == True)
+    )
     if active_only:
         query = query.filter(MembershipType.is_active == True)
-    return query.all() 
\ No newline at end of file
+
+    def build():
+        return [
+            {"membership_type": membership_type, "price": price}
+            for membership_type, price in query.order_by(MembershipType.id, PriceList.id).all()
+        ]
+    return response_cache.respond(request, "prices", PRICES_TTL_SECONDS, build, List[MembershipTypeWithPrice]) 
\ No newline at end of file
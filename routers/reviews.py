@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy import delete, func
+from typing import List, Dict
 from database import get_db
 from models import TrainerReview, User, UserRole
 from schemas import (
@@ -11,6 +11,8 @@ from schemas import (
 )
 from dependencies import trainer_or_admin, all_roles, get_current_user, manager_or_admin
 from datetime import datetime
+from services import reviews as review_stats_service
+from response_cache import response_cache
 
 router = APIRouter(prefix="/api/reviews", tags=["reviews"])
 
@@ -63,50 +65,49 @@ def get_trainer_reviews(
 
 @router.get("/trainer/{trainer_id}/stats", response_model=TrainerReviewStats)
 def get_trainer_review_stats(trainer_id: int, db: Session = Depends(get_db)):
-    # Получаем только одобренные отзывы
-    reviews = db.query(TrainerReview).filter(
-        TrainerReview.trainer_id == trainer_id,
-        TrainerReview.is_approved == True
-    ).all()
-    
-    if not reviews:
-        return TrainerReviewStats(
-            average_rating=0.0,
-            total_reviews=0,
-            rating_distribution={1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        )
-    
-    # Подсчитываем статистику
-    total_reviews = len(reviews)
-    average_rating = sum(r.rating for r in reviews) / total_reviews
-    
-    # Распределение оценок
-    distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-    for review in reviews:
-        distribution[review.rating] += 1
-    
-    return TrainerReviewStats(
-        average_rating=round(average_rating, 2),
-        total_reviews=total_reviews,
-        rating_distribution=distribution
-    )
+    # Сводная статистика по одобренным отзывам
+    return review_stats_service.get_review_stats(db, trainer_id)
+
+@router.get("/stats", response_model=Dict[int, TrainerReviewStats])
+def get_trainers_review_stats(
+    trainer_ids: List[int] = Query(..., max_length=200),
+    db: Session = Depends(get_db)
+):
+    """Статистика отзывов сразу для нескольких тренеров (для страницы списка тренеров)"""
+    return review_stats_service.get_review_stats_map(db, trainer_ids)
 
 @router.put("/{review_id}/approve", dependencies=[Depends(manager_or_admin)])
 def approve_review(review_id: int, db: Session = Depends(get_db)):
-    review = db.query(TrainerReview).filter(TrainerReview.id == review_id).first()
+    review = db.query(TrainerReview.trainer_id, TrainerReview.rating).filter(TrainerReview.id == review_id).first()
     if not review:
         raise HTTPException(status_code=404, detail="Отзыв не найден")
     
-    review.is_approved = True
+    # Условный UPDATE: из параллельных одобрений статистику меняет только одно
+    approved = db.query(TrainerReview).filter(
+        TrainerReview.id == review_id,
+        TrainerReview.is_approved == False
+    ).update({TrainerReview.is_approved: True}, synchronize_session=False)
+    if approved == 1:
+        review_stats_service.apply_review_change(db, review.trainer_id, review.rating, +1)
     db.commit()
+    # Отзывы и статистика входят в карточки тренеров
+    response_cache.invalidate("trainers")
     return {"message": "Отзыв одобрен"}
 
 @router.delete("/{review_id}", dependencies=[Depends(manager_or_admin)])
 def delete_review(review_id: int, db: Session = Depends(get_db)):
-    review = db.query(TrainerReview).filter(TrainerReview.id == review_id).first()
-    if not review:
+    # DELETE ... RETURNING: статус одобрения берется у той же строки, которую удалили,
+    # поэтому одобрение, успевшее до удаления, учитывается, а повторное удаление - нет
+    deleted = db.execute(
+        delete(TrainerReview).where(TrainerReview.id == review_id).returning(
+            TrainerReview.trainer_id, TrainerReview.rating, TrainerReview.is_approved
+        )
+    ).first()
+    if not deleted:
         raise HTTPException(status_code=404, detail="Отзыв не найден")
     
-    db.delete(review)
+    if deleted.is_approved:
+        review_stats_service.apply_review_change(db, deleted.trainer_id, deleted.rating, -1)
     db.commit()
-    return {"message": "Отзыв удален"} 
\ No newline at end of file
+    response_cache.invalidate("trainers")
+    return {"message": "Отзыв удален"}
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, date
-from database import get_db
+from database import get_db, get_async_db
 from models import User, TrainerSchedule, UserRole, TrainingType, TrainingParticipant, GymMembership
-from schemas import TrainerScheduleCreate, TrainerSchedule as TrainerScheduleSchema, TrainerScheduleBase, TrainingParticipant as ParticipantSchema, ScheduleCreate, Schedule
+from schemas import TrainerScheduleCreate, TrainerSchedule as TrainerScheduleSchema, TrainerScheduleBase, TrainingParticipant as ParticipantSchema, ScheduleCreate, Schedule, AvailableSlot
 from dependencies import trainer_or_admin, get_current_user
+from response_cache import response_cache
+from services import availability, booking, notifications
+from pagination import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, apply_keyset, set_next_cursor
 from datetime import date, time, datetime, timedelta
 
 router = APIRouter(prefix="/api/schedule", tags=["schedule"])
@@ -13,23 +18,40 @@ router = APIRouter(prefix="/api/schedule", tags=["schedule"])
 @router.post("/", response_model=None)
 async def create_schedule(
     schedule: ScheduleCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(trainer_or_admin)
 ):
+    # Такое занятие не попало бы в свободные слоты (services/availability.py).
+    # Проверка идет под той же блокировкой строки тренера, что и запись
+    # (booking._trainer_busy), иначе параллельная запись ее не увидит
+    if db.get_bind().dialect.name != "sqlite":
+        await db.execute(select(User.id).where(User.id == schedule.trainer_id).with_for_update())
+    busy = (await db.execute(availability.booked_overlap(
+        schedule.trainer_id, schedule.date, schedule.start_time, schedule.end_time
+    ))).first()
+    if busy:
+        raise HTTPException(status_code=400, detail="Тренер в это время уже ведет занятие, на которое записаны клиенты")
+    
     db_schedule = TrainerSchedule(**schedule.dict())
     db.add(db_schedule)
-    db.commit()
-    db.refresh(db_schedule)
+    await db.commit()
+    await db.refresh(db_schedule)
+    # Расписание и участники входят в карточки тренеров
+    response_cache.invalidate("trainers")
+    availability.invalidate(db_schedule.trainer_id, db_schedule.date)
     return db_schedule
 
-@router.get("/", response_model=None)
+@router.get("/", response_model=List[Schedule])
 async def get_schedules(
+    response: Response,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     trainer_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(TrainerSchedule)
+    query = select(TrainerSchedule)
     
     if start_date:
         query = query.filter(TrainerSchedule.date >= start_date)
@@ -38,86 +60,22 @@ async def get_schedules(
     if trainer_id:
         query = query.filter(TrainerSchedule.trainer_id == trainer_id)
     
-    return query.all()
+    # Порядок совпадает с индексами (date, start_time) и (trainer_id, date, start_time)
+    order = [TrainerSchedule.date, TrainerSchedule.start_time, TrainerSchedule.id]
+    schedules = (await db.execute(apply_keyset(query, order, cursor).limit(limit))).scalars().all()
+    set_next_cursor(response, schedules, order, limit)
+    return schedules
 
 @router.post("/{schedule_id}/join", response_model=ParticipantSchema)
 def join_training(
     schedule_id: int,
+    waitlist: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Проверяем существование тренировки
-    schedule = db.query(TrainerSchedule).filter(TrainerSchedule.id == schedule_id).first()
-    if not schedule:
-        raise HTTPException(status_code=404, detail="Тренировка не найдена")
-    
-    if not schedule.is_available:
-        raise HTTPException(status_code=400, detail="Тренировка недоступна для записи")
-    
-    # Проверяем наличие активного абонемента
-    active_membership = db.query(GymMembership).filter(
-        GymMembership.user_id == current_user.id,
-        GymMembership.status == "active",
-        GymMembership.start_date <= datetime.now().date(),
-        GymMembership.end_date >= datetime.now().date(),
-        GymMembership.visits_left > 0
-    ).first()
-    
-    if not active_membership:
-        raise HTTPException(
-            status_code=400, 
-            detail="У вас нет активного абонемента или закончились доступные посещения"
-        )
-    
-    # Проверяем, не записан ли уже пользователь
-    existing_participant = db.query(TrainingParticipant).filter(
-        TrainingParticipant.schedule_id == schedule_id,
-        TrainingParticipant.user_id == current_user.id
-    ).first()
-    
-    if existing_participant:
-        if existing_participant.status == "confirmed":
-            raise HTTPException(status_code=400, detail="Вы уже записаны на эту тренировку")
-        elif existing_participant.status == "cancelled":
-            # Если была отмена, обновляем статус
-            existing_participant.status = "confirmed"
-            db.commit()
-            db.refresh(existing_participant)
-            return existing_participant
-    
-    # Проверяем тип тренировки и доступность мест
-    if schedule.training_type == TrainingType.GROUP:
-        participants_count = db.query(TrainingParticipant).filter(
-            TrainingParticipant.schedule_id == schedule_id,
-            TrainingParticipant.status == "confirmed"
-        ).count()
-        
-        if participants_count >= schedule.max_participants:
-            raise HTTPException(status_code=400, detail="Группа уже заполнена")
-    
-    elif schedule.training_type == TrainingType.PERSONAL:
-        existing_participant = db.query(TrainingParticipant).filter(
-            TrainingParticipant.schedule_id == schedule_id,
-            TrainingParticipant.status == "confirmed"
-        ).first()
-        
-        if existing_participant:
-            raise HTTPException(status_code=400, detail="На это время уже записан другой клиент")
-    
-    # Создаем запись на тренировку
-    participant = TrainingParticipant(
-        schedule_id=schedule_id,
-        user_id=current_user.id,
-        status="confirmed"
-    )
-    
-    # Уменьшаем количество доступных посещений
-    active_membership.visits_left -= 1
-    
-    db.add(participant)
-    db.commit()
-    db.refresh(participant)
-    
+    # Если мест нет, при waitlist=true клиент встает в лист ожидания (status="waiting")
+    participant = booking.book_training(db, schedule_id, current_user.id, waitlist=waitlist)
+    response_cache.invalidate("trainers")
     return participant
 
 @router.delete("/{schedule_id}/cancel")
@@ -126,42 +84,10 @@ def cancel_training_participation(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Находим запись на тренировку
-    participant = db.query(TrainingParticipant).filter(
-        TrainingParticipant.schedule_id == schedule_id,
-        TrainingParticipant.user_id == current_user.id,
-        TrainingParticipant.status == "confirmed"
-    ).first()
-    
-    if not participant:
-        raise HTTPException(status_code=404, detail="Запись на тренировку не найдена")
-    
-    # Проверяем время до тренировки (например, отмена возможна не менее чем за 24 часа)
-    schedule = db.query(TrainerSchedule).filter(TrainerSchedule.id == schedule_id).first()
-    training_datetime = datetime.combine(schedule.date, schedule.start_time)
-    
-    if datetime.now() + timedelta(hours=24) > training_datetime:
-        raise HTTPException(
-            status_code=400, 
-            detail="Отмена тренировки возможна не менее чем за 24 часа"
-        )
-    
-    # Отменяем запись и возвращаем посещение в абонемент
-    participant.status = "cancelled"
-    
-    active_membership = db.query(GymMembership).filter(
-        GymMembership.user_id == current_user.id,
-        GymMembership.status == "active",
-        GymMembership.start_date <= datetime.now().date(),
-        GymMembership.end_date >= datetime.now().date()
-    ).first()
-    
-    if active_membership:
-        active_membership.visits_left += 1
-    
-    db.commit()
-    
-    return {"message": "Запись на тренировку отменена"}
+    # Отмена записи (не менее чем за 24 часа) или выход из листа ожидания
+    message = booking.cancel_booking(db, schedule_id, current_user.id)
+    response_cache.invalidate("trainers")
+    return {"message": message}
 
 # Добавим новый ��ндпоинт для получения расписания за период
 @router.get("/trainer/{trainer_id}/period")
@@ -182,32 +108,46 @@ def get_trainer_schedule_by_period(
         TrainerSchedule.trainer_id == trainer_id,
         TrainerSchedule.date >= start_date,
         TrainerSchedule.date <= end_date
-    ).all()
+    ).order_by(TrainerSchedule.date, TrainerSchedule.start_time).all()
     
     return {
         "trainer": trainer,
         "schedules": schedules
     } 
 
-# Просмотр расписания доступен всем
-@router.get("/trainer/{trainer_id}")
-@router.get("/available")
-
-# Управление расписанием только для тренеров и админов
-@router.post("/", dependencies=[Depends(trainer_or_admin)])
-@router.put("/{schedule_id}", dependencies=[Depends(trainer_or_admin)])
-@router.delete("/{schedule_id}", dependencies=[Depends(trainer_or_admin)]) 
+# Свободные места доступны всем
+@router.get("/available", response_model=List[AvailableSlot])
+def get_available_slots(
+    start_date: date,
+    end_date: date,
+    trainer_id: Optional[int] = None,
+    training_type: Optional[TrainingType] = None,
+    db: Session = Depends(get_db)
+):
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="Дата окончания раньше даты начала")
+    if (end_date - start_date).days >= availability.AVAILABILITY_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Период не может быть длиннее {availability.AVAILABILITY_MAX_DAYS} дней"
+        )
+    return availability.find_available_slots(
+        db, start_date, end_date, trainer_id, training_type.value if training_type else None
+    )
 
 @router.delete("/{schedule_id}")
 async def delete_schedule(
     schedule_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(trainer_or_admin)
 ):
-    schedule = db.query(TrainerSchedule).filter(TrainerSchedule.id == schedule_id).first()
+    schedule = await db.get(TrainerSchedule, schedule_id)
     if not schedule:
         raise HTTPException(status_code=404, detail="Расписание не найдено")
     
-    db.delete(schedule)
-    db.commit()
+    trainer_id, day = schedule.trainer_id, schedule.date
+    # Уведомления участникам и листу ожидания - в той же транзакции, что удаление
+    await notifications.cancel_training(db, schedule)
+    response_cache.invalidate("trainers")
+    availability.invalidate(trainer_id, day)
     return {"message": "Расписание удалено"} 
\ No newline at end of file
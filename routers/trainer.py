@@ -1,23 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
+from sqlalchemy.orm import Session, joinedload, subqueryload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from database import get_db
-from models import TrainerInfo, User, UserRole
+from collections import defaultdict
+from datetime import date, timedelta
+from database import get_db, get_async_db
+from models import TrainerInfo, TrainerSchedule, User, UserRole
 from schemas import (
     TrainerInfoCreate,
     TrainerInfo as TrainerInfoSchema,
     TrainerWithFullInfo,
-    TrainerInfoBase
+    TrainerInfoBase,
+    User as UserSchema
 )
 from dependencies import trainer_or_admin
-import shutil
-import os
-from uuid import uuid4
+from services.reviews import get_review_stats_map
+from response_cache import response_cache, TRAINERS_TTL_SECONDS
+from services.uploads import save_image
 
 router = APIRouter(prefix="/api/trainers", tags=["trainers"])
 
-UPLOAD_DIR = "uploads/trainers"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.post("/info", response_model=TrainerInfoSchema, dependencies=[Depends(trainer_or_admin)])
 def create_trainer_info(trainer_info: TrainerInfoCreate, db: Session = Depends(get_db)):
@@ -40,22 +43,73 @@ def create_trainer_info(trainer_info: TrainerInfoCreate, db: Session = Depends(g
     db.add(db_trainer_info)
     db.commit()
     db.refresh(db_trainer_info)
+    response_cache.invalidate("trainers")
     return db_trainer_info
 
+# Сколько дней расписания отдавать в карточке тренера
+SCHEDULE_WINDOW_DAYS = 14
+
+def _build_full_info(db: Session, trainers: List[User], schedule_days: int) -> List[TrainerWithFullInfo]:
+    """
+    Карточки тренеров фиксированным числом запросов, независимо от количества тренеров:
+    информация о тренерах, ближайшее расписание с участниками и статистика отзывов
+    загружаются пачкой по всем id.
+    """
+    trainer_ids = [trainer.id for trainer in trainers]
+    today = date.today()
+    
+    schedules_by_trainer = defaultdict(list)
+    if trainer_ids:
+        # subqueryload - одним запросом; selectinload делит IN по 500 id,
+        # и число запросов росло бы с количеством тренировок
+        schedules = db.query(TrainerSchedule).options(
+            subqueryload(TrainerSchedule.participants)
+        ).filter(
+            TrainerSchedule.trainer_id.in_(trainer_ids),
+            TrainerSchedule.date >= today,
+            TrainerSchedule.date <= today + timedelta(days=schedule_days)
+        ).order_by(TrainerSchedule.date, TrainerSchedule.start_time).all()
+        for schedule in schedules:
+            schedules_by_trainer[schedule.trainer_id].append(schedule)
+    
+    review_stats = get_review_stats_map(db, trainer_ids)
+    
+    return [
+        TrainerWithFullInfo(
+            **UserSchema.model_validate(trainer).model_dump(),
+            trainer_info=trainer.trainer_info,
+            schedules=schedules_by_trainer[trainer.id],
+            review_stats=review_stats[trainer.id]
+        )
+        for trainer in trainers
+    ]
+
 @router.get("/info/{trainer_id}", response_model=TrainerWithFullInfo)
-def get_trainer_info(trainer_id: int, db: Session = Depends(get_db)):
-    trainer = db.query(User).filter(
+def get_trainer_info(
+    trainer_id: int,
+    schedule_days: int = Query(SCHEDULE_WINDOW_DAYS, ge=0, le=90),
+    db: Session = Depends(get_db)
+):
+    trainer = db.query(User).options(joinedload(User.trainer_info)).filter(
         User.id == trainer_id,
         User.role == UserRole.TRAINER
     ).first()
     if not trainer:
         raise HTTPException(status_code=404, detail="Тренер не найден")
-    return trainer
+    return _build_full_info(db, [trainer], schedule_days)[0]
 
 @router.get("/all", response_model=List[TrainerWithFullInfo])
-def get_all_trainers_info(db: Session = Depends(get_db)):
-    trainers = db.query(User).filter(User.role == UserRole.TRAINER).all()
-    return trainers
+def get_all_trainers_info(
+    request: Request,
+    schedule_days: int = Query(SCHEDULE_WINDOW_DAYS, ge=0, le=90),
+    db: Session = Depends(get_db)
+):
+    def build():
+        trainers = db.query(User).options(joinedload(User.trainer_info)).filter(
+            User.role == UserRole.TRAINER
+        ).order_by(User.id).all()
+        return _build_full_info(db, trainers, schedule_days)
+    return response_cache.respond(request, "trainers", TRAINERS_TTL_SECONDS, build, List[TrainerWithFullInfo])
 
 @router.put("/info/{trainer_id}", response_model=TrainerInfoSchema, dependencies=[Depends(trainer_or_admin)])
 def update_trainer_info(
@@ -72,29 +126,27 @@ def update_trainer_info(
     
     db.commit()
     db.refresh(db_trainer_info)
+    response_cache.invalidate("trainers")
     return db_trainer_info
 
 @router.post("/info/{trainer_id}/photo", dependencies=[Depends(trainer_or_admin)])
 async def upload_trainer_photo(
     trainer_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    trainer_info = db.query(TrainerInfo).filter(TrainerInfo.trainer_id == trainer_id).first()
+    trainer_info = (await db.execute(
+        select(TrainerInfo).filter(TrainerInfo.trainer_id == trainer_id)
+    )).scalars().first()
     if not trainer_info:
         raise HTTPException(status_code=404, detail="Информация о тренере не найдена")
     
-    # Генерируем уникальное имя файла
-    file_extension = os.path.splitext(file.filename)[1]
-    file_name = f"{uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-    
-    # Сохраняем файл
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Сохраняем файл и уменьшенные копии
+    saved = await save_image(file)
     
     # Обновляем путь к фото в БД
-    trainer_info.photo_url = f"/uploads/trainers/{file_name}"
-    db.commit()
+    trainer_info.photo_url = saved["url"]
+    await db.commit()
+    response_cache.invalidate("trainers")
     
-    return {"photo_url": trainer_info.photo_url} 
\ No newline at end of file
+    return {"photo_url": trainer_info.photo_url, "variants": saved["variants"]} 
\ No newline at end of file
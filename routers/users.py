@@ -1,21 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from database import get_db
 from models import User, UserRole
 from schemas import UserCreate, User as UserSchema
-from dependencies import admin_only
+from dependencies import admin_only, principal_cache
 from utils import get_password_hash
+from pagination import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, apply_keyset, set_next_cursor, ndjson_stream
+from response_cache import response_cache, TRAINERS_TTL_SECONDS
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
 @router.get("/", response_model=List[UserSchema], dependencies=[Depends(admin_only)])
-def get_users(db: Session = Depends(get_db)):
-    return db.query(User).all()
+def get_users(
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    order = [User.id]
+    statement = apply_keyset(select(User), order, cursor)
+    if stream:
+        return ndjson_stream(statement, UserSchema)
+    
+    users = db.execute(statement.limit(limit)).scalars().all()
+    set_next_cursor(response, users, order, limit)
+    return users
 
 @router.get("/trainers", response_model=List[UserSchema])
-def get_trainers(db: Session = Depends(get_db)):
-    return db.query(User).filter(User.role == UserRole.TRAINER).all()
+def get_trainers(request: Request, db: Session = Depends(get_db)):
+    query = db.query(User).filter(User.role == UserRole.TRAINER)
+    return response_cache.respond(request, "trainers", TRAINERS_TTL_SECONDS, query.all, List[UserSchema])
 
 @router.put("/{user_id}/role", dependencies=[Depends(admin_only)])
 def update_user_role(user_id: int, role: UserRole, db: Session = Depends(get_db)):
@@ -24,4 +41,7 @@ def update_user_role(user_id: int, role: UserRole, db: Session = Depends(get_db)
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     user.role = role
     db.commit()
+    # Сбрасываем закэшированные токены пользователя, чтобы новая роль применилась сразу
+    principal_cache.invalidate_user(user_id)
+    response_cache.invalidate("trainers")
     return {"message": "Роль успешно обновлена"} 
\ No newline at end of file
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from typing import List
+from sqlalchemy import func, and_, select
+from typing import List, Optional
 from database import get_db
 from models import GymVisit, User, GymMembership
 from schemas import GymVisitCreate, GymVisit as GymVisitSchema, GymVisitUpdate, GymOccupancyStats
 from dependencies import trainer_or_admin
 from datetime import datetime, date, timedelta
+from services import occupancy as occupancy_service
+from services.live_occupancy import occupancy_counter
+from pagination import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, apply_keyset, set_next_cursor, ndjson_stream
 
 router = APIRouter(prefix="/api/visits", tags=["visits"])
 
@@ -41,6 +44,7 @@ def check_in(visit: GymVisitCreate, db: Session = Depends(get_db)):
     membership.visits_left -= 1
     
     db.commit()
+    occupancy_counter.increment()
     db.refresh(db_visit)
     return db_visit
 
@@ -53,20 +57,23 @@ def check_out(visit_id: int, db: Session = Depends(get_db)):
     if visit.check_out:
         raise HTTPException(status_code=400, detail="Посещение уже завершено")
     
-    visit.check_out = datetime.now()
+    # Условный UPDATE: при параллельных запросах выход засчитывается один раз
+    updated = db.query(GymVisit).filter(
+        GymVisit.id == visit_id,
+        GymVisit.check_out == None
+    ).update({GymVisit.check_out: datetime.now()}, synchronize_session=False)
     db.commit()
+    if not updated:
+        raise HTTPException(status_code=400, detail="Посещение уже завершено")
+    occupancy_counter.decrement()
     db.refresh(visit)
     return visit
 
 @router.get("/current", response_model=GymOccupancyStats)
-def get_current_occupancy(db: Session = Depends(get_db)):
-    # Подсчитываем количество людей в зале (с check_in, но без check_out)
-    current_visitors = db.query(GymVisit).filter(
-        GymVisit.check_out == None
-    ).count()
-    
+def get_current_occupancy():
+    # Счетчик ведется check-in/check-out и сверяется с БД в фоне
     return GymOccupancyStats(
-        current_visitors=current_visitors,
+        current_visitors=occupancy_counter.get(),
         timestamp=datetime.now()
     )
 
@@ -75,42 +82,32 @@ def get_daily_stats(target_date: date = None, db: Session = Depends(get_db)):
     if not target_date:
         target_date = date.today()
     
-    # Получаем статистику по часам
-    stats = []
-    for hour in range(24):
-        start_time = datetime.combine(target_date, datetime.min.time().replace(hour=hour))
-        end_time = start_time + timedelta(hours=1)
-        
-        # Подсчитываем количество людей в зале за каждый час
-        visitors_count = db.query(GymVisit).filter(
-            and_(
-                GymVisit.check_in < end_time,
-                or_(
-                    GymVisit.check_out == None,
-                    GymVisit.check_out > start_time
-                )
-            )
-        ).count()
-        
-        stats.append(GymOccupancyStats(
-            current_visitors=visitors_count,
-            timestamp=start_time
-        ))
-    
-    return stats
+    return occupancy_service.get_daily_stats(db, target_date)
 
 @router.get("/user/{user_id}", response_model=List[GymVisitSchema])
 def get_user_visits(
     user_id: int,
+    response: Response,
     start_date: date = None,
     end_date: date = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    stream: bool = False,
     db: Session = Depends(get_db)
 ):
-    query = db.query(GymVisit).filter(GymVisit.user_id == user_id)
+    query = select(GymVisit).filter(GymVisit.user_id == user_id)
     
     if start_date:
         query = query.filter(GymVisit.check_in >= datetime.combine(start_date, datetime.min.time()))
     if end_date:
         query = query.filter(GymVisit.check_in <= datetime.combine(end_date, datetime.max.time()))
     
-    return query.order_by(GymVisit.check_in.desc()).all() 
\ No newline at end of file
+    # Сначала последние посещения; id делает ключ сортировки уникальным
+    order = [GymVisit.check_in, GymVisit.id]
+    query = apply_keyset(query, order, cursor, descending=True)
+    if stream:
+        return ndjson_stream(query, GymVisitSchema)
+    
+    visits = db.execute(query.limit(limit)).scalars().all()
+    set_next_cursor(response, visits, order, limit)
+    return visits 
\ No newline at end of file
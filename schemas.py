@@ -86,6 +86,21 @@ class GymOccupancyStats(BaseModel):
     class Config:
         from_attributes = True
 
+class OccupancyHourStats(BaseModel):
+    day_of_week: Optional[int] = None  # 0 - понедельник, None - по всем дням
+    hour: int
+    # Статистика по среднему числу людей в зале за час (человеко-часы / час)
+    mean: float
+    median: float
+    p95: float
+    samples: int
+
+class OccupancyHeatmap(BaseModel):
+    start: datetime
+    end: datetime
+    by_hour: List[OccupancyHourStats]
+    by_weekday_hour: List[OccupancyHourStats]
+
 # Схемы для расписания
 class TrainingType(str, Enum):
     PERSONAL = "personal"
@@ -131,6 +146,8 @@ class TrainerSchedule(TrainerScheduleBase):
     id: int
     trainer_id: int
     participants: List[TrainingParticipant] = []
+    current_participants: int = 0
+    available_places: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -211,9 +228,14 @@ class News(NewsBase):
     class Config:
         from_attributes = True
 
+class NewsListItem(News):
+    # Заполняются только при поиске
+    snippet: Optional[str] = None
+    rank: Optional[float] = None
+
 class NewsList(BaseModel):
     total: int
-    items: List[News]
+    items: List[NewsListItem]
 
 class MembershipTypeBase(BaseModel):
     name: str = Field(min_length=3, max_length=100)
@@ -283,14 +305,27 @@ class NotificationBase(BaseModel):
 class NotificationCreate(NotificationBase):
     user_id: int
 
-class Notification(NotificationBase):
+class Notification(BaseModel):
+    # Без ограничений NotificationBase: в ленте есть и системные типы (announcement, waitlist_confirmed, ...)
     id: int
+    type: str
+    title: str
+    message: str
     created_at: datetime
     read: bool
 
     class Config:
         from_attributes = True
 
+class NotificationsMarkRead(BaseModel):
+    # Задается одно из трех: все уведомления, список id или все до up_to_id включительно
+    all: bool = False
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=1000)
+    up_to_id: Optional[int] = Field(None, gt=0)
+
+class UnreadCount(BaseModel):
+    unread: int
+
 class MembershipCreate(BaseModel):
     user_id: int = Field(gt=0)
     membership_type_id: int = Field(gt=0)
@@ -333,9 +368,29 @@ class ScheduleBase(BaseModel):
 class ScheduleCreate(ScheduleBase):
     pass
 
+class AvailableSlot(BaseModel):
+    schedule_id: int
+    trainer_id: int
+    date: date
+    start_time: time
+    end_time: time
+    training_type: str
+    name: Optional[str] = None
+    capacity: Optional[int] = None
+    booked: int = 0
+    # None - групповая тренировка без ограничения мест
+    available_places: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
 class Schedule(ScheduleBase):
     id: int
+    # У персональных тренировок лимит не задан
+    max_participants: Optional[int] = None
+    is_available: Optional[bool] = None
     current_participants: int = 0
+    available_places: Optional[int] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
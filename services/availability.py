@@ -0,0 +1,365 @@
+"""
+Свободные для записи слоты расписания тренеров.
+
+Слоты недели строятся одним проходом по строкам TrainerSchedule,
+отсортированным по (тренер, дата, начало): занятые места берутся из
+confirmed_count, пересечения с уже набранными занятиями того же тренера
+ищутся через IntervalIndex. То же правило при записи на занятие и создании
+занятия проверяет booked_overlap.
+
+Слоты кэшируются в памяти процесса по (тренер, неделя) и сбрасываются
+при изменении расписания или записи (invalidate). TTL ограничивает
+устаревание данных, которые изменил другой воркер.
+"""
+import os
+import threading
+import time as clock
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from itertools import accumulate, groupby
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import TrainerSchedule, TrainingType
+
+AVAILABILITY_TTL_SECONDS = int(os.getenv("AVAILABILITY_TTL_SECONDS", "60"))
+# Максимальная длина запрашиваемого периода, дней
+AVAILABILITY_MAX_DAYS = 62
+
+
+@dataclass(frozen=True)
+class Slot:
+    """Занятие, на которое можно записаться"""
+    schedule_id: int
+    trainer_id: int
+    date: date
+    start_time: time
+    end_time: time
+    training_type: str
+    name: Optional[str]
+    capacity: Optional[int]
+    booked: int
+    available_places: Optional[int]
+
+
+class IntervalIndex:
+    """
+    Статический индекс интервалов [start, end) для поиска пересечений.
+
+    Интервалы отсортированы по началу, для каждой позиции хранится максимум
+    концов до нее включительно (как дополнительное поле в интервальном дереве):
+    обход назад от бинарного поиска останавливается, как только ни один
+    интервал левее не может дотянуться до начала запроса.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[time, time, int]]):
+        self._intervals = sorted(intervals, key=lambda interval: interval[0])
+        self._starts = [interval[0] for interval in self._intervals]
+        self._max_ends = list(accumulate((interval[1] for interval in self._intervals), max))
+
+    def overlapping(self, start: time, end: time) -> List[int]:
+        """Ключи интервалов, пересекающихся с [start, end)"""
+        found = []
+        for position in range(bisect_left(self._starts, end) - 1, -1, -1):
+            if self._max_ends[position] <= start:
+                break
+            interval_start, interval_end, key = self._intervals[position]
+            if interval_end > start:
+                found.append(key)
+        return found
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _weeks(start_date: date, end_date: date) -> List[date]:
+    first, last = week_start(start_date), week_start(end_date)
+    return [first + timedelta(weeks=i) for i in range((last - first).days // 7 + 1)]
+
+
+def booked_overlap(trainer_id: int, day: date, start_time: time, end_time: time, exclude_id: Optional[int] = None):
+    """
+    Запрос (select) занятий тренера, пересекающихся с [start_time, end_time)
+    в день day, на которые уже кто-то записан. Для sync и async сессий.
+    """
+    query = select(TrainerSchedule.id).where(
+        TrainerSchedule.trainer_id == trainer_id,
+        TrainerSchedule.date == day,
+        TrainerSchedule.start_time < end_time,
+        TrainerSchedule.end_time > start_time,
+        TrainerSchedule.confirmed_count > 0
+    )
+    if exclude_id is not None:
+        query = query.where(TrainerSchedule.id != exclude_id)
+    return query.limit(1)
+
+
+def build_slots(rows) -> Dict[int, List[Slot]]:
+    """
+    Слоты по тренерам из строк расписания, отсортированных по (тренер, дата, начало).
+    Занятие доступно, если открыто для записи, в нем есть места и тренер в это
+    время не ведет другое занятие, на которое уже кто-то записан.
+    """
+    slots_by_trainer = {}
+    for (trainer_id, _), day_rows in groupby(rows, key=lambda row: (row.trainer_id, row.date)):
+        day_rows = list(day_rows)
+        busy = IntervalIndex(
+            (row.start_time, row.end_time, row.id) for row in day_rows if row.confirmed_count
+        )
+        slots = slots_by_trainer.setdefault(trainer_id, [])
+        for row in day_rows:
+            if not row.is_available:
+                continue
+            capacity = 1 if row.training_type == TrainingType.PERSONAL else row.max_participants
+            booked = row.confirmed_count or 0
+            available_places = None if capacity is None else capacity - booked
+            if available_places is not None and available_places <= 0:
+                continue
+            if any(key != row.id for key in busy.overlapping(row.start_time, row.end_time)):
+                continue
+            slots.append(Slot(
+                schedule_id=row.id,
+                trainer_id=trainer_id,
+                date=row.date,
+                start_time=row.start_time,
+                end_time=row.end_time,
+                training_type=row.training_type,
+                name=row.name,
+                capacity=capacity,
+                booked=booked,
+                available_places=available_places,
+            ))
+    return slots_by_trainer
+
+
+class AvailabilityCache:
+    """
+    Слоты по (тренер, неделя). Для запросов без фильтра по тренеру неделя
+    помечается как загруженная целиком; сброс одного тренера оставляет
+    неделю загруженной, и при следующем запросе дочитывается только он.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._trainer_weeks: Dict[Tuple[int, date], Tuple[List[Slot], float]] = {}
+        # Неделя -> (истекает, тренеры с расписанием, сброшенные тренеры)
+        self._full_weeks: Dict[date, Tuple[float, Set[int], Set[int]]] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        """Счетчик сбросов: данные, прочитанные до сброса, в кэш не попадают"""
+        with self._lock:
+            return self._version
+
+    def get_trainer_week(self, trainer_id: int, week: date) -> Optional[List[Slot]]:
+        now = clock.monotonic()
+        with self._lock:
+            entry = self._trainer_weeks.get((trainer_id, week))
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            full = self._full_weeks.get(week)
+            if full is not None and full[0] > now and trainer_id not in full[2] and trainer_id not in full[1]:
+                # Неделя загружена целиком, а у тренера в ней нет занятий
+                self.hits += 1
+                return []
+            self.misses += 1
+            return None
+
+    def _prune(self, now: float):
+        """Удаление истекших записей, чтобы прошедшие недели не копились в памяти"""
+        for key in [key for key, entry in self._trainer_weeks.items() if entry[1] <= now]:
+            del self._trainer_weeks[key]
+        for week in [week for week, full in self._full_weeks.items() if full[0] <= now]:
+            del self._full_weeks[week]
+
+    def put_trainer_weeks(self, slots: Dict[Tuple[int, date], List[Slot]], version: int):
+        now = clock.monotonic()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            if version != self._version:
+                return
+            self._prune(now)
+            for (trainer_id, week), week_slots in slots.items():
+                self._trainer_weeks[(trainer_id, week)] = (week_slots, expires_at)
+                full = self._full_weeks.get(week)
+                if full is not None:
+                    full[2].discard(trainer_id)
+                    if week_slots:
+                        full[1].add(trainer_id)
+
+    def get_full_week(self, week: date) -> Optional[Tuple[Set[int], Set[int]]]:
+        """(тренеры недели, сброшенные тренеры) или None, если неделя не загружена"""
+        now = clock.monotonic()
+        with self._lock:
+            full = self._full_weeks.get(week)
+            if full is None or full[0] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return set(full[1]), set(full[2])
+
+    def get_cached_slots(self, trainer_ids: Iterable[int], week: date) -> List[Slot]:
+        with self._lock:
+            return [
+                slot
+                for trainer_id in trainer_ids
+                for slot in self._trainer_weeks.get((trainer_id, week), ([], 0))[0]
+            ]
+
+    def put_full_weeks(self, slots_by_week: Dict[date, Dict[int, List[Slot]]], version: int):
+        now = clock.monotonic()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            if version != self._version:
+                return
+            self._prune(now)
+            for week, slots_by_trainer in slots_by_week.items():
+                for key in [key for key in self._trainer_weeks if key[1] == week]:
+                    del self._trainer_weeks[key]
+                for trainer_id, week_slots in slots_by_trainer.items():
+                    self._trainer_weeks[(trainer_id, week)] = (week_slots, expires_at)
+                self._full_weeks[week] = (expires_at, set(slots_by_trainer), set())
+
+    def invalidate(self, trainer_id: int, day: date):
+        week = week_start(day)
+        with self._lock:
+            self._version += 1
+            self._trainer_weeks.pop((trainer_id, week), None)
+            full = self._full_weeks.get(week)
+            if full is not None:
+                full[2].add(trainer_id)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._trainer_weeks.clear()
+            self._full_weeks.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "trainer_weeks": len(self._trainer_weeks),
+                "full_weeks": len(self._full_weeks),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+availability_cache = AvailabilityCache(AVAILABILITY_TTL_SECONDS)
+
+
+def _load(db: Session, weeks: List[date], trainer_ids: Optional[Iterable[int]] = None) -> Dict[date, Dict[int, List[Slot]]]:
+    """Слоты указанных недель одним запросом (порядок совпадает с индексом trainer_id, date, start_time)"""
+    query = db.query(
+        TrainerSchedule.id,
+        TrainerSchedule.trainer_id,
+        TrainerSchedule.date,
+        TrainerSchedule.start_time,
+        TrainerSchedule.end_time,
+        TrainerSchedule.training_type,
+        TrainerSchedule.max_participants,
+        TrainerSchedule.is_available,
+        TrainerSchedule.confirmed_count,
+        TrainerSchedule.name,
+    ).filter(
+        TrainerSchedule.date >= min(weeks),
+        TrainerSchedule.date < max(weeks) + timedelta(weeks=1)
+    )
+    if trainer_ids is not None:
+        query = query.filter(TrainerSchedule.trainer_id.in_(list(trainer_ids)))
+    rows = query.order_by(TrainerSchedule.trainer_id, TrainerSchedule.date, TrainerSchedule.start_time).all()
+
+    slots_by_week = {week: {} for week in weeks}
+    for trainer_id, slots in build_slots(rows).items():
+        for week in weeks:
+            slots_by_week[week][trainer_id] = []
+        for slot in slots:
+            week = week_start(slot.date)
+            if week in slots_by_week:
+                slots_by_week[week][trainer_id].append(slot)
+    return slots_by_week
+
+
+def _trainer_slots(db: Session, trainer_id: int, weeks: List[date]) -> List[Slot]:
+    slots = []
+    missing = []
+    for week in weeks:
+        cached = availability_cache.get_trainer_week(trainer_id, week)
+        if cached is None:
+            missing.append(week)
+        else:
+            slots += cached
+    if missing:
+        version = availability_cache.version
+        loaded = _load(db, missing, [trainer_id])
+        fresh = {(trainer_id, week): loaded[week].get(trainer_id, []) for week in missing}
+        availability_cache.put_trainer_weeks(fresh, version)
+        for week_slots in fresh.values():
+            slots += week_slots
+    return slots
+
+
+def _all_slots(db: Session, weeks: List[date]) -> List[Slot]:
+    slots = []
+    missing = []
+    stale_weeks = {}
+    for week in weeks:
+        full = availability_cache.get_full_week(week)
+        if full is None:
+            missing.append(week)
+        else:
+            stale_weeks[week] = full
+
+    version = availability_cache.version
+    if missing:
+        loaded = _load(db, missing)
+        availability_cache.put_full_weeks(loaded, version)
+        slots += [slot for slots_by_trainer in loaded.values() for week_slots in slots_by_trainer.values() for slot in week_slots]
+
+    stale_trainers = set().union(*(stale for _, stale in stale_weeks.values()))
+    reloaded = _load(db, list(stale_weeks), stale_trainers) if stale_trainers else {}
+    if reloaded:
+        availability_cache.put_trainer_weeks({
+            (trainer_id, week): reloaded[week].get(trainer_id, [])
+            for week, (_, stale) in stale_weeks.items()
+            for trainer_id in stale
+        }, version)
+    for week, (trainers, stale) in stale_weeks.items():
+        slots += availability_cache.get_cached_slots(trainers - stale, week)
+        for trainer_id in stale:
+            slots += reloaded[week].get(trainer_id, [])
+    return slots
+
+
+def find_available_slots(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    trainer_id: Optional[int] = None,
+    training_type: Optional[str] = None
+) -> List[Slot]:
+    """Слоты за период [start_date, end_date], еще не начавшиеся, по дате и времени начала"""
+    weeks = _weeks(start_date, end_date)
+    slots = _trainer_slots(db, trainer_id, weeks) if trainer_id is not None else _all_slots(db, weeks)
+    now = datetime.now()
+    return sorted(
+        (
+            slot for slot in slots
+            if start_date <= slot.date <= end_date
+            and (training_type is None or slot.training_type == training_type)
+            and datetime.combine(slot.date, slot.start_time) > now
+        ),
+        key=lambda slot: (slot.date, slot.start_time, slot.trainer_id, slot.schedule_id)
+    )
+
+
+def invalidate(trainer_id: int, day: date):
+    """Сброс слотов недели тренера после изменения расписания или записи"""
+    availability_cache.invalidate(trainer_id, day)
@@ -0,0 +1,279 @@
+"""
+Запись на тренировки без превышения лимита мест.
+
+Все изменения записей одной тренировки выполняются под блокировкой строки
+расписания (SELECT ... FOR UPDATE, в SQLite - блокировка записи БД), поэтому
+подсчет мест и вставка участника не разделяются чужими записями.
+Посещения списываются условным UPDATE ... WHERE visits_left > 0.
+Число подтвержденных участников хранится в TrainerSchedule.confirmed_count
+и меняется в той же транзакции; repair_confirmed_counts сверяет его с
+TrainingParticipant.
+
+Если мест нет, клиент может встать в лист ожидания; при отмене записи
+первый из листа ожидания с действующим абонементом переводится в участники.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import TrainerSchedule, TrainingParticipant, GymMembership, TrainingType, Notification, User
+from services import availability
+
+logger = logging.getLogger(__name__)
+
+STATUS_CONFIRMED = "confirmed"
+STATUS_WAITLISTED = "waiting"
+STATUS_CANCELLED = "cancelled"
+
+# Отмена записи возможна не позднее чем за это время до начала
+CANCELLATION_DEADLINE = timedelta(hours=24)
+
+
+def _lock_schedule(db: Session, schedule_id: int) -> Optional[TrainerSchedule]:
+    """Блокировка тренировки до конца транзакции; должна быть первым запросом транзакции"""
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite не поддерживает FOR UPDATE: пустой UPDATE берет блокировку записи
+        db.execute(
+            update(TrainerSchedule).where(TrainerSchedule.id == schedule_id).values(id=TrainerSchedule.id)
+            .execution_options(synchronize_session=False)
+        )
+        return db.query(TrainerSchedule).filter(TrainerSchedule.id == schedule_id).populate_existing().first()
+    return db.query(TrainerSchedule).filter(TrainerSchedule.id == schedule_id).with_for_update().first()
+
+
+def _trainer_busy(db: Session, schedule: TrainerSchedule) -> bool:
+    """
+    Тренер в это время ведет другое занятие, на которое уже записаны (правило
+    availability.build_slots). Записи на занятия одного тренера проверяются по
+    очереди: после блокировки тренировки блокируется строка тренера (в SQLite
+    запись и так одна).
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        db.query(User.id).filter(User.id == schedule.trainer_id).with_for_update().first()
+    return db.execute(availability.booked_overlap(
+        schedule.trainer_id, schedule.date, schedule.start_time, schedule.end_time, exclude_id=schedule.id
+    )).first() is not None
+
+
+def _change_confirmed_count(db: Session, schedule: TrainerSchedule, delta: int):
+    """Изменение счетчика участников в той же транзакции, что и запись участника"""
+    schedule.confirmed_count = TrainerSchedule.confirmed_count + delta
+    db.flush()
+
+
+def _confirmed_count(db: Session, schedule_id: int) -> int:
+    return db.query(TrainingParticipant).filter(
+        TrainingParticipant.schedule_id == schedule_id,
+        TrainingParticipant.status == STATUS_CONFIRMED
+    ).count()
+
+
+def _active_membership_id(db: Session, user_id: int, with_visits: bool) -> Optional[int]:
+    today = datetime.now().date()
+    query = db.query(GymMembership.id).filter(
+        GymMembership.user_id == user_id,
+        GymMembership.status == "active",
+        GymMembership.start_date <= today,
+        GymMembership.end_date >= today
+    )
+    if with_visits:
+        query = query.filter(GymMembership.visits_left > 0)
+    return query.order_by(GymMembership.end_date).limit(1).scalar()
+
+
+def _charge_visit(db: Session, user_id: int) -> bool:
+    """Списание одного посещения с действующего абонемента; False, если списать нечего"""
+    membership_id = _active_membership_id(db, user_id, with_visits=True)
+    if membership_id is None:
+        return False
+    result = db.execute(
+        update(GymMembership).where(
+            GymMembership.id == membership_id,
+            GymMembership.visits_left > 0
+        ).values(visits_left=GymMembership.visits_left - 1).execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _refund_visit(db: Session, user_id: int):
+    membership_id = _active_membership_id(db, user_id, with_visits=False)
+    if membership_id is not None:
+        db.execute(
+            update(GymMembership).where(GymMembership.id == membership_id)
+            .values(visits_left=GymMembership.visits_left + 1).execution_options(synchronize_session=False)
+        )
+
+
+def _promote_from_waitlist(db: Session, schedule: TrainerSchedule) -> Optional[TrainingParticipant]:
+    """Перевод первого из листа ожидания, у кого есть посещения, в участники"""
+    waiting = db.query(TrainingParticipant).filter(
+        TrainingParticipant.schedule_id == schedule.id,
+        TrainingParticipant.status == STATUS_WAITLISTED
+    ).order_by(TrainingParticipant.waitlisted_at, TrainingParticipant.id).all()
+    for participant in waiting:
+        if not _charge_visit(db, participant.user_id):
+            continue
+        participant.status = STATUS_CONFIRMED
+        participant.waitlisted_at = None
+        _change_confirmed_count(db, schedule, +1)
+        db.add(Notification(
+            user_id=participant.user_id,
+            type="waitlist_confirmed",
+            title="Освободилось место на тренировке",
+            message=f"Вы записаны на тренировку {schedule.date} в {schedule.start_time}"
+        ))
+        logger.info(f"[BOOKING] Пользователь {participant.user_id} переведен из листа ожидания, тренировка {schedule.id}")
+        return participant
+    return None
+
+
+def book_training(db: Session, schedule_id: int, user_id: int, waitlist: bool = False) -> TrainingParticipant:
+    """
+    Запись на тренировку. Если мест нет и waitlist=True, клиент встает
+    в лист ожидания (посещение спишется при переводе в участники).
+    """
+    try:
+        schedule = _lock_schedule(db, schedule_id)
+        if not schedule:
+            raise HTTPException(status_code=404, detail="Тренировка не найдена")
+        if not schedule.is_available:
+            raise HTTPException(status_code=400, detail="Тренировка недоступна для записи")
+        if _trainer_busy(db, schedule):
+            raise HTTPException(status_code=400, detail="Тренер в это время ведет другое занятие")
+
+        participant = db.query(TrainingParticipant).filter(
+            TrainingParticipant.schedule_id == schedule_id,
+            TrainingParticipant.user_id == user_id
+        ).first()
+        if participant and participant.status == STATUS_CONFIRMED:
+            raise HTTPException(status_code=400, detail="Вы уже записаны на эту тренировку")
+        if participant and participant.status == STATUS_WAITLISTED:
+            raise HTTPException(status_code=400, detail="Вы уже в листе ожидания этой тренировки")
+
+        no_visits = HTTPException(
+            status_code=400,
+            detail="У вас нет активного абонемента или закончились доступные посещения"
+        )
+        # Строка расписания заблокирована и перечитана, счетчик актуален
+        if schedule.capacity is not None and schedule.current_participants >= schedule.capacity:
+            if not waitlist:
+                if schedule.training_type == TrainingType.PERSONAL:
+                    raise HTTPException(status_code=400, detail="На это время уже записан другой клиент")
+                raise HTTPException(status_code=400, detail="Группа уже заполнена")
+            if _active_membership_id(db, user_id, with_visits=True) is None:
+                raise no_visits
+            status = STATUS_WAITLISTED
+        else:
+            if not _charge_visit(db, user_id):
+                raise no_visits
+            _change_confirmed_count(db, schedule, +1)
+            status = STATUS_CONFIRMED
+
+        if participant is None:
+            participant = TrainingParticipant(schedule_id=schedule_id, user_id=user_id)
+            db.add(participant)
+        participant.status = status
+        participant.waitlisted_at = datetime.now() if status == STATUS_WAITLISTED else None
+        trainer_id, day = schedule.trainer_id, schedule.date
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    availability.invalidate(trainer_id, day)
+    db.refresh(participant)
+    return participant
+
+
+def cancel_booking(db: Session, schedule_id: int, user_id: int) -> str:
+    """Отмена записи или выход из листа ожидания; возвращает сообщение для клиента"""
+    try:
+        schedule = _lock_schedule(db, schedule_id)
+        participant = None
+        if schedule:
+            participant = db.query(TrainingParticipant).filter(
+                TrainingParticipant.schedule_id == schedule_id,
+                TrainingParticipant.user_id == user_id,
+                TrainingParticipant.status.in_([STATUS_CONFIRMED, STATUS_WAITLISTED])
+            ).first()
+        if not participant:
+            raise HTTPException(status_code=404, detail="Запись на тренировку не найдена")
+
+        if participant.status == STATUS_WAITLISTED:
+            participant.status = STATUS_CANCELLED
+            participant.waitlisted_at = None
+            db.commit()
+            return "Вы удалены из листа ожидания"
+
+        training_datetime = datetime.combine(schedule.date, schedule.start_time)
+        if datetime.now() + CANCELLATION_DEADLINE > training_datetime:
+            raise HTTPException(
+                status_code=400,
+                detail="Отмена тренировки возможна не менее чем за 24 часа"
+            )
+
+        # Отменяем запись, возвращаем посещение в абонемент и отдаем место следующему
+        participant.status = STATUS_CANCELLED
+        _change_confirmed_count(db, schedule, -1)
+        _refund_visit(db, user_id)
+        db.flush()
+        _promote_from_waitlist(db, schedule)
+        trainer_id, day = schedule.trainer_id, schedule.date
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    availability.invalidate(trainer_id, day)
+    return "Запись на тренировку отменена"
+
+
+def repair_confirmed_counts(db: Session) -> int:
+    """
+    Пересчет confirmed_count по TrainingParticipant для расхождений.
+    Каждая тренировка исправляется под своей блокировкой, чтобы не затереть
+    одновременную запись. Возвращает число исправленных тренировок.
+    """
+    actual = db.query(
+        TrainingParticipant.schedule_id.label("schedule_id"),
+        func.count().label("confirmed")
+    ).filter(TrainingParticipant.status == STATUS_CONFIRMED).group_by(TrainingParticipant.schedule_id).subquery()
+    mismatched = [schedule_id for (schedule_id,) in db.query(TrainerSchedule.id).outerjoin(
+        actual, actual.c.schedule_id == TrainerSchedule.id
+    ).filter(
+        TrainerSchedule.confirmed_count != func.coalesce(actual.c.confirmed, 0)
+    ).all()]
+    db.rollback()
+
+    repaired = 0
+    for schedule_id in mismatched:
+        try:
+            schedule = _lock_schedule(db, schedule_id)
+            if schedule is None:
+                db.rollback()
+                continue
+            confirmed = _confirmed_count(db, schedule_id)
+            changed = None
+            if schedule.confirmed_count != confirmed:
+                logger.warning(
+                    f"[BOOKING] Счетчик участников тренировки {schedule_id} исправлен: {schedule.confirmed_count} -> {confirmed}"
+                )
+                schedule.confirmed_count = confirmed
+                repaired += 1
+                changed = (schedule.trainer_id, schedule.date)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        if changed:
+            availability.invalidate(*changed)
+    return repaired
+
+
+def repair_from_db() -> int:
+    db = SessionLocal()
+    try:
+        return repair_confirmed_counts(db)
+    finally:
+        db.close()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import threading
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import GymVisit
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_KEY = "gym:occupancy:current"
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("OCCUPANCY_RECONCILE_SECONDS", "60"))
+
+
+class OccupancyCounter:
+    """
+    Счетчик людей в зале, который ведут check-in/check-out.
+
+    По умолчанию хранится в памяти процесса. Если задан REDIS_URL,
+    значение общее для всех воркеров (INCR/DECR атомарны в Redis).
+
+    Сверка с БД (rebuild) записывает пересчитанное значение, только если за
+    время подсчета счетчик не менялся: иначе она затерла бы check-in/check-out,
+    прошедший между подсчетом и записью. Пропущенную сверку повторит следующая.
+    """
+
+    def __init__(self, redis_url: str = None):
+        self._lock = threading.Lock()
+        self._value = 0
+        # Номер изменения локального счетчика (аналог WATCH для памяти)
+        self._version = 0
+        self._redis = None
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+
+    def _redis_call(self, method: str, *args):
+        try:
+            return getattr(self._redis, method)(*args)
+        except Exception as e:
+            logger.warning(f"[OCCUPANCY] Redis недоступен, используем локальный счетчик: {e}")
+            return None
+
+    def get(self) -> int:
+        if self._redis is not None:
+            value = self._redis_call("get", REDIS_KEY)
+            if value is not None:
+                return max(0, int(value))
+        return self._value
+
+    def increment(self) -> None:
+        with self._lock:
+            self._value += 1
+            self._version += 1
+        if self._redis is not None:
+            self._redis_call("incr", REDIS_KEY)
+
+    def decrement(self) -> None:
+        with self._lock:
+            self._value = max(0, self._value - 1)
+            self._version += 1
+        if self._redis is not None:
+            self._redis_call("decr", REDIS_KEY)
+
+    def set(self, value: int) -> None:
+        with self._lock:
+            self._value = value
+            self._version += 1
+        if self._redis is not None:
+            self._redis_call("set", REDIS_KEY, value)
+
+    def rebuild(self, db: Session) -> int:
+        """Пересчет счетчика по незавершенным посещениям в БД"""
+        if self._redis is not None:
+            value = self._rebuild_redis(db)
+            if value is not None:
+                return value
+        with self._lock:
+            version = self._version
+        value = _open_visits(db)
+        with self._lock:
+            if self._version != version:
+                logger.info("[OCCUPANCY] Счетчик изменился во время сверки, сверка пропущена")
+                return self._value
+            if value != self._value:
+                logger.info(f"[OCCUPANCY] Счетчик скорректирован: {self._value} -> {value}")
+            self._value = value
+            self._version += 1
+        return value
+
+    def _rebuild_redis(self, db: Session):
+        """
+        Сверка общего счетчика: WATCH ключа до подсчета, SET в MULTI после.
+        None - Redis недоступен, сверяется локальный счетчик.
+        """
+        import redis
+        try:
+            with self._redis.pipeline() as pipe:
+                pipe.watch(REDIS_KEY)
+                current = pipe.get(REDIS_KEY)
+                value = _open_visits(db)
+                pipe.multi()
+                pipe.set(REDIS_KEY, value)
+                pipe.execute()
+        except redis.WatchError:
+            logger.info("[OCCUPANCY] Счетчик изменился во время сверки, сверка пропущена")
+            return self.get()
+        except redis.RedisError as e:
+            logger.warning(f"[OCCUPANCY] Redis недоступен, используем локальный счетчик: {e}")
+            return None
+        current = int(current) if current is not None else 0
+        if value != current:
+            logger.info(f"[OCCUPANCY] Счетчик скорректирован: {current} -> {value}")
+        with self._lock:
+            self._value = value
+            self._version += 1
+        return value
+
+
+def _open_visits(db: Session) -> int:
+    return db.query(GymVisit).filter(GymVisit.check_out == None).count()
+
+
+occupancy_counter = OccupancyCounter(REDIS_URL)
+
+
+def rebuild_from_db() -> int:
+    db = SessionLocal()
+    try:
+        return occupancy_counter.rebuild(db)
+    finally:
+        db.close()
+
+
+async def reconcile_periodically(interval: int = RECONCILE_INTERVAL_SECONDS):
+    """Периодическая сверка счетчика с БД (запускается из lifespan приложения)"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(rebuild_from_db)
+        except Exception:
+            logger.exception("[OCCUPANCY] Ошибка сверки счетчика с БД")
@@ -1,31 +1,36 @@
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 from models import GymMembership, User, Payment, MembershipType
 from schemas import MembershipCreate
-from .notifications import create_notification, send_email_notification
+from .notifications import create_notification, notify_expiring_memberships
+from .outbox import enqueue_email
 
 class MembershipService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
+    async def _first(self, statement):
+        return (await self.db.execute(statement)).scalars().first()
+
     async def create_membership(self, user_id: int, membership_type_id: int, payment_id: int) -> GymMembership:
         """Создание нового абонемента после оплаты"""
-        membership_type = self.db.query(MembershipType).filter_by(id=membership_type_id).first()
+        membership_type = await self._first(select(MembershipType).filter_by(id=membership_type_id))
         if not membership_type:
             raise HTTPException(status_code=404, detail="Тип абонемента не найден")
 
         # Проверяем оплату
-        payment = self.db.query(Payment).filter_by(id=payment_id, status="completed").first()
+        payment = await self._first(select(Payment).filter_by(id=payment_id, status="completed"))
         if not payment:
             raise HTTPException(status_code=400, detail="Оплата не подтверждена")
 
         # Проверяем активные абонементы
-        active_membership = self.db.query(GymMembership).filter(
+        active_membership = await self._first(select(GymMembership).filter(
             GymMembership.user_id == user_id,
             GymMembership.status == "active",
             GymMembership.end_date >= datetime.now().date()
-        ).first()
+        ))
 
         start_date = datetime.now().date()
         if active_membership:
@@ -45,8 +50,15 @@ class MembershipService:
         )
 
         self.db.add(new_membership)
-        self.db.commit()
-        self.db.refresh(new_membership)
+        # Письмо фиксируется вместе с абонементом и отправляется воркерами outbox
+        user = await self.db.get(User, user_id)
+        if user and user.email:
+            enqueue_email(
+                self.db, user.email, "Абонемент активирован",
+                f"Ваш абонемент «{membership_type.name}» действует с {new_membership.start_date} до {new_membership.end_date}"
+            )
+        await self.db.commit()
+        await self.db.refresh(new_membership)
 
         # Отправляем уведомление
         await create_notification(self.db, {
@@ -60,23 +72,26 @@ class MembershipService:
 
     async def extend_membership(self, membership_id: int, payment_id: int) -> GymMembership:
         """Продление существующего абонемента"""
-        membership = self.db.query(GymMembership).filter_by(id=membership_id).first()
+        membership = await self._first(select(GymMembership).filter_by(id=membership_id))
         if not membership:
             raise HTTPException(status_code=404, detail="Абонемент не найден")
 
-        payment = self.db.query(Payment).filter_by(id=payment_id, status="completed").first()
+        payment = await self._first(select(Payment).filter_by(id=payment_id, status="completed"))
         if not payment:
             raise HTTPException(status_code=400, detail="Оплата не подтверждена")
 
-        membership_type = self.db.query(MembershipType).filter_by(name=membership.membership_type).first()
+        membership_type = await self._first(select(MembershipType).filter_by(name=membership.membership_type))
         
         # Продлеваем абонемент
         membership.end_date = membership.end_date + timedelta(days=membership_type.duration_days)
         membership.visits_left += membership_type.visits_limit
         membership.status = "active"
 
-        self.db.commit()
-        self.db.refresh(membership)
+        user = await self.db.get(User, membership.user_id)
+        if user and user.email:
+            enqueue_email(self.db, user.email, "Абонемент продлен", f"Ваш абонемент продлен до {membership.end_date}")
+        await self.db.commit()
+        await self.db.refresh(membership)
 
         await create_notification(self.db, {
             "user_id": membership.user_id,
@@ -92,7 +107,7 @@ class MembershipService:
         if days > 30:  # Максимальный срок заморозки
             raise HTTPException(status_code=400, detail="Максимальный срок заморозки - 30 дней")
 
-        membership = self.db.query(GymMembership).filter_by(id=membership_id, status="active").first()
+        membership = await self._first(select(GymMembership).filter_by(id=membership_id, status="active"))
         if not membership:
             raise HTTPException(status_code=404, detail="Активный абонемент не найден")
 
@@ -102,8 +117,8 @@ class MembershipService:
         membership.freeze_start = datetime.now().date()
         membership.freeze_end = datetime.now().date() + timedelta(days=days)
 
-        self.db.commit()
-        self.db.refresh(membership)
+        await self.db.commit()
+        await self.db.refresh(membership)
 
         await create_notification(self.db, {
             "user_id": membership.user_id,
@@ -116,15 +131,15 @@ class MembershipService:
 
     async def unfreeze_membership(self, membership_id: int) -> GymMembership:
         """Разморозка абонемента"""
-        membership = self.db.query(GymMembership).filter_by(id=membership_id, status="frozen").first()
+        membership = await self._first(select(GymMembership).filter_by(id=membership_id, status="frozen"))
         if not membership:
             raise HTTPException(status_code=404, detail="Замороженный абонемент не найден")
 
         membership.status = "active"
         membership.freeze_end = datetime.now().date()
 
-        self.db.commit()
-        self.db.refresh(membership)
+        await self.db.commit()
+        await self.db.refresh(membership)
 
         await create_notification(self.db, {
             "user_id": membership.user_id,
@@ -136,26 +151,13 @@ class MembershipService:
         return membership
 
     async def check_expiring_memberships(self):
-        """Проверка истекающих абонементов"""
-        week_later = datetime.now().date() + timedelta(days=7)
-        
-        expiring = self.db.query(GymMembership).filter(
-            GymMembership.end_date == week_later,
-            GymMembership.status == "active"
-        ).all()
-
-        for membership in expiring:
-            await create_notification(self.db, {
-                "user_id": membership.user_id,
-                "type": "membership_expiring",
-                "title": "Абонемент скоро истекает",
-                "message": f"Ваш абонемент истекает {membership.end_date}. Не забудьте продлить!"
-            })
-
-    def get_active_membership(self, user_id: int) -> GymMembership:
+        """Проверка истекающих абонементов (по расписанию выполняет services/scheduler.py)"""
+        return await self.db.run_sync(notify_expiring_memberships)
+
+    async def get_active_membership(self, user_id: int) -> GymMembership:
         """Получение активного абонемента пользователя"""
-        return self.db.query(GymMembership).filter(
+        return await self._first(select(GymMembership).filter(
             GymMembership.user_id == user_id,
             GymMembership.status == "active",
             GymMembership.end_date >= datetime.now().date()
-        ).first() 
\ No newline at end of file
+        )) 
\ No newline at end of file
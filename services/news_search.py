@@ -0,0 +1,279 @@
+"""
+Полнотекстовый поиск по новостям (заголовок + текст).
+
+PostgreSQL: tsvector с конфигурацией 'russian' (русские слова стеммируются
+русским стеммером, латиница - английским), GIN-индекс по тому же выражению
+(миграция 0003), ранжирование ts_rank_cd, подсветка ts_headline.
+
+Другие БД (SQLite): инвертированный индекс в памяти процесса, строится
+одним проходом по таблице и дочитывает изменения перед каждым поиском.
+"""
+import heapq
+import html
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.orm import Session
+from models import News, NEWS_SEARCH_VECTOR_SQL
+
+TS_CONFIG = "russian"
+TITLE_WEIGHT = 2.0
+SNIPPET_RADIUS = 80
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Метки подсветки в ts_headline: текст новости экранируется, затем метки заменяются на <mark>
+HEADLINE_START = "\ue000"
+HEADLINE_END = "\ue001"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# То же выражение, что и в GIN-индексе ix_news_search_vector, иначе индекс не используется
+SEARCH_VECTOR_SQL = NEWS_SEARCH_VECTOR_SQL
+
+
+def tokenize(value: str) -> List[str]:
+    return [token.replace("ё", "е") for token in TOKEN_RE.findall((value or "").lower())]
+
+
+def _query_terms(search: str) -> List[str]:
+    return list(dict.fromkeys(term for term in tokenize(search) if term != "_"))
+
+
+def highlight(value: str, terms: List[str]) -> str:
+    """
+    Фрагмент текста вокруг первого совпадения с подсветкой слов, начинающихся
+    с терминов. Текст экранируется как HTML, разметкой остаются только <mark>.
+    """
+    if not value:
+        return ""
+    pattern = re.compile(r"\b(" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    # Замена ё -> е не меняет длину строки, поэтому позиции совпадений верны и для исходного текста
+    normalized = value.replace("ё", "е").replace("Ё", "Е")
+    matches = list(pattern.finditer(normalized))
+    start = max(0, matches[0].start() - SNIPPET_RADIUS) if matches else 0
+    end = min(len(value), (matches[0].end() if matches else 0) + SNIPPET_RADIUS)
+    parts = []
+    position = start
+    for match in matches:
+        if match.start() < start:
+            continue
+        if match.end() > end:
+            break
+        parts.append(
+            html.escape(value[position:match.start()])
+            + HIGHLIGHT_START + html.escape(value[match.start():match.end()]) + HIGHLIGHT_END
+        )
+        position = match.end()
+    parts.append(html.escape(value[position:end]))
+    return ("..." if start > 0 else "") + "".join(parts) + ("..." if end < len(value) else "")
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс: токен -> {news_id: (вхождений в заголовок, вхождений в текст)}.
+    Совпадение по префиксу ищется бинарным поиском по отсортированному словарю токенов.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, Tuple[int, int]]] = defaultdict(dict)
+        self._documents: Dict[int, List[str]] = {}
+        self._sorted_tokens: Optional[List[str]] = None
+        self.signature = None
+
+    def _add(self, news_id: int, title: str, content: str):
+        title_counts = defaultdict(int)
+        content_counts = defaultdict(int)
+        for token in tokenize(title):
+            title_counts[token] += 1
+        for token in tokenize(content):
+            content_counts[token] += 1
+        tokens = set(title_counts) | set(content_counts)
+        for token in tokens:
+            self._postings[token][news_id] = (title_counts[token], content_counts[token])
+        self._documents[news_id] = list(tokens)
+        self._sorted_tokens = None
+
+    def _remove(self, news_id: int):
+        for token in self._documents.pop(news_id, []):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(news_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._sorted_tokens = None
+
+    def rebuild(self, rows, signature):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            for news_id, title, content in rows:
+                self._add(news_id, title, content)
+            self._sorted_tokens = None
+            self.signature = signature
+
+    def upsert(self, news_id: int, title: str, content: str):
+        with self._lock:
+            self._remove(news_id)
+            self._add(news_id, title, content)
+
+    def remove(self, news_id: int):
+        with self._lock:
+            self._remove(news_id)
+
+    def size(self) -> int:
+        return len(self._documents)
+
+    def id_sum(self) -> int:
+        return sum(self._documents)
+
+    def _expand(self, term: str) -> List[str]:
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        position = bisect_left(self._sorted_tokens, term)
+        expanded = []
+        while position < len(self._sorted_tokens) and self._sorted_tokens[position].startswith(term):
+            expanded.append(self._sorted_tokens[position])
+            position += 1
+        return expanded
+
+    def search(self, terms: List[str], top: int) -> Tuple[int, List[Tuple[int, float]]]:
+        """
+        Документы, содержащие все термины (по префиксу): общее количество
+        и первые top по убыванию tf-idf с весом заголовка
+        """
+        with self._lock:
+            total_documents = max(len(self._documents), 1)
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token in self._expand(term):
+                    postings = self._postings[token]
+                    idf = math.log(1 + total_documents / len(postings))
+                    for news_id, (title_count, content_count) in postings.items():
+                        term_scores[news_id] += (TITLE_WEIGHT * title_count + content_count) * idf
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {news_id: score + term_scores[news_id] for news_id, score in scores.items() if news_id in term_scores}
+                if not scores:
+                    return 0, []
+            scores = scores or {}
+            return len(scores), heapq.nsmallest(top, scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+inverted_index = InvertedIndex()
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _signature(db: Session):
+    """Дешевая метка состояния таблицы: меняется при добавлении, изменении и удалении новостей"""
+    count, id_sum, max_id, last_update = db.query(
+        func.count(News.id), func.sum(News.id), func.max(News.id), func.max(News.updated_at)
+    ).one()
+    return count, id_sum or 0, max_id, last_update
+
+
+def _ensure_index(db: Session):
+    """
+    Синхронизация индекса с таблицей. Новые и измененные новости (в том числе
+    записанные другими воркерами) дочитываются по id/updated_at, полная
+    перестройка нужна только после удаления.
+    """
+    signature = _signature(db)
+    if inverted_index.signature == signature:
+        return
+    if inverted_index.signature is None:
+        rows = db.query(News.id, News.title, News.content).yield_per(1000)
+        inverted_index.rebuild(rows, signature)
+        return
+
+    _, _, known_max_id, known_last_update = inverted_index.signature
+    changed = db.query(News.id, News.title, News.content).filter(
+        (News.id > (known_max_id or 0)) | (News.updated_at >= known_last_update)
+    ).all() if known_last_update is not None else db.query(News.id, News.title, News.content).all()
+    for news_id, title, content in changed:
+        inverted_index.upsert(news_id, title, content)
+
+    # Количество и сумма id расходятся только если какие-то новости были удалены
+    if inverted_index.size() != signature[0] or inverted_index.id_sum() != signature[1]:
+        rows = db.query(News.id, News.title, News.content).yield_per(1000)
+        inverted_index.rebuild(rows, signature)
+    else:
+        inverted_index.signature = signature
+
+
+def _mark_headline(snippet: str) -> str:
+    """Фрагмент ts_headline: экранирование HTML и метки подсветки -> <mark>"""
+    return html.escape(snippet or "").replace(HEADLINE_START, HIGHLIGHT_START).replace(HEADLINE_END, HIGHLIGHT_END)
+
+
+def _search_postgres(db: Session, terms: List[str], skip: int, limit: int):
+    tsquery = func.to_tsquery(TS_CONFIG, " & ".join(f"{term}:*" for term in terms))
+    vector = literal_column(f"({SEARCH_VECTOR_SQL})")
+    rank = func.ts_rank_cd(vector, tsquery)
+    match = vector.op("@@")(tsquery)
+    options = f"StartSel={HEADLINE_START}, StopSel={HEADLINE_END}, MaxWords=35, MinWords=15"
+    rows = db.query(
+        News,
+        rank.label("rank"),
+        func.ts_headline(TS_CONFIG, func.coalesce(News.content, ""), tsquery, options).label("snippet"),
+        func.count().over().label("total")
+    ).filter(match).order_by(text("rank DESC"), News.id.desc()).offset(skip).limit(limit).all()
+
+    # Оконный count() приходит только со строками страницы: за последней
+    # страницей всего найденных считается отдельным запросом
+    if rows:
+        total = rows[0].total
+    elif skip:
+        total = db.query(func.count(News.id)).filter(match).scalar()
+    else:
+        total = 0
+    return total, [(news, float(rank), _mark_headline(snippet)) for news, rank, snippet, _ in rows]
+
+
+def _search_inverted(db: Session, terms: List[str], skip: int, limit: int):
+    _ensure_index(db)
+    total, ranked = inverted_index.search(terms, skip + limit)
+    page = ranked[skip:]
+    news_by_id = {
+        news.id: news
+        for news in db.query(News).filter(News.id.in_([news_id for news_id, _ in page])).all()
+    }
+    results = [
+        (news_by_id[news_id], round(score, 4), highlight(news_by_id[news_id].content, terms))
+        for news_id, score in page if news_id in news_by_id
+    ]
+    return total, results
+
+
+def search_news(db: Session, search: str, skip: int, limit: int):
+    """
+    Поиск по заголовку и тексту: все слова запроса должны встречаться (в т.ч. как префикс).
+    Возвращает (всего найдено, [(новость, релевантность, фрагмент с подсветкой)]).
+    """
+    terms = _query_terms(search)
+    if not terms:
+        return 0, []
+    if _is_postgres(db):
+        return _search_postgres(db, terms, skip, limit)
+    return _search_inverted(db, terms, skip, limit)
+
+
+
+def on_news_saved(news: News):
+    """Сразу обновить индекс этого процесса, не дожидаясь сверки при следующем поиске"""
+    if inverted_index.signature is not None:
+        inverted_index.upsert(news.id, news.title, news.content)
+
+
+def on_news_deleted(news_id: int):
+    if inverted_index.signature is not None:
+        inverted_index.remove(news_id)
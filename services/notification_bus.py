@@ -0,0 +1,247 @@
+"""
+Доставка новых уведомлений подключенным клиентам (Server-Sent Events,
+GET /api/notifications/stream).
+
+Подписки хранятся в памяти процесса: очередь asyncio на каждое подключение.
+Уведомления публикуются после commit: созданные через ORM (create_notification,
+лист ожидания) - обработчиком событий сессии, пакетные (fan_out) - явно.
+Если задан REDIS_URL, публикация идет в канал Redis, и каждый воркер раздает
+полученные сообщения своим подписчикам, к какому бы воркеру ни был подключен
+клиент. Доставка не гарантируется: пропущенное клиент дочитывает по
+Last-Event-ID / since из БД.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Notification
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+NOTIFICATION_CHANNEL = "gym:notifications"
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+# Комментарий-пинг держит соединение открытым через прокси
+HEARTBEAT_SECONDS = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT_SECONDS", "15"))
+BACKLOG_LIMIT = 500
+REDIS_RECONNECT_SECONDS = 5
+
+# (user_id, данные уведомления для клиента)
+Published = Tuple[int, dict]
+
+
+def notification_payload(notification_id: int, notification_type: str, title: str, message: str,
+                         created_at: Optional[datetime], read: bool = False) -> dict:
+    """Данные события в формате schemas.Notification"""
+    return {
+        "id": notification_id,
+        "type": notification_type,
+        "title": title,
+        "message": message,
+        "created_at": (created_at or datetime.now()).isoformat(),
+        "read": bool(read),
+    }
+
+
+class Subscription:
+    """Подключение клиента; создается и читается в event loop"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, payload: dict):
+        """Может вызываться из любого потока"""
+        self.loop.call_soon_threadsafe(self._put, payload)
+
+    def _put(self, payload: dict):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Медленный клиент: события теряются, поток дочитает их из БД
+            self.overflowed = True
+
+
+class NotificationBus:
+    def __init__(self, redis_url: str = None):
+        self._redis_url = redis_url
+        self._redis = None
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, notifications: List[Published]):
+        """Публикация после commit; вызывается из любого потока"""
+        if not notifications:
+            return
+        with self._lock:
+            self.published += len(notifications)
+        if self._redis is not None:
+            try:
+                self._redis.publish(NOTIFICATION_CHANNEL, json.dumps(notifications))
+                return
+            except Exception as e:
+                logger.warning(f"[NOTIFICATIONS] Redis недоступен, уведомления только подписчикам этого воркера: {e}")
+        self._deliver(notifications)
+
+    def _deliver(self, notifications: Iterable[Published]):
+        with self._lock:
+            if not self._subscribers:
+                return
+            targets = [
+                (subscription, payload)
+                for user_id, payload in notifications
+                for subscription in self._subscribers.get(user_id, ())
+            ]
+            self.delivered += len(targets)
+        for subscription, payload in targets:
+            subscription.push(payload)
+
+    async def run(self):
+        """Прием уведомлений других воркеров из Redis (запускается из lifespan приложения)"""
+        if not self._redis_url:
+            return
+        import redis.asyncio as aioredis
+        while True:
+            client = aioredis.Redis.from_url(self._redis_url)
+            try:
+                pubsub = client.pubsub()
+                await pubsub.subscribe(NOTIFICATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._deliver(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[NOTIFICATIONS] Потеряна подписка на канал Redis: {e}")
+            finally:
+                await client.aclose()
+            await asyncio.sleep(REDIS_RECONNECT_SECONDS)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                "published": self.published,
+                "delivered": self.delivered,
+            }
+
+
+notification_bus = NotificationBus(REDIS_URL)
+
+
+# Уведомления, созданные через ORM, публикуются после commit транзакции
+# (для AsyncSession события приходят от ее синхронной сессии)
+@event.listens_for(Session, "after_flush")
+def _collect_notifications(session: Session, flush_context):
+    created = [obj for obj in session.new if isinstance(obj, Notification)]
+    if created:
+        session.info.setdefault("published_notifications", []).extend(
+            (obj.user_id, notification_payload(
+                obj.id, obj.type, obj.title, obj.message, obj.__dict__.get("created_at"), obj.__dict__.get("read")
+            ))
+            for obj in created
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_notifications(session: Session):
+    notifications = session.info.pop("published_notifications", None)
+    if notifications:
+        notification_bus.publish(notifications)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_notifications(session: Session):
+    session.info.pop("published_notifications", None)
+
+
+def _load_since(user_id: int, after_id: int) -> List[dict]:
+    db = SessionLocal()
+    try:
+        rows = db.query(Notification).filter(
+            Notification.user_id == user_id,
+            Notification.id > after_id
+        ).order_by(Notification.id).limit(BACKLOG_LIMIT).all()
+        return [
+            notification_payload(row.id, row.type, row.title, row.message, row.created_at, row.read)
+            for row in rows
+        ]
+    finally:
+        db.close()
+
+
+def _last_id(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(Notification.id).filter(
+            Notification.user_id == user_id
+        ).order_by(Notification.id.desc()).limit(1).scalar() or 0
+    finally:
+        db.close()
+
+
+def _sse(payload: dict) -> str:
+    return f"id: {payload['id']}\nevent: notification\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def event_stream(user_id: int, after_id: Optional[int], unread: int):
+    """
+    Поток SSE: число непрочитанных, уведомления после after_id из БД, затем
+    новые по мере публикации. Подписка оформляется до чтения БД, поэтому
+    уведомления между чтением и подпиской не теряются; повторы отбрасываются.
+    Соединение с БД на время потока не удерживается.
+    """
+    subscription = notification_bus.subscribe(user_id)
+    recent = deque(maxlen=BACKLOG_LIMIT)
+    try:
+        yield f"retry: 3000\nevent: unread\ndata: {json.dumps({'unread': unread})}\n\n"
+        last_id = after_id if after_id is not None else await asyncio.to_thread(_last_id, user_id)
+        pending = await asyncio.to_thread(_load_since, user_id, last_id) if after_id is not None else []
+        while True:
+            for payload in pending:
+                if payload["id"] in recent:
+                    continue
+                recent.append(payload["id"])
+                last_id = max(last_id, payload["id"])
+                yield _sse(payload)
+            if subscription.overflowed:
+                subscription.overflowed = False
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                pending = await asyncio.to_thread(_load_since, user_id, last_id)
+                continue
+            try:
+                pending = [await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)]
+            except asyncio.TimeoutError:
+                pending = []
+                yield ": ping\n\n"
+    finally:
+        notification_bus.unsubscribe(subscription)
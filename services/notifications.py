@@ -1,89 +1,326 @@
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from models import Notification, TrainerSchedule, GymMembership, User
+"""
+Уведомления пользователей.
+
+Массовые уведомления (напоминания о тренировках, истекающие абонементы)
+создает fan_out: получатели читаются из БД порциями по уникальному ключу,
+и на каждую порцию выполняется одна пакетная вставка и один commit.
+Уведомления об отмене тренировки создает cancel_training в транзакции ее
+удаления. Письма пишутся в outbox (services/outbox.py) в той же транзакции
+и отправляются воркерами.
+После commit новые уведомления публикуются подключенным клиентам
+(services/notification_bus.py).
+
+Число непрочитанных хранится в User.unread_notifications и меняется в той
+же транзакции, что и уведомления: при вставке через ORM (обработчик
+after_flush), в fan_out и в mark_read. repair_unread_counts сверяет его
+с таблицей уведомлений.
+"""
 import logging
+import os
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, date
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import event, exists, func, insert, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal
+from models import Notification, TrainerSchedule, TrainingParticipant, GymMembership, User, EmailOutbox
+from .outbox import enqueue_email, outbox_values
+from .notification_bus import notification_bus, notification_payload
 
 logger = logging.getLogger(__name__)
 
-async def create_notification(db: Session, notification_data: dict):
-    """Создание уведомления в базе данных"""
+FANOUT_CHUNK_SIZE = int(os.getenv("NOTIFICATION_CHUNK_SIZE", "5000"))
+
+
+@dataclass(frozen=True)
+class FanOutResult:
+    type: str
+    recipients: int
+    chunks: int
+    seconds: float
+
+    @property
+    def per_second(self) -> float:
+        return self.recipients / self.seconds if self.seconds else float(self.recipients)
+
+
+async def create_notification(db: AsyncSession, notification_data: dict):
+    """Создание одного уведомления в базе данных"""
     db_notification = Notification(**notification_data)
     db.add(db_notification)
-    db.commit()
-    db.refresh(db_notification)
+    await db.commit()
+    await db.refresh(db_notification)
     return db_notification
 
-async def send_email_notification(user_email: str, subject: str, body: str):
-    """Заглушка для отправки email"""
-    logger.info(f"[EMAIL STUB] To: {user_email}, Subject: {subject}, Body: {body}")
-    # В реальном приложении здесь будет отправка email
-    return True
-
-async def send_training_reminder():
-    """Отправка напоминаний о предстоящих тренировках"""
-    tomorrow = datetime.now().date() + timedelta(days=1)
-    
-    trainings = db.query(TrainerSchedule).filter(
-        TrainerSchedule.date == tomorrow
-    ).all()
-    
-    for training in trainings:
-        for participant in training.participants:
-            if participant.status == "confirmed":
-                # Создаем уведомление в базе
-                notification = {
-                    "user_id": participant.user_id,
-                    "type": "training_reminder",
-                    "title": "Напоминание о тренировке",
-                    "message": f"Завтра в {training.start_time} у вас тренировка"
-                }
-                await create_notification(db, notification)
-                
-                # Логируем "отправку" email
-                logger.info(
-                    f"[TRAINING REMINDER] Would send email to {participant.user.email} "
-                    f"about training at {training.start_time}"
+
+def _change_unread_counts(db, deltas: Dict[int, int]):
+    """
+    Изменение счетчиков непрочитанных: одно UPDATE на каждое различное
+    значение изменения (обычно одно на всю порцию fan_out)
+    """
+    users_by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            users_by_delta[delta].append(user_id)
+    users = User.__table__
+    if len(deltas) > 1:
+        # Строки пользователей блокируются в порядке id: одновременные fan_out
+        # с пересекающимися получателями не взаимоблокируются
+        db.execute(select(users.c.id).where(users.c.id.in_(list(deltas))).order_by(users.c.id).with_for_update())
+    for delta, user_ids in users_by_delta.items():
+        db.execute(
+            update(users).where(users.c.id.in_(user_ids))
+            .values(unread_notifications=users.c.unread_notifications + delta)
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _count_created_notifications(session: Session, flush_context):
+    """Уведомления, созданные через ORM (create_notification, лист ожидания)"""
+    deltas = Counter(
+        obj.user_id for obj in session.new
+        if isinstance(obj, Notification) and obj.user_id is not None and not obj.read
+    )
+    if deltas:
+        _change_unread_counts(session.connection(), deltas)
+
+
+def unread_count(db: Session, user_id: int) -> int:
+    """Число непрочитанных уведомлений пользователя (чтение одной строки по ключу)"""
+    count = db.query(User.unread_notifications).filter(User.id == user_id).scalar()
+    return max(count or 0, 0)
+
+
+def mark_read(db: Session, user_id: int, ids: Optional[List[int]] = None, up_to_id: Optional[int] = None) -> int:
+    """
+    Отмечает прочитанными одним UPDATE: по списку ids, все до up_to_id
+    включительно или все уведомления пользователя. Возвращает число
+    отмеченных; уже прочитанные не учитываются.
+    """
+    statement = update(Notification).where(
+        Notification.user_id == user_id,
+        Notification.read == False
+    )
+    if ids is not None:
+        statement = statement.where(Notification.id.in_(ids))
+    if up_to_id is not None:
+        statement = statement.where(Notification.id <= up_to_id)
+    try:
+        updated = db.execute(statement.values(read=True).execution_options(synchronize_session=False)).rowcount
+        if updated:
+            _change_unread_counts(db, {user_id: -updated})
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return updated
+
+
+def repair_unread_counts(db: Session) -> int:
+    """
+    Пересчет User.unread_notifications для расхождений. Каждый пользователь
+    исправляется под блокировкой своей строки: одновременные изменения
+    счетчика относительные и ждут блокировку. Возвращает число исправленных.
+    """
+    actual = db.query(
+        Notification.user_id.label("user_id"),
+        func.count().label("unread")
+    ).filter(Notification.read == False).group_by(Notification.user_id).subquery()
+    mismatched = [user_id for (user_id,) in db.query(User.id).outerjoin(
+        actual, actual.c.user_id == User.id
+    ).filter(
+        User.unread_notifications != func.coalesce(actual.c.unread, 0)
+    ).all()]
+    db.rollback()
+
+    repaired = 0
+    for user_id in mismatched:
+        try:
+            counter = db.query(User.unread_notifications).filter(User.id == user_id).with_for_update().scalar()
+            unread = db.query(func.count(Notification.id)).filter(
+                Notification.user_id == user_id,
+                Notification.read == False
+            ).scalar()
+            if counter is not None and counter != unread:
+                logger.warning(f"[NOTIFICATIONS] Счетчик непрочитанных пользователя {user_id} исправлен: {counter} -> {unread}")
+                db.execute(
+                    update(User).where(User.id == user_id).values(unread_notifications=unread)
+                    .execution_options(synchronize_session=False)
                 )
+                repaired += 1
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+    return repaired
+
+
+def repair_from_db() -> int:
+    db = SessionLocal()
+    try:
+        return repair_unread_counts(db)
+    finally:
+        db.close()
+
+
+def fan_out(
+    db: Session,
+    notification_type: str,
+    audience,
+    key_column,
+    build: Callable[..., Tuple[int, str, str]],
+    chunk_size: int = FANOUT_CHUNK_SIZE,
+    created_at: Optional[datetime] = None,
+    email: bool = False
+) -> FanOutResult:
+    """
+    Уведомления для всех получателей запроса audience (select).
+
+    Получатели читаются порциями по chunk_size в порядке уникального столбца
+    key_column (keyset, без долгоживущего курсора), build(row) возвращает
+    (user_id, заголовок, текст). Каждая порция - одна пакетная вставка и commit.
+    С email=True в той же транзакции в outbox пишутся письма с тем же текстом.
+    После commit порции уведомления публикуются подключенным клиентам.
+    """
+    started_at = time.perf_counter()
+    created_at = created_at or datetime.now()
+    recipients = 0
+    chunks = 0
+    last_key = None
+    while True:
+        statement = audience if last_key is None else audience.where(key_column > last_key)
+        rows = db.execute(statement.order_by(key_column).limit(chunk_size)).all()
+        if not rows:
+            break
+        values = []
+        for row in rows:
+            user_id, title, message = build(row)
+            values.append({
+                "user_id": user_id,
+                "type": notification_type,
+                "title": title,
+                "message": message,
+                "created_at": created_at,
+                "read": False,
+            })
+        # Идентификаторы нужны для доставки клиентам (курсор since / Last-Event-ID); вместе
+        # с ними возвращается текст, чтобы не зависеть от порядка строк RETURNING.
+        # Вставка через таблицу (Core): ORM-вставка с RETURNING заметно медленнее
+        table = Notification.__table__
+        created = db.execute(
+            insert(table).returning(table.c.id, table.c.user_id, table.c.title, table.c.message),
+            values
+        ).all()
+        _change_unread_counts(db, Counter(value["user_id"] for value in values))
+        if email:
+            emails = dict(db.execute(
+                select(User.id, User.email).where(User.id.in_({value["user_id"] for value in values}))
+            ).all())
+            letters = [
+                outbox_values(emails[value["user_id"]], value["title"], value["message"], created_at)
+                for value in values if emails.get(value["user_id"])
+            ]
+            if letters:
+                db.execute(insert(EmailOutbox), letters)
+        db.commit()
+        notification_bus.publish([
+            (user_id, notification_payload(notification_id, notification_type, title, message, created_at))
+            for notification_id, user_id, title, message in created
+        ])
+        recipients += len(values)
+        chunks += 1
+        last_key = rows[-1]._mapping[key_column]
 
-async def check_expiring_memberships():
-    """Проверка истекающих абонементов"""
-    week_later = datetime.now().date() + timedelta(days=7)
-    
-    expiring = db.query(GymMembership).filter(
-        GymMembership.end_date == week_later,
-        GymMembership.status == "active"
-    ).all()
-    
-    for membership in expiring:
-        # Создаем уведомление в базе
-        notification = {
-            "user_id": membership.user_id,
-            "type": "membership_expiring",
-            "title": "Абонемент скоро истекает",
-            "message": f"Ваш абонемент истекает {membership.end_date}. Не забудьте продлить!"
-        }
-        await create_notification(db, notification)
-        
-        # Логируем "отправку" email
+    result = FanOutResult(notification_type, recipients, chunks, time.perf_counter() - started_at)
+    if recipients:
         logger.info(
-            f"[MEMBERSHIP EXPIRING] Would send email to {membership.user.email} "
-            f"about membership expiring on {membership.end_date}"
+            f"[NOTIFICATIONS] {notification_type}: {recipients} получателей, {chunks} пакетов, "
+            f"{result.seconds:.2f} с ({result.per_second:.0f} уведомлений/с)"
         )
+    return result
 
-async def notify_training_cancelled(training_id: int):
-    """Уведомление об отмене тренировки"""
-    training = db.query(TrainerSchedule).filter(TrainerSchedule.id == training_id).first()
-    
-    for participant in training.participants:
-        notification = NotificationCreate(
-            user_id=participant.user_id,
-            type="training_cancelled",
-            title="Тренировка отменена",
-            message=f"Тренировка {training.start_time} была отменена"
-        )
-        await create_notification(db, notification)
-        await send_email_notification(
-            participant.user.email,
-            "Тренировка отменена",
-            f"К сожалению, ваша тренировка {training.start_time} была отменена. Пожалуйста, выберите другое время."
-        ) 
\ No newline at end of file
+
+def _not_notified_today(user_id_column, notification_type: str, now: datetime):
+    """
+    Получатель еще не получал сегодня уведомление этого типа: повторный запуск
+    задачи не дублирует уведомления. Уведомления текущего запуска (created_at = now)
+    не учитываются, поэтому у клиента с двумя тренировками будут оба напоминания.
+    """
+    return ~exists().where(
+        Notification.user_id == user_id_column,
+        Notification.type == notification_type,
+        Notification.created_at >= datetime.combine(now.date(), datetime.min.time()),
+        Notification.created_at < now
+    )
+
+
+def send_training_reminders(db: Session, day: Optional[date] = None) -> FanOutResult:
+    """Напоминания участникам тренировок на день day (по умолчанию - завтра)"""
+    now = datetime.now()
+    day = day or now.date() + timedelta(days=1)
+    audience = select(
+        TrainingParticipant.id, TrainingParticipant.user_id, TrainerSchedule.start_time
+    ).join(
+        TrainerSchedule, TrainerSchedule.id == TrainingParticipant.schedule_id
+    ).where(
+        TrainerSchedule.date == day,
+        TrainingParticipant.status == "confirmed",
+        _not_notified_today(TrainingParticipant.user_id, "training_reminder", now)
+    )
+    return fan_out(
+        db, "training_reminder", audience, TrainingParticipant.id,
+        lambda row: (row.user_id, "Напоминание о тренировке", f"Завтра в {row.start_time} у вас тренировка"),
+        created_at=now,
+        email=True
+    )
+
+
+def notify_expiring_memberships(db: Session, days: int = 7) -> FanOutResult:
+    """Уведомления об абонементах, которые истекают через days дней"""
+    now = datetime.now()
+    expires_on = now.date() + timedelta(days=days)
+    audience = select(GymMembership.id, GymMembership.user_id, GymMembership.end_date).where(
+        GymMembership.end_date == expires_on,
+        GymMembership.status == "active",
+        _not_notified_today(GymMembership.user_id, "membership_expiring", now)
+    )
+    return fan_out(
+        db, "membership_expiring", audience, GymMembership.id,
+        lambda row: (
+            row.user_id,
+            "Абонемент скоро истекает",
+            f"Ваш абонемент истекает {row.end_date}. Не забудьте продлить!"
+        ),
+        created_at=now,
+        email=True
+    )
+
+
+async def cancel_training(db: AsyncSession, schedule: TrainerSchedule) -> int:
+    """
+    Удаление тренировки вместе с уведомлениями участников и листа ожидания
+    в одной транзакции: если удаление не прошло, уведомлений и писем нет.
+    Уведомления вставляются через ORM (счетчики непрочитанных и публикация
+    после commit - обработчиками сессии). Возвращает число получателей.
+    """
+    title = "Тренировка отменена"
+    message = f"Тренировка {schedule.date} в {schedule.start_time} была отменена. Пожалуйста, выберите другое время."
+    recipients = (await db.execute(
+        select(TrainingParticipant.user_id, User.email).join(
+            User, User.id == TrainingParticipant.user_id
+        ).where(
+            TrainingParticipant.schedule_id == schedule.id,
+            TrainingParticipant.status.in_(["confirmed", "waiting"])
+        ).order_by(TrainingParticipant.user_id)
+    )).all()
+    for user_id, email in recipients:
+        db.add(Notification(user_id=user_id, type="training_cancelled", title=title, message=message))
+        if email:
+            enqueue_email(db, email, title, message)
+    await db.delete(schedule)
+    await db.commit()
+    logger.info(f"[NOTIFICATIONS] training_cancelled: тренировка {schedule.id}, получателей {len(recipients)}")
+    return len(recipients)
\ No newline at end of file
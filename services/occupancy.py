@@ -0,0 +1,294 @@
+import logging
+from datetime import datetime, date, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import GymVisit, OccupancyHourly
+from schemas import GymOccupancyStats, OccupancyHourStats, OccupancyHeatmap
+
+logger = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+# Размер порции при дозаполнении витрины
+ROLLUP_CHUNK_DAYS = 7
+
+
+def _floor_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _hours_between(start: datetime, end: datetime) -> int:
+    """Количество часовых корзин, покрывающих [start, end)"""
+    return max(0, -((start - end) // HOUR))
+
+
+def fetch_visit_intervals(db: Session, start: datetime, end: datetime) -> List[Tuple[int, datetime, Optional[datetime]]]:
+    """Один запрос: все посещения, пересекающиеся с окном [start, end)"""
+    return db.query(GymVisit.user_id, GymVisit.check_in, GymVisit.check_out).filter(
+        GymVisit.check_in < end,
+        (GymVisit.check_out == None) | (GymVisit.check_out > start)
+    ).all()
+
+
+def aggregate_hours(
+    intervals: List[Tuple[int, datetime, Optional[datetime]]],
+    start: datetime,
+    hours: int,
+    now: datetime
+) -> List[OccupancyHourly]:
+    """
+    Почасовые агрегаты за один проход по интервалам посещений.
+
+    Незавершённые посещения считаются продолжающимися до `now`,
+    поэтому будущие часы остаются пустыми.
+    """
+    visits = [0] * hours
+    check_ins = [0] * hours
+    visitor_seconds = [0.0] * hours
+    visitors = [set() for _ in range(hours)]
+    window_end = start + hours * HOUR
+
+    for user_id, check_in, check_out in intervals:
+        visit_end = min(check_out or now, window_end)
+        if visit_end <= start or check_in >= window_end:
+            continue
+        if start <= check_in:
+            check_ins[(check_in - start) // HOUR] += 1
+
+        first = max(0, (check_in - start) // HOUR)
+        last = min(hours, _hours_between(start, visit_end))
+        for index in range(first, last):
+            hour_start = start + index * HOUR
+            overlap = min(visit_end, hour_start + HOUR) - max(check_in, hour_start)
+            visits[index] += 1
+            visitors[index].add(user_id)
+            visitor_seconds[index] += overlap.total_seconds()
+
+    return [
+        OccupancyHourly(
+            hour_start=start + index * HOUR,
+            visits=visits[index],
+            distinct_visitors=len(visitors[index]),
+            visitor_hours=round(visitor_seconds[index] / 3600, 4),
+            check_ins=check_ins[index]
+        )
+        for index in range(hours)
+    ]
+
+
+def refresh_rollup(db: Session, start: datetime, end: datetime) -> int:
+    """
+    Пересчет почасовой витрины за [start, end) по сырым посещениям.
+
+    Идемпотентно: строки периода удаляются и вставляются заново в одной транзакции.
+    Текущий (незакрытый) час в витрину не попадает.
+    """
+    now = datetime.now()
+    start = _floor_hour(start)
+    end = min(end, _floor_hour(now))
+    hours = _hours_between(start, end)
+    if not hours:
+        return 0
+    end = start + hours * HOUR
+
+    rows = aggregate_hours(fetch_visit_intervals(db, start, end), start, hours, now)
+    try:
+        db.query(OccupancyHourly).filter(
+            OccupancyHourly.hour_start >= start,
+            OccupancyHourly.hour_start < end
+        ).delete(synchronize_session=False)
+        db.add_all(rows)
+        db.commit()
+    except IntegrityError:
+        # Тот же период параллельно пересчитал другой воркер
+        db.rollback()
+        logger.info(f"[OCCUPANCY ROLLUP] Период {start} - {end} уже обновлен")
+    return hours
+
+
+def backfill_rollup(db: Session, start_date: date, end_date: date) -> int:
+    """Пересчет витрины за диапазон дат включительно"""
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    return refresh_rollup(db, start, end)
+
+
+def _refresh_in_chunks(db: Session, start: datetime, end: datetime) -> int:
+    hours = 0
+    while start < end:
+        chunk_end = min(start + timedelta(days=ROLLUP_CHUNK_DAYS), end)
+        hours += refresh_rollup(db, start, chunk_end)
+        start = chunk_end
+    return hours
+
+
+def refresh_closed_hours(db: Session) -> int:
+    """
+    Дозаполнение витрины закрытыми часами (задача планировщика occupancy_rollup):
+    от последнего рассчитанного часа до текущего, а также история посещений
+    до первого рассчитанного часа (первый запуск или пересчет только части
+    периода через /rollup/backfill). Порциями по ROLLUP_CHUNK_DAYS дней,
+    каждая в своей транзакции.
+    """
+    first_check_in = db.query(func.min(GymVisit.check_in)).scalar()
+    if first_check_in is None:
+        return 0
+    first_hour, last_hour = db.query(
+        func.min(OccupancyHourly.hour_start), func.max(OccupancyHourly.hour_start)
+    ).one()
+    history_start = _floor_hour(first_check_in)
+    if first_hour is None:
+        return _refresh_in_chunks(db, history_start, _floor_hour(datetime.now()))
+
+    hours = 0
+    if history_start < first_hour:
+        hours += _refresh_in_chunks(db, history_start, first_hour)
+    return hours + _refresh_in_chunks(db, last_hour + HOUR, _floor_hour(datetime.now()))
+
+
+def _missing_runs(start: datetime, hours: int, current_hour: datetime, stored) -> List[Tuple[datetime, int]]:
+    """Непрерывные участки прошедших часов периода, которых нет в витрине: (начало, часов)"""
+    runs = []
+    for index in range(hours):
+        hour_start = start + index * HOUR
+        if hour_start > current_hour or hour_start in stored:
+            continue
+        if runs and runs[-1][0] + runs[-1][1] * HOUR == hour_start:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((hour_start, 1))
+    return runs
+
+
+def get_hourly_rows(db: Session, start: datetime, end: datetime) -> List[OccupancyHourly]:
+    """
+    Почасовые агрегаты за период, только чтение: часы, рассчитанные в витрине,
+    читаются из нее; остальные прошедшие часы (текущий и те, до которых еще
+    не дошла задача occupancy_rollup) считаются по сырым посещениям;
+    будущие часы пустые.
+    """
+    now = datetime.now()
+    current_hour = _floor_hour(now)
+    start = _floor_hour(start)
+    hours = _hours_between(start, end)
+    end = start + hours * HOUR
+
+    stored = {
+        row.hour_start: row
+        for row in db.query(OccupancyHourly).filter(
+            OccupancyHourly.hour_start >= start,
+            OccupancyHourly.hour_start < min(end, current_hour)
+        ).all()
+    }
+
+    # Витрина хранит и пустые часы, поэтому отсутствие строки - час не рассчитан.
+    # Такие часы идут непрерывными участками (обычно один - от последнего
+    # рассчитанного часа до текущего), каждый считается одним запросом
+    live = {}
+    for live_start, live_hours in _missing_runs(start, hours, current_hour, stored):
+        intervals = fetch_visit_intervals(db, live_start, live_start + live_hours * HOUR)
+        live.update((row.hour_start, row) for row in aggregate_hours(intervals, live_start, live_hours, now))
+
+    rows = []
+    for index in range(hours):
+        hour_start = start + index * HOUR
+        row = stored.get(hour_start) or live.get(hour_start)
+        if row is None:
+            row = OccupancyHourly(
+                hour_start=hour_start, visits=0, distinct_visitors=0, visitor_hours=0.0, check_ins=0
+            )
+        rows.append(row)
+    return rows
+
+
+def get_range_stats(db: Session, start: datetime, end: datetime) -> List[GymOccupancyStats]:
+    """Почасовая загрузка зала за произвольный период"""
+    return [
+        GymOccupancyStats(
+            current_visitors=row.visits,
+            timestamp=row.hour_start
+        )
+        for row in get_hourly_rows(db, start, end)
+    ]
+
+
+def get_daily_stats(db: Session, target_date: date) -> List[GymOccupancyStats]:
+    start = datetime.combine(target_date, datetime.min.time())
+    return get_range_stats(db, start, start + timedelta(days=1))
+
+
+def get_weekly_stats(db: Session, start_date: date) -> List[List[GymOccupancyStats]]:
+    start = datetime.combine(start_date, datetime.min.time())
+    stats = get_range_stats(db, start, start + timedelta(days=7))
+    return [stats[day * 24:(day + 1) * 24] for day in range(7)]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией по отсортированной выборке"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _summarize(values: List[float], hour: int, day_of_week: Optional[int] = None) -> OccupancyHourStats:
+    values = sorted(values)
+    return OccupancyHourStats(
+        day_of_week=day_of_week,
+        hour=hour,
+        mean=round(sum(values) / len(values), 2) if values else 0.0,
+        median=round(_percentile(values, 0.5), 2),
+        p95=round(_percentile(values, 0.95), 2),
+        samples=len(values)
+    )
+
+
+def _average_visitors(row: OccupancyHourly, now: datetime) -> float:
+    """
+    Среднее число людей в зале за час: человеко-часы, деленные на длительность
+    часа (для текущего часа - на прошедшую его часть). В отличие от числа
+    посещений, пересекающихся с часом, не завышает загрузку за счет коротких
+    визитов на границе часа.
+    """
+    elapsed_hours = min(1.0, (now - row.hour_start) / HOUR)
+    if elapsed_hours <= 0:
+        return 0.0
+    return row.visitor_hours / elapsed_hours
+
+
+def get_heatmap(db: Session, start: datetime, end: datetime) -> OccupancyHeatmap:
+    """
+    Средняя, медианная и p95 загрузка по часу суток и по дню недели.
+
+    Загрузка часа - среднее число людей в зале (взвешенное по времени,
+    см. _average_visitors). Почасовой ряд берется из витрины (плюс еще не
+    рассчитанные часы), после чего значения раскладываются по корзинам
+    (день недели, час); будущие часы в выборку не входят.
+    """
+    now = datetime.now()
+    rows = get_hourly_rows(db, start, end)
+
+    by_hour = [[] for _ in range(24)]
+    by_weekday_hour = [[[] for _ in range(24)] for _ in range(7)]
+    for row in rows:
+        if row.hour_start >= now:
+            continue
+        hour = row.hour_start.hour
+        day_of_week = row.hour_start.weekday()
+        average = _average_visitors(row, now)
+        by_hour[hour].append(average)
+        by_weekday_hour[day_of_week][hour].append(average)
+
+    return OccupancyHeatmap(
+        start=rows[0].hour_start if rows else _floor_hour(start),
+        end=rows[-1].hour_start + HOUR if rows else _floor_hour(start),
+        by_hour=[_summarize(values, hour) for hour, values in enumerate(by_hour)],
+        by_weekday_hour=[
+            _summarize(values, hour, day_of_week)
+            for day_of_week, hours_of_day in enumerate(by_weekday_hour)
+            for hour, values in enumerate(hours_of_day)
+        ]
+    )
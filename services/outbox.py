@@ -0,0 +1,325 @@
+"""
+Исходящие письма (transactional outbox).
+
+enqueue_email записывает письмо в таблицу email_outbox в той же транзакции,
+что и изменение данных: запрос не ждет SMTP, а письмо уходит только если
+транзакция зафиксирована.
+
+Пул воркеров (EMAIL_WORKERS) забирает готовые письма пакетами с арендой
+(locked_until): если воркер упал, после окончания аренды письма снова
+доступны. Пакет отправляется через одно SMTP-соединение. Неудачная попытка
+повторяется с экспоненциальной задержкой; после EMAIL_MAX_ATTEMPTS попыток
+или при постоянной ошибке (код 5xx) письмо переводится в status="dead"
+(вернуть в очередь: python manage.py requeue-dead-emails).
+Доставка - "хотя бы один раз": письмо, отправленное перед падением воркера,
+может уйти повторно.
+"""
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+from uuid import uuid4
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from metrics import Histogram
+from models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST")  # Не задан - письма только пишутся в лог
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
+EMAIL_FROM = os.getenv("EMAIL_FROM", "noreply@gym.local")
+
+EMAIL_OUTBOX_ENABLED = os.getenv("EMAIL_OUTBOX_ENABLED", "true").lower() in ("1", "true", "yes")
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+# Аренда должна быть заметно больше времени отправки пакета
+EMAIL_LEASE_SECONDS = int(os.getenv("EMAIL_LEASE_SECONDS", "300"))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "2"))
+EMAIL_SENT_RETENTION_DAYS = int(os.getenv("EMAIL_SENT_RETENTION_DAYS", "7"))
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_DEAD = "dead"
+
+email_batch_seconds = Histogram(
+    "email_outbox_batch_seconds",
+    "Время отправки пакета писем через одно SMTP-соединение"
+)
+
+# Результат отправки письма: None - доставлено, иначе (постоянная ошибка, текст ошибки)
+SendResult = Optional[Tuple[bool, str]]
+
+
+def enqueue_email(db, recipient: str, subject: str, body: str):
+    """
+    Письмо в outbox в текущей транзакции db (Session или AsyncSession),
+    commit выполняет вызывающий код вместе с изменением данных
+    """
+    db.add(EmailOutbox(
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        status=STATUS_PENDING,
+        attempts=0,
+        next_attempt_at=datetime.now()
+    ))
+
+
+def outbox_values(recipient: str, subject: str, body: str, created_at: datetime) -> dict:
+    """Строка для пакетной вставки insert(EmailOutbox)"""
+    return {
+        "recipient": recipient,
+        "subject": subject,
+        "body": body,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "next_attempt_at": created_at,
+        "created_at": created_at,
+    }
+
+
+def _build_message(recipient: str, subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = EMAIL_FROM
+    message["To"] = recipient
+    message["Subject"] = subject
+    message.set_content(body)
+    return message
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Ответ 5xx на конкретное письмо: повтор не поможет"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class SmtpTransport:
+    """Пакет писем через одно SMTP-соединение"""
+
+    def __init__(self, host: str, port: int, user: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = False, timeout: float = SMTP_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send_batch(self, messages: List[EmailMessage]) -> List[SendResult]:
+        results: List[SendResult] = []
+        smtp = None
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password or "")
+            for message in messages:
+                try:
+                    smtp.send_message(message)
+                    results.append(None)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    results.append((_is_permanent(e), f"{type(e).__name__}: {e}"))
+        except (OSError, smtplib.SMTPException) as e:
+            # Ошибка соединения или авторизации - временная для всех неотправленных писем
+            results += [(False, f"{type(e).__name__}: {e}")] * (len(messages) - len(results))
+        finally:
+            if smtp is not None:
+                try:
+                    smtp.quit()
+                except (OSError, smtplib.SMTPException):
+                    smtp.close()
+        return results
+
+
+class LogTransport:
+    """Без SMTP_HOST (разработка): письма только пишутся в лог"""
+
+    def send_batch(self, messages: List[EmailMessage]) -> List[SendResult]:
+        for message in messages:
+            logger.info(f"[EMAIL] To: {message['To']}, Subject: {message['Subject']}, Body: {message.get_content().strip()}")
+        return [None] * len(messages)
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """Экспоненциальная задержка перед следующей попыткой, со случайным разбросом +-20%"""
+    delay = min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_batch(limit: int) -> List[tuple]:
+    """
+    Берет в аренду до limit готовых писем: (id, recipient, subject, body, attempts).
+    В PostgreSQL строки, уже заблокированные другим воркером, пропускаются
+    (SKIP LOCKED); повторная проверка аренды в UPDATE не дает двум воркерам
+    взять одно письмо и в SQLite. Попытка засчитывается при взятии, поэтому
+    письмо, на котором падает воркер, тоже попадет в dead.
+    """
+    now = datetime.now()
+    token = uuid4().hex
+    free = or_(EmailOutbox.locked_until == None, EmailOutbox.locked_until < now)
+    db = SessionLocal()
+    try:
+        ids = db.execute(
+            select(EmailOutbox.id).where(
+                EmailOutbox.status == STATUS_PENDING,
+                EmailOutbox.next_attempt_at <= now,
+                free
+            ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(limit).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            db.rollback()
+            return []
+        db.execute(
+            update(EmailOutbox).where(EmailOutbox.id.in_(ids), EmailOutbox.status == STATUS_PENDING, free).values(
+                locked_until=now + timedelta(seconds=EMAIL_LEASE_SECONDS),
+                lease_token=token,
+                attempts=EmailOutbox.attempts + 1
+            ).execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return db.execute(
+            select(EmailOutbox.id, EmailOutbox.recipient, EmailOutbox.subject, EmailOutbox.body, EmailOutbox.attempts)
+            .where(EmailOutbox.lease_token == token)
+            .order_by(EmailOutbox.id)
+        ).all()
+    finally:
+        db.close()
+
+
+def complete_batch(batch: List[tuple], results: List[SendResult]) -> Counter:
+    """Сохраняет результаты отправки пакета одной транзакцией"""
+    now = datetime.now()
+    counts = Counter()
+    values = []
+    for (outbox_id, recipient, _, _, attempts), result in zip(batch, results):
+        if result is None:
+            counts[STATUS_SENT] += 1
+            values.append({"id": outbox_id, "status": STATUS_SENT, "sent_at": now, "locked_until": None, "last_error": None})
+            continue
+        permanent, error = result
+        if permanent or attempts >= EMAIL_MAX_ATTEMPTS:
+            counts[STATUS_DEAD] += 1
+            logger.error(f"[EMAIL] Письмо {outbox_id} для {recipient} не доставлено после {attempts} попыток: {error}")
+            values.append({"id": outbox_id, "status": STATUS_DEAD, "locked_until": None, "last_error": error})
+        else:
+            counts["retry"] += 1
+            values.append({
+                "id": outbox_id,
+                "next_attempt_at": now + timedelta(seconds=retry_delay_seconds(attempts)),
+                "locked_until": None,
+                "last_error": error,
+            })
+    db = SessionLocal()
+    try:
+        # Пакетное обновление по первичному ключу
+        db.execute(update(EmailOutbox), values)
+        db.commit()
+    finally:
+        db.close()
+    return counts
+
+
+def requeue_dead(db: Session) -> int:
+    """Возвращает в очередь письма из dead (после исправления причины)"""
+    result = db.execute(
+        update(EmailOutbox).where(EmailOutbox.status == STATUS_DEAD).values(
+            status=STATUS_PENDING,
+            attempts=0,
+            next_attempt_at=datetime.now(),
+            locked_until=None,
+            lease_token=None
+        ).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def purge_sent(db: Session, days: int = EMAIL_SENT_RETENTION_DAYS) -> int:
+    """Удаляет отправленные письма старше days дней"""
+    result = db.execute(
+        delete(EmailOutbox).where(
+            EmailOutbox.status == STATUS_SENT,
+            EmailOutbox.sent_at < datetime.now() - timedelta(days=days)
+        ).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+class EmailOutboxWorkers:
+    """
+    Пул асинхронных воркеров. Обращения к БД и SMTP блокирующие и выполняются
+    в пуле потоков, поэтому воркеры не задерживают обработку запросов.
+    """
+
+    def __init__(self, transport, workers: int = EMAIL_WORKERS, batch_size: int = EMAIL_BATCH_SIZE):
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    async def drain_once(self) -> int:
+        """Один пакет: взять, отправить, сохранить результат. Возвращает размер пакета"""
+        batch = await asyncio.to_thread(claim_batch, self.batch_size)
+        if not batch:
+            return 0
+        messages = [_build_message(recipient, subject, body) for _, recipient, subject, body, _ in batch]
+        started = time.perf_counter()
+        results = await asyncio.to_thread(self.transport.send_batch, messages)
+        email_batch_seconds.observe(time.perf_counter() - started)
+        counts = await asyncio.to_thread(complete_batch, batch, results)
+        with self._lock:
+            self._counts.update(counts)
+        return len(batch)
+
+    async def _worker(self):
+        while True:
+            try:
+                processed = await self.drain_once()
+            except Exception:
+                logger.exception("[EMAIL] Ошибка воркера исходящих писем")
+                processed = 0
+            if processed < self.batch_size:
+                # Очередь разобрана - ждем новых писем; разброс, чтобы воркеры не опрашивали БД одновременно
+                await asyncio.sleep(EMAIL_POLL_SECONDS * random.uniform(0.5, 1.5))
+
+    async def run(self):
+        """Запускается из lifespan приложения"""
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+def _create_transport():
+    if SMTP_HOST:
+        return SmtpTransport(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_STARTTLS)
+    return LogTransport()
+
+
+email_outbox = EmailOutboxWorkers(_create_transport())
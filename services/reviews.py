@@ -0,0 +1,73 @@
+from typing import Dict, Iterable
+from sqlalchemy.orm import Session
+from models import TrainerReviewSummary
+from schemas import TrainerReviewStats
+
+RATINGS = (1, 2, 3, 4, 5)
+
+
+def _rating_column(rating: int):
+    return getattr(TrainerReviewSummary, f"rating_{rating}")
+
+
+def _empty_summary(trainer_id: int) -> TrainerReviewSummary:
+    return TrainerReviewSummary(trainer_id=trainer_id, **{f"rating_{rating}": 0 for rating in RATINGS})
+
+
+def _to_stats(summary: TrainerReviewSummary) -> TrainerReviewStats:
+    distribution = {rating: getattr(summary, f"rating_{rating}") or 0 for rating in RATINGS}
+    total_reviews = sum(distribution.values())
+    average_rating = sum(rating * count for rating, count in distribution.items()) / total_reviews if total_reviews else 0.0
+    return TrainerReviewStats(
+        average_rating=round(average_rating, 2),
+        total_reviews=total_reviews,
+        rating_distribution=distribution
+    )
+
+
+def get_review_stats_map(db: Session, trainer_ids: Iterable[int]) -> Dict[int, TrainerReviewStats]:
+    """
+    Статистика отзывов для набора тренеров из сводной таблицы (только чтение).
+    Отсутствие сводной строки означает, что одобренных отзывов нет: строки
+    заполнены миграцией 0011 и дальше создаются только apply_review_change.
+    """
+    trainer_ids = list(dict.fromkeys(trainer_ids))
+    if not trainer_ids:
+        return {}
+
+    summaries = {
+        summary.trainer_id: summary
+        for summary in db.query(TrainerReviewSummary).filter(
+            TrainerReviewSummary.trainer_id.in_(trainer_ids)
+        ).all()
+    }
+    return {
+        trainer_id: _to_stats(summaries.get(trainer_id) or _empty_summary(trainer_id))
+        for trainer_id in trainer_ids
+    }
+
+
+def get_review_stats(db: Session, trainer_id: int) -> TrainerReviewStats:
+    return get_review_stats_map(db, [trainer_id])[trainer_id]
+
+
+def apply_review_change(db: Session, trainer_id: int, rating: int, delta: int):
+    """
+    Инкрементальное обновление сводной статистики в транзакции вызывающего кода.
+    delta: +1 - отзыв стал одобренным, -1 - одобренный отзыв удален.
+    Один INSERT ... ON CONFLICT DO UPDATE: первый одобренный отзыв создает
+    строку, параллельные изменения складываются, а не конфликтуют.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    column = _rating_column(rating)
+    values = {f"rating_{value}": 0 for value in RATINGS}
+    values[column.key] = delta
+    db.execute(
+        insert(TrainerReviewSummary).values(trainer_id=trainer_id, **values).on_conflict_do_update(
+            index_elements=[TrainerReviewSummary.trainer_id],
+            set_={column.key: column + delta}
+        )
+    )
@@ -0,0 +1,556 @@
+"""
+Периодические задачи: напоминания о тренировках, истекающие абонементы,
+сверка счетчиков участников и непрочитанных уведомлений, очистка отправленных писем,
+дозаполнение почасовой витрины загрузки зала.
+
+Планировщик запускается из lifespan приложения в каждом воркере, но задачи
+выполняет только лидер. Лидерство - блокировка в Redis (REDIS_URL),
+advisory lock в PostgreSQL или, для SQLite, блокировка файла (flock): лидером
+становится один процесс на хосте.
+
+Расписание задается cron-выражением, к времени запуска добавляется
+случайная задержка (jitter), чтобы задачи не стартовали одновременно.
+Последний запуск сохраняется в scheduled_job_runs: запуск, пропущенный пока
+приложение было остановлено или лидер сменялся, выполняется один раз.
+Новый запуск задачи не начинается, пока не завершился предыдущий: на время
+выполнения в scheduled_job_runs записывается аренда (владелец и срок),
+которую выполняющий воркер продлевает. Новый лидер после смены не запускает
+задачу, пока аренда предыдущего не истекла.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import socket
+import tempfile
+import threading
+import time as clock
+from collections import Counter
+from datetime import datetime, time, timedelta
+from typing import Any, Callable, Dict, Optional
+from uuid import uuid4
+from sqlalchemy import create_engine, or_, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import NullPool
+from database import DATABASE_URL, SessionLocal
+from metrics import Histogram
+from models import ScheduledJobRun
+from services import booking, notifications, occupancy, outbox
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+LEADER_KEY = "gym:scheduler:leader"
+# Ключ advisory lock в PostgreSQL
+LEADER_ADVISORY_KEY = 7710022
+LEADER_TTL_SECONDS = int(os.getenv("SCHEDULER_LEADER_TTL_SECONDS", "30"))
+# Как часто лидер продлевает блокировку, а остальные воркеры пытаются ее взять
+LEADER_RENEW_SECONDS = max(1, LEADER_TTL_SECONDS // 3)
+# Аренда выполняющегося запуска задачи и период ее продления
+JOB_LEASE_SECONDS = int(os.getenv("SCHEDULER_JOB_LEASE_SECONDS", "120"))
+JOB_LEASE_RENEW_SECONDS = max(1, JOB_LEASE_SECONDS // 3)
+
+job_duration_seconds = Histogram(
+    "scheduler_job_duration_seconds",
+    "Длительность выполнения периодических задач"
+)
+job_lag_seconds = Histogram(
+    "scheduler_job_lag_seconds",
+    "Задержка старта задачи относительно расписания (jitter, ожидание, пропущенные запуски)",
+    buckets=(0.1, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0, 21600.0, 86400.0)
+)
+
+
+class CronSchedule:
+    """
+    Cron-выражение из 5 полей: минута, час, день месяца, месяц, день недели
+    (0 и 7 - воскресенье). Поддерживаются *, списки, диапазоны и шаг: "*/15", "1-5", "0,30".
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron-выражение должно состоять из 5 полей: {expression!r}")
+        self.expression = expression
+        minutes, hours, days, months, weekdays = [
+            _parse_cron_field(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)
+        ]
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.days = days
+        self.months = months
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    def _day_matches(self, day) -> bool:
+        if day.month not in self.months:
+            return False
+        day_matches = day.day in self.days
+        weekday_matches = (day.weekday() + 1) % 7 in self.weekdays
+        # Как в cron: если ограничены и день месяца, и день недели, достаточно любого
+        if self._any_day or self._any_weekday:
+            return day_matches and weekday_matches
+        return day_matches or weekday_matches
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Ближайшее время срабатывания строго после moment"""
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime.combine(day, time(hour, minute))
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"Расписание {self.expression!r} никогда не срабатывает")
+
+
+def _parse_cron_field(part: str, low: int, high: int) -> set:
+    values = set()
+    for item in part.split(","):
+        value_range, _, step = item.partition("/")
+        step = int(step) if step else 1
+        if value_range == "*":
+            start, end = low, high
+        elif "-" in value_range:
+            start, end = (int(value) for value in value_range.split("-", 1))
+        else:
+            start = end = int(value_range)
+            if step != 1:
+                end = high
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Некорректное поле cron-выражения: {part!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class FileLeaderLock:
+    """
+    Без общего хранилища (SQLite): неблокирующий flock на файле. Лидер - процесс,
+    открывший блокировку первым; остальные воркеры на этом хосте ждут. Блокировка
+    снимается системой при завершении процесса.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+
+    def acquire_or_renew(self) -> bool:
+        if self._file is not None:
+            return True
+        import fcntl
+        lock_file = open(self._path, "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        import fcntl
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class RedisLeaderLock:
+    """Блокировка SET NX EX в Redis; продлевается и снимается только владельцем"""
+
+    RENEW_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('expire', KEYS[1], ARGV[2]) else return 0 end"
+    )
+    RELEASE_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) else return 0 end"
+    )
+
+    def __init__(self, redis_url: str, ttl_seconds: int):
+        import redis
+        self._redis = redis.Redis.from_url(redis_url)
+        self._token = uuid4().hex
+        self._ttl_seconds = ttl_seconds
+        self._held = False
+
+    def acquire_or_renew(self) -> bool:
+        try:
+            if self._held:
+                self._held = bool(self._redis.eval(self.RENEW_SCRIPT, 1, LEADER_KEY, self._token, self._ttl_seconds))
+            if not self._held:
+                self._held = bool(self._redis.set(LEADER_KEY, self._token, nx=True, ex=self._ttl_seconds))
+        except Exception as e:
+            logger.warning(f"[SCHEDULER] Redis недоступен, задачи не выполняются: {e}")
+            self._held = False
+        return self._held
+
+    def release(self):
+        if self._held:
+            try:
+                self._redis.eval(self.RELEASE_SCRIPT, 1, LEADER_KEY, self._token)
+            except Exception as e:
+                logger.warning(f"[SCHEDULER] Не удалось снять блокировку в Redis: {e}")
+            self._held = False
+
+
+class PostgresLeaderLock:
+    """
+    Advisory lock уровня сессии в PostgreSQL. Держится на отдельном соединении
+    (не из пула приложения) и снимается сервером, если соединение оборвалось.
+    """
+
+    def __init__(self, database_url: str):
+        self._engine = create_engine(database_url, poolclass=NullPool)
+        self._connection = None
+
+    def _close(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+    def acquire_or_renew(self) -> bool:
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1"))
+                self._connection.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"[SCHEDULER] Потеряно соединение с блокировкой лидера: {e}")
+                self._close()
+                return False
+        try:
+            self._connection = self._engine.connect()
+            acquired = self._connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": LEADER_ADVISORY_KEY}
+            ).scalar()
+            self._connection.commit()
+        except Exception as e:
+            logger.warning(f"[SCHEDULER] Не удалось взять advisory lock: {e}")
+            acquired = False
+        if not acquired:
+            self._close()
+        return bool(acquired)
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LEADER_ADVISORY_KEY})
+            self._connection.commit()
+        except Exception as e:
+            logger.warning(f"[SCHEDULER] Не удалось снять advisory lock: {e}")
+        self._close()
+
+
+class Job:
+    """Периодическая задача; func выполняется в пуле потоков"""
+
+    def __init__(self, name: str, schedule: CronSchedule, func: Callable[[], Any],
+                 jitter_seconds: int = 0, catch_up: bool = True):
+        self.name = name
+        self.schedule = schedule
+        self.func = func
+        self.jitter_seconds = jitter_seconds
+        self.catch_up = catch_up
+        self.scheduled_at: Optional[datetime] = None   # Ближайший запуск по расписанию
+        self.due_at: Optional[datetime] = None         # С учетом jitter
+        self.running = False
+
+    def plan(self, scheduled_at: datetime):
+        self.scheduled_at = scheduled_at
+        self.due_at = scheduled_at + timedelta(seconds=random.uniform(0, self.jitter_seconds))
+
+
+class Scheduler:
+    def __init__(self, leader_lock):
+        self.leader_lock = leader_lock
+        self.jobs: Dict[str, Job] = {}
+        self.is_leader = False
+        # Владелец аренды запусков задач
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._runs = Counter()
+        self._skipped = Counter()
+        self._last_success: Dict[str, float] = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def add_job(self, name: str, cron: str, func: Callable[[], Any], jitter_seconds: int = 0, catch_up: bool = True) -> Job:
+        job = Job(name, CronSchedule(cron), func, jitter_seconds, catch_up)
+        self.jobs[name] = job
+        return job
+
+    def _plan_jobs(self, now: datetime):
+        """Ближайшие запуски при получении лидерства, с учетом пропущенных"""
+        last_runs = _load_last_runs()
+        for job in self.jobs.values():
+            last = last_runs.get(job.name)
+            scheduled_at = job.schedule.next_after(last) if last else job.schedule.next_after(now)
+            if scheduled_at <= now and not job.catch_up:
+                scheduled_at = job.schedule.next_after(now)
+            if scheduled_at <= now:
+                logger.info(f"[SCHEDULER] {job.name}: пропущен запуск {scheduled_at}, выполняем сейчас")
+                job.scheduled_at, job.due_at = scheduled_at, now
+            else:
+                job.plan(scheduled_at)
+
+    def _launch_due(self, now: datetime):
+        for job in self.jobs.values():
+            if job.due_at is None or job.due_at > now:
+                continue
+            scheduled_at = job.scheduled_at
+            # Несколько пропущенных запусков сливаются в один
+            job.plan(job.schedule.next_after(max(scheduled_at, now)))
+            if job.running:
+                with self._lock:
+                    self._skipped[job.name] += 1
+                logger.warning(f"[SCHEDULER] {job.name}: предыдущий запуск еще выполняется, запуск {scheduled_at} пропущен")
+                continue
+            task = asyncio.create_task(self._run(job, scheduled_at))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Job, scheduled_at: datetime):
+        job.running = True
+        try:
+            claimed = await asyncio.to_thread(_claim_lease, job.name, self.owner)
+        except Exception:
+            logger.exception(f"[SCHEDULER] Не удалось взять аренду задачи {job.name}")
+            claimed = False
+        if not claimed:
+            job.running = False
+            with self._lock:
+                self._skipped[job.name] += 1
+            logger.warning(f"[SCHEDULER] {job.name}: задача еще выполняется другим воркером, запуск {scheduled_at} пропущен")
+            return
+
+        started_at = datetime.now()
+        job_lag_seconds.observe(max(0.0, (started_at - scheduled_at).total_seconds()), job=job.name)
+        started = clock.perf_counter()
+        status, error = "ok", None
+        try:
+            await self._run_with_lease(job)
+        except Exception as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+            logger.exception(f"[SCHEDULER] Ошибка задачи {job.name}")
+        finally:
+            job_duration_seconds.observe(clock.perf_counter() - started, job=job.name)
+            with self._lock:
+                self._runs[(job.name, status)] += 1
+                if status == "ok":
+                    self._last_success[job.name] = clock.time()
+            job.running = False
+        try:
+            await asyncio.to_thread(_save_run, job.name, scheduled_at, started_at, status, error, self.owner)
+        except Exception:
+            logger.exception(f"[SCHEDULER] Не удалось сохранить запуск задачи {job.name}")
+
+    async def _run_with_lease(self, job: Job):
+        """Выполнение задачи в пуле потоков с продлением аренды, пока она работает"""
+        work = asyncio.ensure_future(asyncio.to_thread(job.func))
+        while True:
+            done, _ = await asyncio.wait({work}, timeout=JOB_LEASE_RENEW_SECONDS)
+            if done:
+                return work.result()
+            try:
+                if not await asyncio.to_thread(_renew_lease, job.name, self.owner):
+                    logger.warning(f"[SCHEDULER] {job.name}: аренда запуска потеряна")
+            except Exception:
+                logger.exception(f"[SCHEDULER] Не удалось продлить аренду задачи {job.name}")
+
+    def _sleep_seconds(self, now: datetime) -> float:
+        if not self.is_leader:
+            return LEADER_RENEW_SECONDS
+        due = [job.due_at for job in self.jobs.values() if job.due_at is not None]
+        until_due = min((due_at - now).total_seconds() for due_at in due) if due else LEADER_RENEW_SECONDS
+        return min(max(until_due, 0.05), LEADER_RENEW_SECONDS)
+
+    async def run(self):
+        """Основной цикл (запускается из lifespan приложения)"""
+        try:
+            while True:
+                try:
+                    is_leader = await asyncio.to_thread(self.leader_lock.acquire_or_renew)
+                    if is_leader and not self.is_leader:
+                        logger.info("[SCHEDULER] Воркер стал лидером, периодические задачи выполняются здесь")
+                        await asyncio.to_thread(self._plan_jobs, datetime.now())
+                    elif self.is_leader and not is_leader:
+                        logger.warning("[SCHEDULER] Лидерство потеряно")
+                    self.is_leader = is_leader
+                    if is_leader:
+                        self._launch_due(datetime.now())
+                except Exception:
+                    logger.exception("[SCHEDULER] Ошибка цикла планировщика")
+                await asyncio.sleep(self._sleep_seconds(datetime.now()))
+        finally:
+            self.is_leader = False
+            await asyncio.to_thread(self.leader_lock.release)
+
+    def run_now(self, name: str):
+        """Синхронный запуск задачи вне расписания (python manage.py run-job)"""
+        self.jobs[name].func()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "is_leader": self.is_leader,
+                "runs": dict(self._runs),
+                "skipped": dict(self._skipped),
+                "last_success": dict(self._last_success),
+                "running": [job.name for job in self.jobs.values() if job.running],
+            }
+
+
+def _load_last_runs() -> Dict[str, datetime]:
+    """
+    Время старта последнего завершенного запуска по задачам. Считаем от старта,
+    а не от времени по расписанию: запуск, наверстывающий несколько пропущенных,
+    покрывает их все.
+    """
+    db = SessionLocal()
+    try:
+        return {job_name: started_at for job_name, started_at in db.query(
+            ScheduledJobRun.job_name, ScheduledJobRun.started_at
+        ) if started_at is not None}
+    finally:
+        db.close()
+
+
+def _claim_lease(job_name: str, owner: str) -> bool:
+    """
+    Аренда запуска задачи: берется, если задача не выполняется (аренды нет
+    или она истекла). False - задачу еще выполняет другой воркер.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        lease = {
+            ScheduledJobRun.lease_owner: owner,
+            ScheduledJobRun.lease_until: now + timedelta(seconds=JOB_LEASE_SECONDS),
+        }
+        claimed = db.query(ScheduledJobRun).filter(
+            ScheduledJobRun.job_name == job_name,
+            or_(
+                ScheduledJobRun.lease_until == None,
+                ScheduledJobRun.lease_until < now,
+                ScheduledJobRun.lease_owner == owner
+            )
+        ).update(lease, synchronize_session=False)
+        if not claimed:
+            if db.query(ScheduledJobRun.job_name).filter(ScheduledJobRun.job_name == job_name).first():
+                db.rollback()
+                return False
+            # Первый запуск задачи: строки еще нет
+            db.add(ScheduledJobRun(job_name=job_name, **{column.key: value for column, value in lease.items()}))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+    finally:
+        db.close()
+
+
+def _renew_lease(job_name: str, owner: str) -> bool:
+    db = SessionLocal()
+    try:
+        renewed = db.query(ScheduledJobRun).filter(
+            ScheduledJobRun.job_name == job_name,
+            ScheduledJobRun.lease_owner == owner
+        ).update(
+            {ScheduledJobRun.lease_until: datetime.now() + timedelta(seconds=JOB_LEASE_SECONDS)},
+            synchronize_session=False
+        )
+        db.commit()
+        return bool(renewed)
+    finally:
+        db.close()
+
+
+def _save_run(job_name: str, scheduled_at: datetime, started_at: datetime, status: str, error: Optional[str],
+              owner: Optional[str] = None):
+    """Результат запуска; аренда снимается, если она все еще у этого воркера"""
+    db = SessionLocal()
+    try:
+        db.merge(ScheduledJobRun(
+            job_name=job_name,
+            scheduled_at=scheduled_at,
+            started_at=started_at,
+            finished_at=datetime.now(),
+            status=status,
+            error=error,
+        ))
+        if owner is not None:
+            db.flush()
+            db.query(ScheduledJobRun).filter(
+                ScheduledJobRun.job_name == job_name,
+                ScheduledJobRun.lease_owner == owner
+            ).update({ScheduledJobRun.lease_owner: None, ScheduledJobRun.lease_until: None}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _with_session(func: Callable) -> Callable[[], Any]:
+    def run():
+        db = SessionLocal()
+        try:
+            return func(db)
+        finally:
+            db.close()
+    return run
+
+
+def _create_leader_lock():
+    if REDIS_URL:
+        return RedisLeaderLock(REDIS_URL, LEADER_TTL_SECONDS)
+    if DATABASE_URL and DATABASE_URL.startswith("postgresql"):
+        return PostgresLeaderLock(DATABASE_URL)
+    return FileLeaderLock(os.getenv("SCHEDULER_LOCK_FILE") or os.path.join(
+        tempfile.gettempdir(), f"gym-scheduler-{hashlib.sha1(DATABASE_URL.encode()).hexdigest()[:12]}.lock"
+    ))
+
+
+scheduler = Scheduler(_create_leader_lock())
+scheduler.add_job(
+    "training_reminders", os.getenv("TRAINING_REMINDERS_CRON", "0 18 * * *"),
+    _with_session(notifications.send_training_reminders), jitter_seconds=60
+)
+scheduler.add_job(
+    "expiring_memberships", os.getenv("EXPIRING_MEMBERSHIPS_CRON", "0 10 * * *"),
+    _with_session(notifications.notify_expiring_memberships), jitter_seconds=60
+)
+# Сверка - страховка, пропущенные запуски не наверстываются
+scheduler.add_job(
+    "booking_repair", os.getenv("BOOKING_REPAIR_CRON", "17 * * * *"),
+    booking.repair_from_db, jitter_seconds=30, catch_up=False
+)
+scheduler.add_job(
+    "unread_repair", os.getenv("UNREAD_REPAIR_CRON", "25 4 * * *"),
+    notifications.repair_from_db, jitter_seconds=60, catch_up=False
+)
+scheduler.add_job(
+    "email_outbox_purge", os.getenv("EMAIL_OUTBOX_PURGE_CRON", "40 3 * * *"),
+    _with_session(outbox.purge_sent), jitter_seconds=60, catch_up=False
+)
+# Витрина сама дозаполняется от последнего рассчитанного часа
+scheduler.add_job(
+    "occupancy_rollup", os.getenv("OCCUPANCY_ROLLUP_CRON", "3 * * * *"),
+    _with_session(occupancy.refresh_closed_hours), jitter_seconds=30, catch_up=False
+)
@@ -0,0 +1,272 @@
+"""
+Загрузка изображений (фото тренеров, картинки новостей).
+
+Файлы хранятся по хэшу содержимого (uploads/objects/ab/cd/<sha256>.<ext>):
+одинаковые загрузки занимают место один раз, а объекты, на которые больше
+не ссылаются TrainerInfo.photo_url и News.image_url, удаляет collect_garbage
+(python manage.py gc-uploads).
+
+Файл читается из запроса частями и пишется на диск в пуле потоков, не блокируя
+event loop; размер ограничен UPLOAD_MAX_BYTES. Тип определяется по сигнатуре
+содержимого, а не по имени файла. Уменьшенные WebP-варианты строятся в
+отдельном пуле воркеров.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from uuid import uuid4
+from fastapi import HTTPException, UploadFile
+from fastapi.staticfiles import StaticFiles
+from PIL import Image, ImageOps
+from sqlalchemy.orm import Session
+from models import News, TrainerInfo
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = "uploads"
+# Хранилище по хэшу содержимого: один файл на уникальное содержимое
+OBJECTS_DIR = os.path.join(UPLOAD_ROOT, "objects")
+OBJECTS_URL = "/uploads/objects"
+DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+GC_GRACE_SECONDS = int(os.getenv("UPLOADS_GC_GRACE_SECONDS", "3600"))
+# Имя файла объекта меняется вместе с содержимым, поэтому его можно кэшировать навсегда
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = "public, max-age=3600"
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 256 * 1024
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Защита от "декомпрессионных бомб": маленький файл с огромным разрешением
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+
+# Вариант -> максимальная сторона в пикселях
+IMAGE_VARIANTS = {
+    "thumb": 320,
+    "medium": 1280,
+}
+WEBP_QUALITY = 80
+
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-variants")
+
+os.makedirs(OBJECTS_DIR, exist_ok=True)
+
+
+class UploadsStaticFiles(StaticFiles):
+    """Раздача /uploads: объекты хранилища кэшируются браузером и CDN бессрочно"""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        immutable = os.path.realpath(full_path).startswith(os.path.realpath(OBJECTS_DIR) + os.sep)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else MUTABLE_CACHE_CONTROL
+        return response
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Расширение по первым байтам файла или None, если это не поддерживаемое изображение"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def variant_name(file_name: str, variant: str) -> str:
+    """photo.jpg -> photo_thumb.webp"""
+    return f"{os.path.splitext(file_name)[0]}_{variant}.webp"
+
+
+def variant_urls(url: str) -> Dict[str, str]:
+    """URL вариантов для URL оригинала"""
+    directory, file_name = url.rsplit("/", 1)
+    return {variant: f"{directory}/{variant_name(file_name, variant)}" for variant in IMAGE_VARIANTS}
+
+
+def _write_chunk(buffer, hasher, chunk: bytes):
+    hasher.update(chunk)
+    buffer.write(chunk)
+
+
+def _build_variants(path: str) -> Dict[str, str]:
+    """Уменьшенные копии в WebP рядом с оригиналом (выполняется в пуле воркеров)"""
+    directory, file_name = os.path.split(path)
+    created = {}
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        for variant, max_side in IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+            variant_path = os.path.join(directory, variant_name(file_name, variant))
+            resized.save(variant_path, "WEBP", quality=WEBP_QUALITY, method=4)
+            created[variant] = variant_path
+    return created
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Файл больше {UPLOAD_MAX_BYTES // (1024 * 1024)} МБ"
+    )
+
+
+async def _receive(file: UploadFile, path: str) -> Tuple[str, str]:
+    """Потоковая запись файла на диск; возвращает (sha256 содержимого, расширение по сигнатуре)"""
+    # Starlette уже знает размер разобранной части формы - отклоняем сразу, не читая файл
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise _too_large()
+    loop = asyncio.get_running_loop()
+    hasher = hashlib.sha256()
+    size = 0
+    extension = None
+    buffer = await loop.run_in_executor(None, open, path, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            if extension is None:
+                extension = sniff_image_type(chunk)
+                if extension is None:
+                    raise HTTPException(
+                        status_code=415,
+                        detail="Поддерживаются только изображения JPEG, PNG, GIF и WebP"
+                    )
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                raise _too_large()
+            await loop.run_in_executor(None, _write_chunk, buffer, hasher, chunk)
+    finally:
+        await loop.run_in_executor(None, buffer.close)
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Пустой файл")
+    return hasher.hexdigest(), extension
+
+
+def _remove(*paths: str):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def object_path(digest: str, extension: str) -> str:
+    """Путь объекта в хранилище: objects/ab/cd/abcd....jpg"""
+    return os.path.join(OBJECTS_DIR, digest[:2], digest[2:4], f"{digest}.{extension}")
+
+
+def _store(temp_path: str, path: str) -> bool:
+    """
+    Перенос загруженного файла на место объекта. Если такой объект уже есть,
+    копия удаляется, а у объекта обновляется mtime (защита от сборщика мусора).
+    Возвращает True, если объект новый.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(temp_path)
+        directory, file_name = os.path.split(path)
+        for name in [file_name] + [variant_name(file_name, variant) for variant in IMAGE_VARIANTS]:
+            try:
+                os.utime(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        return False
+    os.replace(temp_path, path)
+    return True
+
+
+def _ensure_variants(path: str):
+    directory, file_name = os.path.split(path)
+    if all(os.path.exists(os.path.join(directory, variant_name(file_name, variant))) for variant in IMAGE_VARIANTS):
+        return
+    _build_variants(path)
+
+
+async def save_image(file: UploadFile) -> dict:
+    """
+    Сохранение загруженного изображения в хранилище по хэшу содержимого
+    и построение вариантов. Повторная загрузка того же файла не создает копий.
+    Возвращает {"url": URL оригинала, "variants": {вариант: URL}}.
+    """
+    loop = asyncio.get_running_loop()
+    temp_path = os.path.join(OBJECTS_DIR, f".{uuid4()}.part")
+    try:
+        digest, extension = await _receive(file, temp_path)
+    except BaseException:
+        await loop.run_in_executor(None, _remove, temp_path)
+        raise
+
+    path = object_path(digest, extension)
+    created = await loop.run_in_executor(None, _store, temp_path, path)
+
+    try:
+        await asyncio.wrap_future(image_executor.submit(_ensure_variants, path))
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+        # Сигнатура совпала, но декодировать файл не удалось
+        logger.warning(f"[UPLOADS] Не удалось обработать изображение {os.path.basename(path)}: {e}")
+        if created:
+            directory, file_name = os.path.split(path)
+            await loop.run_in_executor(
+                None, _remove, path, *[os.path.join(directory, variant_name(file_name, variant)) for variant in IMAGE_VARIANTS]
+            )
+        raise HTTPException(status_code=400, detail="Файл поврежден или слишком большое разрешение")
+
+    url = f"{OBJECTS_URL}/{os.path.relpath(path, OBJECTS_DIR).replace(os.sep, '/')}"
+    return {"url": url, "variants": variant_urls(url)}
+
+
+def reference_counts(db: Session) -> Counter:
+    """Число ссылок на каждый объект (по хэшу) из фото тренеров и картинок новостей"""
+    counts = Counter()
+    for column in (TrainerInfo.photo_url, News.image_url):
+        for (url,) in db.query(column).filter(column.like(f"%{OBJECTS_URL}/%")).yield_per(1000):
+            counts.update(DIGEST_RE.findall(url))
+    return counts
+
+
+def collect_garbage(db: Session, grace_seconds: int = GC_GRACE_SECONDS, dry_run: bool = False) -> dict:
+    """
+    Удаление объектов, на которые не ссылается ни одна запись, вместе с их вариантами,
+    и недокачанных .part-файлов. Объекты моложе grace_seconds не трогаем:
+    их могли только что загрузить, но еще не сохранить ссылку.
+    """
+    counts = reference_counts(db)
+    deadline = time.time() - grace_seconds
+    stats = {"referenced": 0, "removed": 0, "freed_bytes": 0, "kept_recent": 0}
+    for directory, _, file_names in os.walk(OBJECTS_DIR):
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            digest = file_name[:64]
+            if not file_name.endswith(".part") and counts[digest] > 0:
+                stats["referenced"] += 1
+                continue
+            try:
+                status = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if status.st_mtime > deadline:
+                stats["kept_recent"] += 1
+                continue
+            if not dry_run:
+                _remove(path)
+            stats["removed"] += 1
+            stats["freed_bytes"] += status.st_size
+    if stats["removed"]:
+        logger.info(f"[UPLOADS] Сборка мусора: {stats}")
+    return stats
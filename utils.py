@@ -2,17 +2,106 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+import asyncio
+import os
+import threading
+import time
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = "secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Пул для bcrypt: хэширование занимает сотни миллисекунд CPU и не должно блокировать event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+
+class PasswordHashPool:
+    """
+    Ограниченный пул потоков для bcrypt (bcrypt отпускает GIL на время хэширования).
+
+    Если задач в работе и в очереди больше max_pending, новые запросы
+    отклоняются с 503, чтобы очередь не росла во время пиковой нагрузки.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Сервис перегружен, повторите попытку позже",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+
+    def _run(self, func, args, submitted_at):
+        started_at = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args)
+        finally:
+            finished_at = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self.total_wait_seconds += started_at - submitted_at
+                self.total_run_seconds += finished_at - started_at
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, func, *args):
+        self._reserve()
+        try:
+            future = self._executor.submit(self._run, func, args, time.perf_counter())
+        except BaseException:
+            self._release(None)
+            raise
+        # Место освобождается один раз при завершении задачи, в том числе отмененной
+        # в очереди (клиент отключился): тогда _run не выполняется вовсе
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, func, *args):
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+                "avg_run_ms": round(self.total_run_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            }
+
+password_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_pool.submit(pwd_context.hash, password).result()
+
+async def verify_password_async(plain_password, hashed_password):
+    return await password_pool.run(pwd_context.verify, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -22,4 +111,4 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt 
\ No newline at end of file
+    return encoded_jwt